@@ -4,79 +4,116 @@ Flask application with MongoDB backend for intelligent exam preparation planning
 """
 
 import os
-from datetime import datetime
-from flask import Flask, render_template, redirect, url_for
-from flask_pymongo import PyMongo
+import click
+from datetime import datetime, timedelta
+from flask import Flask, render_template, jsonify, current_app
+from flask.cli import with_appcontext
 from dotenv import load_dotenv
+from utils.pool import PoolStats, LazyMongo
+from utils.user_cache import invalidate_user, get_backend
+from utils.indexes import sync_indexes, sync_indexes_in_background, get_index_usage
 
 # Load environment variables
 load_dotenv()
 
-# Initialize Flask app
-app = Flask(__name__)
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
-app.config['MONGO_URI'] = os.getenv('MONGO_URI', 'mongodb://localhost:27017/smart_study_planner')
-
-# Initialize MongoDB
-mongo = PyMongo(app)
-
-# Make mongo available to all routes
-app.mongo = mongo
+def create_app(config=None):
+    """
+    Create and configure an application instance
+    
+    Nothing connects to MongoDB until the first query, so creating an app
+    is cheap, and several can run side by side in one process (e.g. one
+    per test, each with its own MONGO_URI). Each app also keeps its own
+    user cache backend and plan job workers.
+    
+    Args:
+        config (dict): Settings that override the environment defaults
+    
+    Returns:
+        Flask: The configured application
+    """
+    app = Flask(__name__)
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
+    app.config['MONGO_URI'] = os.getenv('MONGO_URI', 'mongodb://localhost:27017/smart_study_planner')
+    app.config['INDEX_SYNC_ON_STARTUP'] = os.getenv('INDEX_SYNC_ON_STARTUP', '1') != '0'
+    app.config['USER_CACHE_BACKEND'] = os.getenv('USER_CACHE_BACKEND', 'memory')
+    app.config['USER_CACHE_PATH'] = os.getenv('USER_CACHE_PATH', 'user_cache.sqlite3')
+    app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', '1024'))
+    app.config['USER_CACHE_TTL'] = float(os.getenv('USER_CACHE_TTL', '300'))
+    app.config['PLAN_JOB_WORKERS'] = int(os.getenv('PLAN_JOB_WORKERS', '2'))
+    if config:
+        app.config.update(config)
+    
+    # MongoDB client is created on first use (and again in forked workers)
+    app.pool_stats = PoolStats()
+    app.mongo = LazyMongo(app, app.pool_stats)
+    
+    # Route modules pull in the planner; only import them when an app is built
+    from routes.auth_routes import auth_bp
+    from routes.subject_routes import subjects_bp
+    from routes.planner_routes import planner_bp
+    from routes.dashboard_routes import dashboard_bp
+    from routes.progress_routes import progress_bp
+    
+    app.register_blueprint(auth_bp)
+    app.register_blueprint(subjects_bp)
+    app.register_blueprint(planner_bp)
+    app.register_blueprint(dashboard_bp)
+    app.register_blueprint(progress_bp)
+    
+    app.add_url_rule('/', 'landing', landing)
+    app.add_url_rule('/healthz', 'healthz', healthz)
+    app.before_request(start_index_sync)
+    app.context_processor(inject_globals)
+    app.register_error_handler(404, not_found)
+    app.register_error_handler(500, internal_error)
+    
+    for command in (regenerate_plans_command, rebuild_progress_command, backfill_session_slots_command,
+                    sync_indexes_command, index_report_command):
+        app.cli.add_command(command)
+    
+    return app
 
 # Create database indexes for performance
 def create_indexes():
-    """Create database indexes on application startup"""
+    """Bring the current app's database indexes up to date (see utils/indexes.py)"""
     try:
-        # Users collection
-        mongo.db.users.create_index('email', unique=True)
-        
-        # Subjects collection
-        mongo.db.subjects.create_index('user_id')
-        mongo.db.subjects.create_index('exam_date')
-        
-        # Topics collection
-        mongo.db.topics.create_index('user_id')
-        mongo.db.topics.create_index('subject_id')
-        mongo.db.topics.create_index([('user_id', 1), ('subject_id', 1)])
-        
-        # Sessions collection
-        mongo.db.sessions.create_index('user_id')
-        mongo.db.sessions.create_index('date')
-        mongo.db.sessions.create_index('status')
-        mongo.db.sessions.create_index([('user_id', 1), ('date', 1)])
-        mongo.db.sessions.create_index([('user_id', 1), ('status', 1)])
-        
-        # Study logs collection
-        mongo.db.study_logs.create_index('user_id')
-        mongo.db.study_logs.create_index('logged_at')
-        mongo.db.study_logs.create_index([('user_id', 1), ('logged_at', -1)])
-        
-        print("✓ Database indexes created successfully")
+        report = sync_indexes(current_app.mongo, force=True)
+        print(f"✓ Database indexes at version {report['version']} "
+              f"({len(report['created'])} created, {len(report['dropped'])} dropped)")
     except Exception as e:
         print(f"⚠ Warning: Could not create indexes - {e}")
 
-# Import routes
-from routes.auth_routes import auth_bp
-from routes.subject_routes import subjects_bp
-from routes.planner_routes import planner_bp
-from routes.dashboard_routes import dashboard_bp
-from routes.progress_routes import progress_bp
-
-# Register blueprints
-app.register_blueprint(auth_bp)
-app.register_blueprint(subjects_bp)
-app.register_blueprint(planner_bp)
-app.register_blueprint(dashboard_bp)
-app.register_blueprint(progress_bp)
-
 # Landing page route
-@app.route('/')
 def landing():
     """Landing page - public"""
     return render_template('landing.html')
 
+# Health check for load balancers and process managers
+def healthz():
+    """Report database reachability and this worker's connection pool stats"""
+    try:
+        current_app.mongo.cx.admin.command('ping')
+        status, code = 'ok', 200
+    except Exception as e:
+        # Unauthenticated endpoint: keep connection details in the log only
+        current_app.logger.warning('Health check failed: MongoDB ping raised %r', e)
+        status, code = 'mongo unavailable', 503
+    
+    return jsonify({'status': status, 'pool': current_app.pool_stats.snapshot()}), code
+
+# Build missing indexes and backfill old sessions without holding up startup
+# (once per process and database)
+def sync_database_in_background(app):
+    """Start the background index sync and the data migrations that follow it"""
+    from utils.db_helpers import migrate_sessions
+    sync_indexes_in_background(app.mongo, migrations=[migrate_sessions])
+
+def start_index_sync():
+    """Start the background index sync and session migration on the first request"""
+    if current_app.config['INDEX_SYNC_ON_STARTUP']:
+        sync_database_in_background(current_app)
+
 # Context processor for global template variables
-@app.context_processor
 def inject_globals():
     """Make common variables available to all templates"""
     return {
@@ -85,21 +122,140 @@ def inject_globals():
     }
 
 # Error handlers
-@app.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
 def internal_error(error):
     """Handle 500 errors"""
     return render_template('errors/500.html'), 500
 
+# Cohort plan regeneration (e.g. after a class timetable change)
+@click.command('regenerate-plans')
+@click.argument('emails', nargs=-1)
+@click.option('--days', default=30, show_default=True, help='Plan length in days from today.')
+@click.option('--daily-minutes', default=240, show_default=True, help='Daily study minutes.')
+@click.option('--max-sessions', default=4, show_default=True, help='Max sessions per day.')
+@click.option('--revision-days', default=2, show_default=True, help='Revision buffer days.')
+@click.option('--workers', default=None, type=int, help='Process pool size.')
+@with_appcontext
+def regenerate_plans_command(emails, days, daily_minutes, max_sessions, revision_days, workers):
+    """Regenerate plans for the given users (all users if none given)"""
+    from utils.planner import StudyPlanner, generate_cohort_plans
+    from utils.jobs import drain_plan_jobs
+    mongo = current_app.mongo
+    
+    query = {'email': {'$in': [e.strip().lower() for e in emails]}} if emails else {}
+    user_ids = [str(u['_id']) for u in mongo.db.users.find(query, {'_id': 1})]
+    
+    today = datetime.now()
+    start_date = datetime(today.year, today.month, today.day)
+    config = {
+        'daily_study_minutes': daily_minutes,
+        'start_date': start_date,
+        'end_date': start_date + timedelta(days=days),
+        'blocks': StudyPlanner.BLOCK_ORDER,
+        'max_sessions_per_day': max_sessions,
+        'revision_buffer_days': revision_days,
+        'capacity_aware': True
+    }
+    
+    results = generate_cohort_plans(mongo, user_ids, config, max_workers=workers)
+    for user_id in results:
+        invalidate_user(user_id)
+    
+    # Run changes users made while their plans were being regenerated
+    drain_plan_jobs(current_app._get_current_object())
+    
+    generated = [r for r in results.values() if 'error' not in r]
+    print(f"✓ Generated {len(generated)} plans ({sum(r['total_sessions'] for r in generated)} sessions)")
+    for user_id, result in results.items():
+        if 'error' in result:
+            print(f"⚠ {user_id}: {result['error']}")
+
+# Progress counter verification and repair
+@click.command('rebuild-progress')
+@click.argument('emails', nargs=-1)
+@click.option('--check', is_flag=True, help='Only report drift, do not repair it.')
+@with_appcontext
+def rebuild_progress_command(emails, check):
+    """Recompute stored progress counters from topics (all users if none given)"""
+    from utils.counters import rebuild_progress_counters
+    mongo = current_app.mongo
+    
+    user_ids = None
+    if emails:
+        query = {'email': {'$in': [e.strip().lower() for e in emails]}}
+        user_ids = [str(u['_id']) for u in mongo.db.users.find(query, {'_id': 1})]
+    
+    report = rebuild_progress_counters(mongo, user_ids, repair=not check)
+    if not check:
+        if user_ids is None:
+            get_backend().clear()
+        else:
+            for user_id in user_ids:
+                invalidate_user(user_id)
+    
+    action = 'Found' if check else 'Repaired'
+    print(f"✓ Checked {report['subjects_checked']} subjects and {report['users_checked']} users")
+    print(f"{action} {report['subjects_drifted']} subject and {report['users_drifted']} user counters")
+
+# One-off migration for sessions created before day/block_order/kind existed
+@click.command('backfill-session-slots')
+@click.option('--batch-size', default=1000, show_default=True, help='Sessions per bulk write.')
+@with_appcontext
+def backfill_session_slots_command(batch_size):
+    """Add day, block_order and kind to existing sessions"""
+    from utils.db_helpers import migrate_sessions
+    
+    updated = migrate_sessions(current_app.mongo, force=True, batch_size=batch_size)
+    get_backend().clear()
+    print(f"✓ Backfilled {updated} sessions")
+
+# Index maintenance for deploys
+@click.command('sync-indexes')
+@click.option('--force', is_flag=True, help='Re-check even if the recorded index version is current.')
+@click.option('--no-drop', is_flag=True, help='Keep redundant and retired indexes.')
+@with_appcontext
+def sync_indexes_command(force, no_drop):
+    """Build missing indexes and drop redundant ones"""
+    report = sync_indexes(current_app.mongo, force=force, drop=not no_drop)
+    if report['skipped']:
+        print(f"✓ Indexes already at version {report['version']}")
+        return
+    
+    print(f"✓ Indexes synced to version {report['version']}")
+    for name in report['created']:
+        print(f"  + {name}")
+    for name in report['dropped']:
+        print(f"  - {name}")
+
+@click.command('index-report')
+@click.argument('collections', nargs=-1)
+@with_appcontext
+def index_report_command(collections):
+    """Show how often each index has been used since the server started"""
+    rows = get_index_usage(current_app.mongo, list(collections) or None)
+    for row in rows:
+        notes = []
+        if row['ops'] == 0:
+            notes.append('unused')
+        if row['redundant']:
+            notes.append('redundant')
+        if not row['managed']:
+            notes.append('not in INDEXES')
+        print(f"{row['collection']:<12} {row['name']:<40} {row['ops']:>10}  {', '.join(notes)}")
+    
+    unused = [row for row in rows if row['ops'] == 0 and row['name'] != '_id_']
+    print(f"\n{len(rows)} indexes, {len(unused)} unused since {min((r['since'] for r in rows), default='-')}")
+
 # Application entry point
 if __name__ == '__main__':
-    # Create indexes on startup
-    with app.app_context():
-        create_indexes()
+    app = create_app()
+    
+    # Build indexes and backfill old sessions in the background while the server starts
+    if app.config['INDEX_SYNC_ON_STARTUP']:
+        sync_database_in_background(app)
     
     # Run the application
     port = int(os.getenv('PORT', 5000))
@@ -0,0 +1,235 @@
+"""
+Planner benchmark suite
+
+Generates synthetic users at several scales, runs each phase of
+StudyPlanner.generate_plan against an in-memory database and emits
+per-phase timings as JSON so runs can be compared between commits.
+
+Usage:
+    python -m benchmarks.bench_planner
+    python -m benchmarks.bench_planner --workload large --repeat 5 --output bench.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.memory_db import MemoryMongo
+from utils.planner import StudyPlanner
+
+
+WORKLOADS = {
+    'small': {
+        'subjects': 5, 'topics': 50, 'days': 30,
+        'exam_spread': 'uniform', 'max_sessions_per_day': 3,
+    },
+    'medium': {
+        'subjects': 20, 'topics': 800, 'days': 120,
+        'exam_spread': 'uniform', 'max_sessions_per_day': 3,
+    },
+    'large': {
+        'subjects': 50, 'topics': 5000, 'days': 365,
+        'exam_spread': 'uniform', 'max_sessions_per_day': 3,
+    },
+    'skewed_early': {
+        'subjects': 30, 'topics': 1500, 'days': 180,
+        'exam_spread': 'early', 'max_sessions_per_day': 3,
+    },
+    'skewed_late': {
+        'subjects': 30, 'topics': 1500, 'days': 180,
+        'exam_spread': 'late', 'max_sessions_per_day': 3,
+    },
+}
+
+PHASES = [
+    '_load_data',
+    'load_calendar',
+    '_calculate_priorities',
+    '_allocate_sessions',
+    '_add_revision_sessions',
+    '_save_plan',
+]
+
+
+def _exam_offset(rng, days, spread):
+    """Pick an exam day offset within the plan horizon"""
+    if spread == 'early':
+        # Most exams land in the first fifth of the horizon
+        return max(1, int(days * rng.betavariate(1.2, 6)))
+    if spread == 'late':
+        return max(1, int(days * rng.betavariate(6, 1.2)))
+    return rng.randint(1, days)
+
+
+def seed_user(mongo, workload, start_date, seed=0):
+    """
+    Insert a synthetic user with subjects and pending topics
+    
+    Args:
+        mongo: Object exposing .db
+        workload (dict): Workload parameters
+        start_date (datetime): Plan start date
+        seed (int): Random seed for reproducible data
+        
+    Returns:
+        ObjectId: The seeded user's id
+    """
+    rng = random.Random(seed)
+    user_id = mongo.db.users.insert_one({
+        'name': 'Benchmark User',
+        'email': f'bench-{seed}@example.com',
+        'created_at': start_date
+    }).inserted_id
+    
+    subject_ids = []
+    for i in range(workload['subjects']):
+        exam_date = start_date + timedelta(days=_exam_offset(rng, workload['days'], workload['exam_spread']))
+        subject_ids.append(mongo.db.subjects.insert_one({
+            'user_id': user_id,
+            'name': f'Subject {i}',
+            'exam_date': exam_date,
+            'difficulty': rng.randint(1, 5),
+            'color': '#3B82F6',
+            'created_at': start_date
+        }).inserted_id)
+    
+    topics = []
+    for i in range(workload['topics']):
+        topic = {
+            'user_id': user_id,
+            'subject_id': rng.choice(subject_ids),
+            'title': f'Topic {i}',
+            'estimated_minutes': rng.choice([30, 45, 60, 90, 120]),
+            'status': 'pending',
+            'created_at': start_date
+        }
+        if rng.random() < 0.1:
+            topic['priority_override'] = rng.choice([0.5, 1.5, 2.0])
+        topics.append(topic)
+    mongo.db.topics.insert_many(topics)
+    
+    return user_id
+
+
+def run_phases(mongo, user_id, config):
+    """
+    Run generate_plan phase by phase and time each one
+    
+    Args:
+        mongo: Object exposing .db
+        user_id (ObjectId): Seeded user
+        config (dict): Plan configuration
+        
+    Returns:
+        tuple: (phase -> seconds, number of sessions)
+    """
+    planner = StudyPlanner(mongo, str(user_id))
+    timings = {}
+    
+    def timed(name, func, *args, **kwargs):
+        started = time.perf_counter()
+        result = func(*args, **kwargs)
+        timings[name] = time.perf_counter() - started
+        return result
+    
+    timed('_load_data', planner._load_data)
+    planner.calendar = timed('load_calendar', planner.load_calendar,
+                             config['start_date'], config['end_date'],
+                             config['blocks'], statuses=('completed',))
+    priorities = timed('_calculate_priorities', planner._calculate_priorities, config)
+    sessions = timed('_allocate_sessions', planner._allocate_sessions, config, priorities)
+    sessions = timed('_add_revision_sessions', planner._add_revision_sessions, config, sessions)
+    timed('_save_plan', planner._save_plan, config, sessions)
+    
+    return timings, len(sessions)
+
+
+def bench_workload(name, workload, repeat):
+    """
+    Benchmark one workload, keeping the fastest run of each phase
+    
+    Args:
+        name (str): Workload name
+        workload (dict): Workload parameters
+        repeat (int): Number of runs
+        
+    Returns:
+        dict: Machine-readable result for the workload
+    """
+    start_date = datetime(2026, 1, 5)
+    config = {
+        'daily_study_minutes': 240,
+        'start_date': start_date,
+        'end_date': start_date + timedelta(days=workload['days']),
+        'blocks': StudyPlanner.BLOCK_ORDER,
+        'max_sessions_per_day': workload['max_sessions_per_day'],
+        'revision_buffer_days': 2
+    }
+    
+    mongo = MemoryMongo()
+    user_id = seed_user(mongo, workload, start_date)
+    seeded = mongo.db.snapshot()
+    
+    best = {}
+    runs = []
+    session_count = 0
+    for _ in range(repeat):
+        mongo.db.restore(seeded)
+        timings, session_count = run_phases(mongo, user_id, config)
+        runs.append(sum(timings.values()))
+        for phase, seconds in timings.items():
+            best[phase] = min(best.get(phase, seconds), seconds)
+    
+    return {
+        'workload': name,
+        'params': workload,
+        'sessions': session_count,
+        'phases_seconds': {phase: round(best[phase], 6) for phase in PHASES},
+        'total_seconds_min': round(min(runs), 6),
+        'total_seconds_max': round(max(runs), 6),
+        'repeat': repeat
+    }
+
+
+def _git_revision():
+    """Current commit hash, if available"""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'],
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark StudyPlanner.generate_plan phases')
+    parser.add_argument('--workload', action='append', choices=sorted(WORKLOADS),
+                        help='Workload to run (repeatable, default: all)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per workload')
+    parser.add_argument('--output', help='Write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+    
+    names = args.workload or list(WORKLOADS)
+    report = {
+        'benchmark': 'planner',
+        'commit': _git_revision(),
+        'python': platform.python_version(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'results': [bench_workload(name, WORKLOADS[name], args.repeat) for name in names]
+    }
+    
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(payload + '\n')
+    else:
+        print(payload)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+In-memory stand-in for the parts of MongoDB the planner uses
+
+Keeps benchmark timings focused on the planner's own work instead of
+network and server latency. Supports the query operators and write
+operations used by utils/planner.py and utils/db_helpers.py.
+"""
+
+import copy
+from types import SimpleNamespace
+from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne, UpdateMany, DeleteOne
+
+
+def _matches(doc, query):
+    """Check a document against a filter with basic comparison operators"""
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict) and any(k.startswith('$') for k in condition):
+            for op, operand in condition.items():
+                if op == '$in' and value not in operand:
+                    return False
+                if op == '$nin' and value in operand:
+                    return False
+                if op == '$ne' and value == operand:
+                    return False
+                if op == '$gte' and (value is None or value < operand):
+                    return False
+                if op == '$gt' and (value is None or value <= operand):
+                    return False
+                if op == '$lte' and (value is None or value > operand):
+                    return False
+                if op == '$lt' and (value is None or value >= operand):
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    """Apply an inclusion projection"""
+    if not projection:
+        return doc
+    fields = [f for f, include in projection.items() if include]
+    result = {f: doc[f] for f in fields if f in doc}
+    if projection.get('_id', 1):
+        result['_id'] = doc['_id']
+    return result
+
+
+def _sort_key(spec):
+    """Build a sort key for a list of (field, direction) pairs"""
+    def key(doc):
+        return tuple((doc.get(f) is not None, doc.get(f)) for f, _ in spec)
+    return key
+
+
+def _apply_sort(docs, spec):
+    """Sort documents by a list of (field, direction) pairs"""
+    for field, direction in reversed(spec):
+        docs.sort(key=_sort_key([(field, direction)]), reverse=direction < 0)
+    return docs
+
+
+class Cursor:
+    """Lazy result list with sort and limit"""
+    
+    def __init__(self, docs):
+        self._docs = docs
+    
+    def sort(self, key, direction=1):
+        spec = key if isinstance(key, list) else [(key, direction)]
+        _apply_sort(self._docs, spec)
+        return self
+    
+    def limit(self, count):
+        if count:
+            self._docs = self._docs[:count]
+        return self
+    
+    def __iter__(self):
+        return iter(self._docs)
+
+
+class Collection:
+    """List-backed collection"""
+    
+    def __init__(self):
+        self.docs = []
+    
+    def find(self, query=None, projection=None):
+        query = query or {}
+        return Cursor([_project(d, projection) for d in self.docs if _matches(d, query)])
+    
+    def find_one(self, query=None, projection=None, sort=None):
+        cursor = self.find(query, projection)
+        if sort:
+            cursor.sort(sort)
+        return next(iter(cursor), None)
+    
+    def count_documents(self, query):
+        return sum(1 for d in self.docs if _matches(d, query))
+    
+    def insert_one(self, doc):
+        doc.setdefault('_id', ObjectId())
+        self.docs.append(doc)
+        return SimpleNamespace(inserted_id=doc['_id'])
+    
+    def insert_many(self, docs):
+        ids = [self.insert_one(doc).inserted_id for doc in docs]
+        return SimpleNamespace(inserted_ids=ids)
+    
+    def _update(self, query, update, many):
+        count = 0
+        for doc in self.docs:
+            if _matches(doc, query):
+                doc.update(update.get('$set', {}))
+                for field, amount in update.get('$inc', {}).items():
+                    doc[field] = doc.get(field, 0) + amount
+                count += 1
+                if not many:
+                    break
+        return SimpleNamespace(matched_count=count, modified_count=count)
+    
+    def update_one(self, query, update):
+        return self._update(query, update, many=False)
+    
+    def update_many(self, query, update):
+        return self._update(query, update, many=True)
+    
+    def _delete(self, query, many):
+        kept, deleted = [], 0
+        for doc in self.docs:
+            if (many or not deleted) and _matches(doc, query):
+                deleted += 1
+            else:
+                kept.append(doc)
+        self.docs = kept
+        return SimpleNamespace(deleted_count=deleted)
+    
+    def delete_one(self, query):
+        return self._delete(query, many=False)
+    
+    def delete_many(self, query):
+        return self._delete(query, many=True)
+    
+    def bulk_write(self, operations, ordered=True):
+        by_id = {doc['_id']: doc for doc in self.docs}
+        deleted = set()
+        for op in operations:
+            if isinstance(op, InsertOne):
+                self.insert_one(op._doc)
+            elif isinstance(op, UpdateOne):
+                doc = by_id.get(op._filter.get('_id'))
+                if doc is not None:
+                    doc.update(op._doc.get('$set', {}))
+            elif isinstance(op, UpdateMany):
+                self._update(op._filter, op._doc, many=True)
+            elif isinstance(op, DeleteOne):
+                deleted.add(op._filter.get('_id'))
+        if deleted:
+            self.docs = [d for d in self.docs if d['_id'] not in deleted]
+        return SimpleNamespace(acknowledged=True)
+    
+    def create_index(self, *args, **kwargs):
+        return None
+
+
+class MemoryDatabase:
+    """Database whose collections are created on first access"""
+    
+    def __init__(self):
+        self._collections = {}
+    
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self._collections.setdefault(name, Collection())
+    
+    def __getitem__(self, name):
+        return getattr(self, name)
+    
+    def snapshot(self):
+        """Deep copy of all collections, for resetting between runs"""
+        return copy.deepcopy(self._collections)
+    
+    def restore(self, collections):
+        self._collections = copy.deepcopy(collections)
+
+
+class MemoryMongo:
+    """Drop-in for the Flask-PyMongo object (exposes .db)"""
+    
+    def __init__(self):
+        self.db = MemoryDatabase()
@@ -0,0 +1,87 @@
+"""
+Application startup benchmark
+
+Measures, in a fresh interpreter per run, how long it takes to import
+app.py, build an app with create_app, and serve the first request, plus
+the cost of each further app instance (one per test). Also records
+whether MongoDB was contacted, which should not happen for a page that
+does not query it.
+
+Usage:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --repeat 10 --output startup.json
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+from benchmarks.bench_planner import _git_revision
+
+
+PHASES = ('import', 'create_app', 'first_request', 'import_to_first_request', 'another_app')
+
+# Runs in a child process so nothing is already imported or cached
+PROBE = '''
+import json, time
+start = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app = app_module.create_app({'TESTING': True, 'INDEX_SYNC_ON_STARTUP': False})
+created = time.perf_counter()
+response = app.test_client().get('/')
+served = time.perf_counter()
+app_module.create_app({'TESTING': True, 'INDEX_SYNC_ON_STARTUP': False})
+another = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'first_request': served - created,
+    'import_to_first_request': served - start,
+    'another_app': another - served,
+    'status': response.status_code,
+    'mongo_connected': app.mongo.connected
+}))
+'''
+
+
+def probe():
+    """Time one cold start in a new interpreter"""
+    output = subprocess.check_output([sys.executable, '-c', PROBE], text=True)
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure import-to-first-request latency')
+    parser.add_argument('--repeat', type=int, default=5, help='Cold starts to time')
+    parser.add_argument('--output', help='Write JSON here instead of stdout')
+    args = parser.parse_args(argv)
+
+    runs = [probe() for _ in range(args.repeat)]
+    report = {
+        'benchmark': 'startup',
+        'commit': _git_revision(),
+        'python': platform.python_version(),
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'repeat': args.repeat,
+        'median_ms': {phase: round(statistics.median(r[phase] for r in runs) * 1000, 2) for phase in PHASES},
+        'min_ms': {phase: round(min(r[phase] for r in runs) * 1000, 2) for phase in PHASES},
+        'first_request_status': runs[0]['status'],
+        'mongo_connected': any(r['mongo_connected'] for r in runs)
+    }
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(payload + '\n')
+    else:
+        print(payload)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
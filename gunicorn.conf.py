@@ -0,0 +1,43 @@
+"""
+Gunicorn configuration for production serving
+
+Runs several pre-forked worker processes so requests use every core.
+The app is loaded once in the master (preload_app) and shared
+copy-on-write; utils/pool.py re-creates the Mongo client in each worker
+after the fork, so no sockets or monitor threads are shared.
+
+Several workers each keeping their own in-process user cache would serve
+reads another worker has already invalidated, so the shared SQLite cache
+backend is the default here unless USER_CACHE_BACKEND is set (in the
+environment or .env).
+
+Each worker serves THREADS requests concurrently, so keep
+MONGO_MAX_POOL_SIZE at or above it (PyMongo's default of 100 is plenty).
+
+Usage:
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import multiprocessing
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+os.environ.setdefault('USER_CACHE_BACKEND', 'sqlite')
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.getenv('THREADS', '4'))
+preload_app = True
+
+timeout = int(os.getenv('WORKER_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers now and then to bound memory growth (jitter avoids restarting all at once)
+max_requests = int(os.getenv('MAX_REQUESTS', '2000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
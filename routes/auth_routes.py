@@ -6,6 +6,8 @@ from flask import Blueprint, render_template, request, redirect, url_for, sessio
 from bson.objectid import ObjectId
 from datetime import datetime
 from utils.auth import hash_password, verify_password, validate_registration, validate_login
+from utils.counters import empty_user_counters
+from utils.streaks import empty_streak
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -42,6 +44,8 @@ def register():
             'name': name,
             'email': email,
             'password_hash': hash_password(password),
+            'progress': empty_user_counters(),
+            'streak': empty_streak(),
             'created_at': datetime.now()
         }
         
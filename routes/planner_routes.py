@@ -6,8 +6,14 @@ from flask import Blueprint, render_template, request, redirect, url_for, sessio
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
 from utils.auth import login_required
+from utils.user_cache import invalidates_user_cache
 from utils.planner import StudyPlanner, get_plan_explanation
-from utils.db_helpers import get_subjects_for_user, get_sessions_for_date
+from utils.db_helpers import (
+    get_subjects_for_user, get_sessions_for_range, get_active_plan,
+    get_backlog_page, get_session_history_page, session_kind, DEFAULT_PAGE_SIZE
+)
+from utils.jobs import submit_plan_job, apply_plan_change, resume_plan_job, get_plan_job, get_active_plan_job
+from utils.streaks import record_study_day
 
 planner_bp = Blueprint('planner', __name__)
 
@@ -18,11 +24,8 @@ def planner():
     """Planner overview and generation page"""
     user_id = session['user_id']
     
-    # Get latest plan
-    latest_plan = current_app.mongo.db.plans.find_one(
-        {'user_id': ObjectId(user_id)},
-        sort=[('created_at', -1)]
-    )
+    # Get active plan
+    latest_plan = get_active_plan(current_app.mongo, user_id)
     
     # Get subjects for form defaults
     subjects = get_subjects_for_user(current_app.mongo, user_id)
@@ -40,15 +43,23 @@ def planner():
     # Get plan explanation
     explanations = get_plan_explanation(current_app.mongo, user_id)
     
+    # Plan generation in progress, if any
+    job_id = request.args.get('job')
+    job = get_plan_job(current_app.mongo, user_id, job_id) if job_id else None
+    if not job:
+        job = get_active_plan_job(current_app.mongo, user_id)
+    
     return render_template('planner/generate.html',
                          latest_plan=latest_plan,
                          subjects=subjects,
                          default_end_date=default_end_date,
-                         explanations=explanations)
+                         explanations=explanations,
+                         job=job)
 
 
 @planner_bp.route('/planner/generate', methods=['POST'])
 @login_required
+@invalidates_user_cache
 def generate_plan():
     """Generate a new study plan"""
     user_id = session['user_id']
@@ -104,26 +115,75 @@ def generate_plan():
             flash(error, 'error')
         return redirect(url_for('planner.planner'))
     
-    # Generate plan
-    planner_instance = StudyPlanner(current_app.mongo, user_id)
-    
     config = {
         'daily_study_minutes': daily_study_minutes,
         'start_date': start_date,
         'end_date': end_date,
         'blocks': ['Morning', 'Afternoon', 'Evening'],
         'max_sessions_per_day': max_sessions_per_day,
-        'revision_buffer_days': revision_buffer_days
+        'revision_buffer_days': revision_buffer_days,
+        'capacity_aware': True
     }
     
-    result = planner_instance.generate_plan(config)
+    # Generate plan in the background; only one generation per user at a time
+    job, created = submit_plan_job(current_app._get_current_object(), user_id, config)
+    
+    if created:
+        flash('Generating your study plan...', 'info')
+    else:
+        flash('Your study plan is already being generated. Showing its progress.', 'info')
+    
+    return redirect(url_for('planner.planner', job=str(job['_id'])))
+
+
+@planner_bp.route('/planner/jobs/<job_id>')
+@login_required
+def plan_job_status(job_id):
+    """Progress of a plan generation job (polled by the planner page)"""
+    user_id = session['user_id']
+    
+    job = get_plan_job(current_app.mongo, user_id, job_id)
+    
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    # The process that queued the job may be gone; let this one pick it up
+    resume_plan_job(current_app._get_current_object(), job)
+    
+    return jsonify({
+        'job_id': str(job['_id']),
+        'status': job['status'],
+        'stage': job.get('stage'),
+        'progress': job.get('progress', 0),
+        'error': job.get('error'),
+        'total_sessions': (job.get('result') or {}).get('total_sessions')
+    })
+
+
+@planner_bp.route('/planner/jobs/<job_id>/finish')
+@login_required
+def plan_job_finish(job_id):
+    """Report a finished plan generation job and move on"""
+    user_id = session['user_id']
+    
+    job = get_plan_job(current_app.mongo, user_id, job_id)
     
-    if 'error' in result:
-        flash(result['error'], 'error')
+    if not job:
+        flash('Plan generation job not found.', 'error')
         return redirect(url_for('planner.planner'))
     
-    flash(f'Study plan generated successfully! {result["total_sessions"]} sessions created.', 'success')
-    return redirect(url_for('planner.timetable'))
+    if job['status'] == 'done':
+        if job.get('result'):
+            flash(f'Study plan generated successfully! {job["result"]["total_sessions"]} sessions created.', 'success')
+        else:
+            flash('Your study plan has been updated.', 'success')
+        return redirect(url_for('planner.timetable'))
+    
+    if job['status'] == 'failed':
+        flash(job.get('error') or 'Plan generation failed.', 'error')
+        return redirect(url_for('planner.planner'))
+    
+    return redirect(url_for('planner.planner', job=job_id))
 
 
 @planner_bp.route('/timetable')
@@ -142,23 +202,20 @@ def timetable():
     # Get 7 days starting from Monday
     week_dates = [start_of_week + timedelta(days=i) for i in range(7)]
     
-    # Get sessions for each day
+    # Get sessions for the whole week in one query
+    week_sessions = get_sessions_for_range(current_app.mongo, user_id, week_dates[0], week_dates[-1])
+    
     week_data = []
     for date in week_dates:
-        day_sessions = get_sessions_for_date(current_app.mongo, user_id, date)
+        day_blocks = week_sessions.get(date.date(), {})
         
         # Group by block
         sessions_by_block = {
-            'Morning': [],
-            'Afternoon': [],
-            'Evening': []
+            'Morning': day_blocks.get('Morning', []),
+            'Afternoon': day_blocks.get('Afternoon', []),
+            'Evening': day_blocks.get('Evening', [])
         }
         
-        for sess in day_sessions:
-            block = sess.get('block', 'Morning')
-            if block in sessions_by_block:
-                sessions_by_block[block].append(sess)
-        
         week_data.append({
             'date': date,
             'day_name': date.strftime('%A'),
@@ -179,6 +236,7 @@ def timetable():
 
 @planner_bp.route('/sessions/<session_id>/complete', methods=['POST'])
 @login_required
+@invalidates_user_cache
 def complete_session(session_id):
     """Mark a session as completed"""
     user_id = session['user_id']
@@ -201,6 +259,7 @@ def complete_session(session_id):
         actual_minutes = sess['planned_minutes']
     
     notes = request.form.get('notes', '').strip()
+    completed_at = datetime.now()
     
     # Update session
     current_app.mongo.db.sessions.update_one(
@@ -210,10 +269,11 @@ def complete_session(session_id):
                 'status': 'completed',
                 'actual_minutes': actual_minutes,
                 'notes': notes,
-                'completed_at': datetime.now()
+                'completed_at': completed_at
             }
         }
     )
+    record_study_day(current_app.mongo, user_id, completed_at)
     
     # Create study log
     log_doc = {
@@ -234,6 +294,7 @@ def complete_session(session_id):
 
 @planner_bp.route('/sessions/<session_id>/skip', methods=['POST'])
 @login_required
+@invalidates_user_cache
 def skip_session(session_id):
     """Skip a session (moves to backlog)"""
     user_id = session['user_id']
@@ -259,6 +320,7 @@ def skip_session(session_id):
 
 @planner_bp.route('/sessions/<session_id>/reschedule', methods=['POST'])
 @login_required
+@invalidates_user_cache
 def reschedule_session(session_id):
     """Reschedule a session to a different date/block"""
     user_id = session['user_id']
@@ -283,24 +345,47 @@ def reschedule_session(session_id):
         flash('Invalid date format.', 'error')
         return redirect(request.referrer or url_for('dashboard.dashboard'))
     
-    # Update session
-    current_app.mongo.db.sessions.update_one(
-        {'_id': ObjectId(session_id)},
-        {
-            '$set': {
-                'date': new_date,
-                'block': new_block,
-                'status': 'pending'
-            }
-        }
-    )
+    if new_block not in StudyPlanner.BLOCK_ORDER:
+        flash('Invalid time block.', 'error')
+        return redirect(request.referrer or url_for('dashboard.dashboard'))
+    
+    # Move session unless the target slot is already taken
+    planner_instance = StudyPlanner(current_app.mongo, user_id)
+    if not planner_instance.reschedule_session(session_id, new_date, new_block):
+        flash(f'{new_block} on {new_date.strftime("%b %d")} is already taken. Please pick another slot.', 'error')
+        return redirect(request.referrer or url_for('dashboard.dashboard'))
     
     flash('Session rescheduled successfully!', 'success')
     return redirect(request.referrer or url_for('dashboard.dashboard'))
 
 
+@planner_bp.route('/backlog/reschedule', methods=['POST'])
+@login_required
+@invalidates_user_cache
+def reschedule_backlog():
+    """Move all skipped sessions into free slots before their exams"""
+    user_id = session['user_id']
+    
+    # Waits for a plan generation in flight instead of racing it
+    change = apply_plan_change(current_app._get_current_object(), user_id, reinsert_backlog=True)
+    if change['queued']:
+        flash('Your plan is being updated. Backlog sessions will be rescheduled when it finishes.', 'info')
+        return redirect(request.referrer or url_for('dashboard.dashboard'))
+    
+    result = change['backlog']
+    if result['rescheduled']:
+        flash(f'{result["rescheduled"]} backlog sessions rescheduled.', 'success')
+    if result['remaining']:
+        flash(f'{result["remaining"]} sessions could not fit before their exams and remain in your backlog.', 'warning')
+    if result['displaced']:
+        flash(f'{result["displaced"]} lower-priority sessions were moved to your backlog to make room.', 'info')
+    
+    return redirect(request.referrer or url_for('dashboard.dashboard'))
+
+
 @planner_bp.route('/sessions/<session_id>/note', methods=['POST'])
 @login_required
+@invalidates_user_cache
 def add_session_note(session_id):
     """Add a note to a session"""
     user_id = session['user_id']
@@ -324,3 +409,49 @@ def add_session_note(session_id):
     
     flash('Note added successfully!', 'success')
     return redirect(request.referrer or url_for('dashboard.dashboard'))
+
+
+def _session_json(sess):
+    """Serialise an enriched session for the listing APIs"""
+    return {
+        'id': str(sess['_id']),
+        'date': sess['date'].strftime('%Y-%m-%d'),
+        'block': sess.get('block'),
+        'status': sess['status'],
+        'planned_minutes': sess.get('planned_minutes'),
+        'actual_minutes': sess.get('actual_minutes'),
+        'is_revision': session_kind(sess) == 'revision',
+        'subject': sess['subject']['name'] if sess.get('subject') else None,
+        'color': sess['subject'].get('color') if sess.get('subject') else None,
+        'topic': sess['topic']['title'] if sess.get('topic') else None
+    }
+
+
+def _session_page_response(get_page):
+    """Run a paginated session query with the request's limit and token"""
+    user_id = session['user_id']
+    
+    try:
+        page_size = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+        page = get_page(current_app.mongo, user_id, page_size, request.args.get('after') or None)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or page token'}), 400
+    
+    return jsonify({
+        'sessions': [_session_json(sess) for sess in page['sessions']],
+        'next': page['next_token']
+    })
+
+
+@planner_bp.route('/backlog')
+@login_required
+def backlog_sessions():
+    """Skipped sessions, oldest first, one page at a time (?limit=&after=)"""
+    return _session_page_response(get_backlog_page)
+
+
+@planner_bp.route('/sessions/history')
+@login_required
+def session_history():
+    """Completed and skipped sessions, newest first, one page at a time (?limit=&after=)"""
+    return _session_page_response(get_session_history_page)
@@ -5,7 +5,7 @@ Progress tracking routes: readiness score, statistics, completion tracking
 from flask import Blueprint, render_template, current_app, session
 from utils.auth import login_required
 from utils.db_helpers import (
-    get_subjects_for_user, get_topic_statistics, 
+    get_subjects_for_user, get_topic_statistics_by_subject, build_topic_statistics,
     get_study_streak, get_overall_progress
 )
 from utils.planner import calculate_readiness_score
@@ -31,9 +31,11 @@ def progress():
     # Get per-subject progress
     subjects = get_subjects_for_user(current_app.mongo, user_id)
     
+    stats_by_subject = get_topic_statistics_by_subject(current_app.mongo, user_id)
+    
     subject_progress = []
     for subject in subjects:
-        stats = get_topic_statistics(current_app.mongo, user_id, str(subject['_id']))
+        stats = stats_by_subject.get(subject['_id'], build_topic_statistics())
         
         subject_progress.append({
             'subject': subject,
@@ -6,7 +6,16 @@ from flask import Blueprint, render_template, request, redirect, url_for, sessio
 from datetime import datetime
 from bson.objectid import ObjectId
 from utils.auth import login_required
-from utils.db_helpers import get_subjects_for_user, get_topics_for_subject, get_topic_statistics
+from utils.user_cache import invalidates_user_cache
+from utils.db_helpers import (
+    get_subjects_for_user, get_topics_for_subject, get_topic_statistics,
+    get_topic_statistics_by_subject, build_topic_statistics
+)
+from utils.jobs import apply_plan_change
+from utils.counters import (
+    empty_subject_counters, record_subject_added, record_subject_removed,
+    record_topic_added, record_topic_removed, record_topic_status_changed
+)
 
 subjects_bp = Blueprint('subjects', __name__)
 
@@ -18,16 +27,17 @@ def list_subjects():
     user_id = session['user_id']
     subjects = get_subjects_for_user(current_app.mongo, user_id)
     
-    # Get statistics for each subject
+    # Get statistics for all subjects in one aggregation
+    stats_by_subject = get_topic_statistics_by_subject(current_app.mongo, user_id)
     for subject in subjects:
-        stats = get_topic_statistics(current_app.mongo, user_id, str(subject['_id']))
-        subject['stats'] = stats
+        subject['stats'] = stats_by_subject.get(subject['_id'], build_topic_statistics())
     
     return render_template('subjects/list.html', subjects=subjects)
 
 
 @subjects_bp.route('/subjects/add', methods=['POST'])
 @login_required
+@invalidates_user_cache
 def add_subject():
     """Add a new subject"""
     user_id = session['user_id']
@@ -70,10 +80,12 @@ def add_subject():
         'exam_date': exam_date,
         'difficulty': difficulty,
         'color': color,
+        'progress': empty_subject_counters(),
         'created_at': datetime.now()
     }
     
     current_app.mongo.db.subjects.insert_one(subject_doc)
+    record_subject_added(current_app.mongo, user_id)
     
     flash(f'Subject "{name}" added successfully!', 'success')
     return redirect(url_for('subjects.list_subjects'))
@@ -81,6 +93,7 @@ def add_subject():
 
 @subjects_bp.route('/subjects/<subject_id>/edit', methods=['POST'])
 @login_required
+@invalidates_user_cache
 def edit_subject(subject_id):
     """Edit an existing subject"""
     user_id = session['user_id']
@@ -132,12 +145,17 @@ def edit_subject(subject_id):
         }}
     )
     
+    # Exam date and difficulty drive scheduling; update the plan for this subject
+    if exam_date != subject.get('exam_date') or difficulty != subject.get('difficulty'):
+        apply_plan_change(current_app._get_current_object(), user_id, replan=[subject_id])
+    
     flash(f'Subject "{name}" updated successfully!', 'success')
     return redirect(url_for('subjects.list_subjects'))
 
 
 @subjects_bp.route('/subjects/<subject_id>/delete', methods=['POST'])
 @login_required
+@invalidates_user_cache
 def delete_subject(subject_id):
     """Delete a subject and all its topics and sessions"""
     user_id = session['user_id']
@@ -154,22 +172,25 @@ def delete_subject(subject_id):
     
     subject_name = subject['name']
     
+    # Uncount the subject while its topics still exist
+    record_subject_removed(current_app.mongo, subject)
+    
     # Delete related topics
     current_app.mongo.db.topics.delete_many({
         'user_id': ObjectId(user_id),
         'subject_id': ObjectId(subject_id)
     })
     
-    # Delete related sessions
-    current_app.mongo.db.sessions.delete_many({
-        'user_id': ObjectId(user_id),
-        'subject_id': ObjectId(subject_id)
-    })
-    
     # Delete subject
     current_app.mongo.db.subjects.delete_one({'_id': ObjectId(subject_id)})
     
-    flash(f'Subject "{subject_name}" and all related data deleted successfully.', 'success')
+    # Delete related sessions under the plan guard, after any plan change in flight
+    change = apply_plan_change(current_app._get_current_object(), user_id, delete_subjects=[subject_id])
+    
+    if change['queued']:
+        flash(f'Subject "{subject_name}" deleted. Its sessions will be removed once your plan update finishes.', 'success')
+    else:
+        flash(f'Subject "{subject_name}" and all related data deleted successfully.', 'success')
     return redirect(url_for('subjects.list_subjects'))
 
 
@@ -203,6 +224,7 @@ def manage_topics(subject_id):
 
 @subjects_bp.route('/subjects/<subject_id>/topics/add', methods=['POST'])
 @login_required
+@invalidates_user_cache
 def add_topic(subject_id):
     """Add a new topic to a subject"""
     user_id = session['user_id']
@@ -246,6 +268,10 @@ def add_topic(subject_id):
     }
     
     current_app.mongo.db.topics.insert_one(topic_doc)
+    record_topic_added(current_app.mongo, topic_doc)
+    
+    # Fit the new topic into the current plan
+    apply_plan_change(current_app._get_current_object(), user_id, replan=[subject_id])
     
     flash(f'Topic "{title}" added successfully!', 'success')
     return redirect(url_for('subjects.manage_topics', subject_id=subject_id))
@@ -253,6 +279,7 @@ def add_topic(subject_id):
 
 @subjects_bp.route('/topics/<topic_id>/toggle', methods=['POST'])
 @login_required
+@invalidates_user_cache
 def toggle_topic(topic_id):
     """Toggle topic completion status"""
     user_id = session['user_id']
@@ -269,10 +296,16 @@ def toggle_topic(topic_id):
     # Toggle status
     new_status = 'completed' if topic['status'] == 'pending' else 'pending'
     
-    current_app.mongo.db.topics.update_one(
-        {'_id': ObjectId(topic_id)},
+    # Only count the toggle that actually changed the stored status
+    result = current_app.mongo.db.topics.update_one(
+        {'_id': ObjectId(topic_id), 'status': topic['status']},
         {'$set': {'status': new_status}}
     )
+    if result.modified_count:
+        record_topic_status_changed(current_app.mongo, topic, new_status)
+    
+    # Drop or restore the topic's upcoming sessions in the current plan
+    apply_plan_change(current_app._get_current_object(), user_id, replan=[topic['subject_id']])
     
     return jsonify({
         'success': True,
@@ -282,6 +315,7 @@ def toggle_topic(topic_id):
 
 @subjects_bp.route('/topics/<topic_id>/delete', methods=['POST'])
 @login_required
+@invalidates_user_cache
 def delete_topic(topic_id):
     """Delete a topic"""
     user_id = session['user_id']
@@ -299,14 +333,13 @@ def delete_topic(topic_id):
     subject_id = str(topic['subject_id'])
     topic_title = topic['title']
     
-    # Delete related sessions
-    current_app.mongo.db.sessions.delete_many({
-        'user_id': ObjectId(user_id),
-        'topic_id': ObjectId(topic_id)
-    })
-    
     # Delete topic
-    current_app.mongo.db.topics.delete_one({'_id': ObjectId(topic_id)})
+    result = current_app.mongo.db.topics.delete_one({'_id': ObjectId(topic_id)})
+    if result.deleted_count:
+        record_topic_removed(current_app.mongo, topic)
+    
+    # Delete related sessions under the plan guard, after any plan change in flight
+    apply_plan_change(current_app._get_current_object(), user_id, delete_topics=[topic_id])
     
     flash(f'Topic "{topic_title}" deleted successfully.', 'success')
     return redirect(url_for('subjects.manage_topics', subject_id=subject_id))
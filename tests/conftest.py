@@ -0,0 +1,178 @@
+"""
+Shared fixtures
+
+Tests run against mongomock, wrapped so each read records the collection,
+method and projection or pipeline it sent. The cross-request user cache
+is disabled so every helper call reaches the database.
+"""
+
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from flask import Flask
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from pymongo.results import InsertManyResult
+
+from utils.db_helpers import session_slot
+
+
+class RecordingCollection:
+    """mongomock collection that records find, find_one and aggregate calls"""
+
+    def __init__(self, collection, calls):
+        self._collection = collection
+        self._calls = calls
+
+    def find(self, filter=None, projection=None, *args, **kwargs):
+        self._calls.append((self._collection.name, 'find', projection))
+        return self._collection.find(filter, projection, *args, **kwargs)
+
+    def find_one(self, filter=None, projection=None, *args, **kwargs):
+        self._calls.append((self._collection.name, 'find_one', projection))
+        return self._collection.find_one(filter, projection, *args, **kwargs)
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        self._calls.append((self._collection.name, 'aggregate', pipeline))
+        return self._collection.aggregate(pipeline, *args, **kwargs)
+
+    def _guard_taken(self, document):
+        # mongomock ignores partialFilterExpression, so stand in for the
+        # unique (user_id, active) index that guards plan_jobs
+        return self._collection.name == 'plan_jobs' and document.get('active') and \
+            self._collection.find_one({'user_id': document['user_id'], 'active': True}) is not None
+
+    def insert_one(self, document, *args, **kwargs):
+        if self._guard_taken(document):
+            raise DuplicateKeyError('E11000 duplicate key error: user_id_active_unique')
+        return self._collection.insert_one(document, *args, **kwargs)
+
+    def insert_many(self, documents, ordered=True, *args, **kwargs):
+        errors = []
+        for index, document in enumerate(documents):
+            if self._guard_taken(document):
+                errors.append({'index': index, 'code': 11000, 'errmsg': 'E11000 duplicate key error'})
+                if ordered:
+                    break
+            else:
+                self._collection.insert_one(document)
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'nInserted': len(documents) - len(errors)})
+        return InsertManyResult([document['_id'] for document in documents], True)
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+
+class RecordingDatabase:
+    """mongomock database handing out RecordingCollections"""
+
+    def __init__(self, db, calls):
+        self._db = db
+        self._calls = calls
+
+    @property
+    def name(self):
+        return self._db.name
+
+    def __getitem__(self, name):
+        return RecordingCollection(self._db[name], self._calls)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+
+class RecordingMongo:
+    """Stands in for the Flask-PyMongo object (exposes .db)"""
+
+    def __init__(self, database='study_planner_test'):
+        self.cx = mongomock.MongoClient()
+        self.calls = []
+        self.db = RecordingDatabase(self.cx[database], self.calls)
+
+    def reads(self, collection, method=None):
+        """Projections or pipelines recorded for one collection"""
+        return [arg for name, called, arg in self.calls
+                if name == collection and method in (None, called)]
+
+
+@pytest.fixture(autouse=True)
+def no_user_cache(monkeypatch):
+    monkeypatch.setenv('USER_CACHE_TTL', '0')
+
+
+@pytest.fixture
+def mongo():
+    return RecordingMongo()
+
+
+@pytest.fixture
+def make_mongo():
+    """Factory for further databases, e.g. to check they stay isolated"""
+    return RecordingMongo
+
+
+@pytest.fixture
+def app(mongo):
+    """Bare Flask app carrying the test database, for code that takes an app"""
+    app = Flask('tests')
+    app.mongo = mongo
+    return app
+
+
+@pytest.fixture
+def today():
+    now = datetime.now()
+    return datetime(now.year, now.month, now.day)
+
+
+@pytest.fixture
+def user(mongo, today):
+    """A user with two subjects, pending topics and a few sessions"""
+    user_id = mongo.db.users.insert_one({
+        'name': 'Test User', 'email': 'test@example.com', 'created_at': today
+    }).inserted_id
+
+    subject_ids = [
+        mongo.db.subjects.insert_one({
+            'user_id': user_id, 'name': name, 'exam_date': today + timedelta(days=days),
+            'difficulty': 3, 'color': '#3B82F6', 'syllabus': 'x' * 1000, 'created_at': today
+        }).inserted_id
+        for name, days in (('Maths', 20), ('Physics', 30))
+    ]
+
+    topic_ids = []
+    for subject_id in subject_ids:
+        for i in range(4):
+            topic_ids.append(mongo.db.topics.insert_one({
+                'user_id': user_id, 'subject_id': subject_id, 'title': f'Topic {i}',
+                'estimated_minutes': 60, 'status': 'pending', 'resources': 'x' * 1000,
+                'created_at': today
+            }).inserted_id)
+
+    for offset, status in ((-2, 'skipped'), (-1, 'completed'), (0, 'pending')):
+        mongo.db.sessions.insert_one({
+            'user_id': user_id, 'subject_id': subject_ids[0], 'topic_id': topic_ids[0],
+            **session_slot(today + timedelta(days=offset), 'Morning'),
+            'planned_minutes': 60, 'actual_minutes': None, 'status': status,
+            'notes': 'n' * 1000, 'completed_at': None
+        })
+
+    mongo.calls.clear()
+    return str(user_id)
+
+
+@pytest.fixture
+def plan_config(today):
+    """Plan configuration covering both exams and their revision days"""
+    return {
+        'daily_study_minutes': 180,
+        'start_date': today,
+        'end_date': today + timedelta(days=30),
+        'blocks': ['Morning', 'Afternoon', 'Evening'],
+        'max_sessions_per_day': 3,
+        'revision_buffer_days': 2,
+        'capacity_aware': False
+    }
@@ -0,0 +1,188 @@
+"""
+Plan jobs: claiming, staleness and the per-user guard
+"""
+
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from utils import jobs
+from utils.jobs import (
+    STALE_JOB_SECONDS, apply_plan_change, drain_plan_jobs, get_active_plan_job, submit_plan_job
+)
+from utils import planner
+from utils.planner import StudyPlanner, generate_cohort_plans
+
+
+def _queued_job(mongo, user, config, **fields):
+    """Insert a queued generation job as another process would"""
+    now = datetime.now()
+    job = dict({
+        'user_id': ObjectId(user), 'type': 'generate_plan', 'active': True,
+        'status': 'queued', 'stage': 'queued', 'progress': 0,
+        'changes': {'generate': config}, 'result': None, 'error': None, 'requests': 1,
+        'created_at': now, 'updated_at': now, 'started_at': None, 'finished_at': None
+    }, **fields)
+    mongo.db.plan_jobs.insert_one(job)
+    return job['_id']
+
+
+def test_drain_claims_jobs_queued_elsewhere(app, mongo, user, plan_config):
+    job_id = _queued_job(mongo, user, plan_config)
+
+    drain_plan_jobs(app)
+
+    job = mongo.db.plan_jobs.find_one({'_id': job_id})
+    assert job['status'] == 'done'
+    assert job['active'] is False
+    assert job['result']['total_sessions'] > 0
+
+
+def test_stale_job_no_longer_active(mongo, user, plan_config):
+    long_ago = datetime.now() - timedelta(seconds=STALE_JOB_SECONDS + 1)
+    job_id = _queued_job(mongo, user, plan_config, created_at=long_ago, updated_at=long_ago)
+
+    assert get_active_plan_job(mongo, user) is None
+    assert mongo.db.plan_jobs.find_one({'_id': job_id})['status'] == 'failed'
+
+
+def test_plan_change_runs_inline_when_idle(app, mongo, user, plan_config):
+    StudyPlanner(mongo, user).generate_plan(plan_config)
+
+    change = apply_plan_change(app, user, reinsert_backlog=True)
+
+    assert change == {'queued': False, 'backlog': {'rescheduled': 1, 'remaining': 0, 'displaced': 0}}
+    assert get_active_plan_job(mongo, user) is None
+
+
+def test_plan_change_waits_for_active_job(app, mongo, user, plan_config):
+    job_id = _queued_job(mongo, user, plan_config)
+    subject_id = str(mongo.cx['study_planner_test'].subjects.find_one()['_id'])
+
+    assert apply_plan_change(app, user, replan=[subject_id], reinsert_backlog=True) == {'queued': True}
+    assert mongo.db.plan_jobs.find_one({'_id': job_id})['pending'] == {
+        'replan': [subject_id], 'reinsert_backlog': True
+    }
+
+    drain_plan_jobs(app)
+
+    job = mongo.db.plan_jobs.find_one({'_id': job_id})
+    assert job['status'] == 'done' and job['active'] is False
+    assert 'pending' not in job
+    assert mongo.db.sessions.count_documents({'status': 'skipped'}) == 0
+
+
+def test_topic_deletion_waits_for_the_generation_in_flight(app, mongo, user, plan_config):
+    job_id = _queued_job(mongo, user, plan_config)
+    topic_id = mongo.cx['study_planner_test'].topics.find_one()['_id']
+
+    # The queued generation loaded the topic before it was deleted
+    assert apply_plan_change(app, user, delete_topics=[str(topic_id)]) == {'queued': True}
+    assert mongo.db.sessions.count_documents({'topic_id': topic_id}) == 3
+
+    drain_plan_jobs(app)
+
+    assert mongo.db.plan_jobs.find_one({'_id': job_id})['status'] == 'done'
+    assert mongo.db.sessions.count_documents({'topic_id': topic_id}) == 0
+
+
+def test_generation_recorded_on_an_inline_change_goes_to_the_workers(app, mongo, user, plan_config,
+                                                                     monkeypatch):
+    StudyPlanner(mongo, user).generate_plan(plan_config)
+    submitted = []
+    monkeypatch.setattr(jobs, '_get_executor', lambda app: type('Pool', (), {
+        'submit': lambda self, *args: submitted.append(args)
+    })())
+    reinsert = StudyPlanner.reinsert_backlog
+
+    def generate_requested_meanwhile(self):
+        job, created = submit_plan_job(app, user, plan_config)
+        assert not created
+        return reinsert(self)
+
+    monkeypatch.setattr(StudyPlanner, 'reinsert_backlog', generate_requested_meanwhile)
+
+    change = apply_plan_change(app, user, reinsert_backlog=True)
+
+    assert change['queued'] is False
+    job = get_active_plan_job(mongo, user)
+    assert job['status'] == 'queued' and 'generate' in job['changes']
+    assert submitted == [(drain_plan_jobs, app)]
+
+    drain_plan_jobs(app)
+
+    assert mongo.db.plan_jobs.find_one({'_id': job['_id']})['result']['total_sessions'] > 0
+
+
+def test_running_job_heartbeats_while_a_stage_runs(app, mongo, user, monkeypatch):
+    monkeypatch.setattr(jobs, 'HEARTBEAT_SECONDS', 0.01)
+    reinsert = StudyPlanner.reinsert_backlog
+    beats = []
+
+    def slow_reinsert(self):
+        started = get_active_plan_job(mongo, user)['updated_at']
+        time.sleep(0.1)
+        beats.append(get_active_plan_job(mongo, user)['updated_at'] > started)
+        return reinsert(self)
+
+    monkeypatch.setattr(StudyPlanner, 'reinsert_backlog', slow_reinsert)
+
+    apply_plan_change(app, user, reinsert_backlog=True)
+
+    assert beats == [True]
+
+
+def test_run_that_lost_its_guard_leaves_the_new_owner_alone(app, mongo, user, plan_config,
+                                                            monkeypatch):
+    reinsert = StudyPlanner.reinsert_backlog
+    replaced = []
+
+    def expired_meanwhile(self):
+        job = get_active_plan_job(mongo, user)
+        replaced.append(job['_id'])
+        mongo.db.plan_jobs.update_one({'_id': job['_id']}, {'$set': {'active': False, 'status': 'failed'}})
+        replaced.append(_queued_job(mongo, user, plan_config))
+        mongo.db.plan_jobs.update_one({'_id': replaced[1]}, {'$set': {'pending': {'reinsert_backlog': True}}})
+        return reinsert(self)
+
+    monkeypatch.setattr(StudyPlanner, 'reinsert_backlog', expired_meanwhile)
+
+    apply_plan_change(app, user, reinsert_backlog=True)
+
+    old_run, new_owner = (mongo.db.plan_jobs.find_one({'_id': job_id}) for job_id in replaced)
+    assert old_run['status'] == 'failed'
+    assert new_owner['active'] is True and new_owner['status'] == 'queued'
+    assert new_owner['pending'] == {'reinsert_backlog': True}
+
+
+def test_cohort_skips_users_with_an_active_job(mongo, user, plan_config):
+    job_id = _queued_job(mongo, user, plan_config)
+
+    results = generate_cohort_plans(mongo, [user], plan_config, max_workers=1)
+
+    assert 'error' in results[user]
+    assert mongo.db.plans.count_documents({}) == 0
+    assert get_active_plan_job(mongo, user)['_id'] == job_id
+
+
+def test_cohort_holds_the_guard_and_queues_changes_made_meanwhile(app, mongo, user, plan_config,
+                                                                  monkeypatch):
+    generate = planner._generate_cohort_plans
+
+    def change_during_generation(*args):
+        assert apply_plan_change(app, user, reinsert_backlog=True) == {'queued': True}
+        return generate(*args)
+
+    monkeypatch.setattr(planner, '_generate_cohort_plans', change_during_generation)
+
+    results = generate_cohort_plans(mongo, [user], plan_config, max_workers=1)
+
+    assert results[user]['total_sessions'] > 0
+    job = get_active_plan_job(mongo, user)
+    assert job['status'] == 'queued' and job['changes'] == {'reinsert_backlog': True}
+
+    drain_plan_jobs(app)
+
+    assert get_active_plan_job(mongo, user) is None
+    assert mongo.db.sessions.count_documents({'status': 'skipped'}) == 0
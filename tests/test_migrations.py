@@ -0,0 +1,45 @@
+"""
+Session schema backfill
+"""
+
+import threading
+from datetime import timedelta
+
+from app import start_index_sync, sync_database_in_background
+from utils import db_helpers
+from utils.db_helpers import SESSION_SCHEMA_VERSION, migrate_sessions
+
+
+def test_legacy_sessions_backfilled_once(mongo, user, today):
+    sessions = mongo.cx['study_planner_test'].sessions
+    legacy_id = sessions.insert_one({
+        'user_id': sessions.find_one()['user_id'], 'date': today + timedelta(days=1),
+        'block': 'Evening', 'status': 'pending', 'notes': 'Revision session', 'planned_minutes': 30
+    }).inserted_id
+
+    assert migrate_sessions(mongo) == 4
+    legacy = sessions.find_one({'_id': legacy_id})
+    assert (legacy['day'], legacy['block_order'], legacy['kind']) == \
+        (db_helpers.day_key(today + timedelta(days=1)), 2, 'revision')
+
+    version = mongo.cx['study_planner_test'].schema_versions.find_one({'_id': 'sessions'})
+    assert version['version'] == SESSION_SCHEMA_VERSION
+    assert migrate_sessions(mongo) is None
+
+    days = db_helpers.get_sessions_for_range(mongo, user, today, today + timedelta(days=1))
+    assert [s['_id'] for s in days[(today + timedelta(days=1)).date()]['Evening']] == [legacy_id]
+
+
+def test_startup_sync_runs_the_session_migration(app, mongo, user, today):
+    sessions = mongo.cx['study_planner_test'].sessions
+    sessions.update_many({}, {'$unset': {'day': '', 'block_order': ''}})
+    app.config['INDEX_SYNC_ON_STARTUP'] = True
+
+    sync_database_in_background(app)
+    with app.test_request_context():
+        start_index_sync()  # Already started; must not start a second sync
+    for thread in threading.enumerate():
+        if thread.name == 'index-sync':
+            thread.join(timeout=5)
+
+    assert sessions.count_documents({'day': {'$exists': False}}) == 0
@@ -0,0 +1,177 @@
+"""
+Planner scheduling, plan regeneration and backlog reinsertion
+"""
+
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+from pymongo import UpdateMany
+
+from utils.db_helpers import session_slot
+from utils.planner import SlotCalendar, StudyPlanner, build_schedule
+
+
+BLOCKS = ['Morning', 'Afternoon', 'Evening']
+
+
+def test_next_free_slot_skips_full_days():
+    day = datetime(2030, 1, 1)
+    calendar = SlotCalendar(BLOCKS)
+    for block in BLOCKS:
+        calendar.occupy(day + timedelta(days=1), block, 60)
+    calendar.occupy(day + timedelta(days=2), 'Morning', 60)
+
+    assert calendar.next_free_slot(day) == (day + timedelta(days=2), 'Afternoon')
+    assert calendar.next_free_slot(day, end_date=day + timedelta(days=1)) is None
+
+
+def test_next_free_slot_respects_session_and_minute_caps():
+    day = datetime(2030, 1, 1)
+    calendar = SlotCalendar(BLOCKS)
+    calendar.occupy(day + timedelta(days=1), 'Morning', 90)
+    calendar.occupy(day + timedelta(days=2), 'Morning', 30)
+    calendar.occupy(day + timedelta(days=2), 'Afternoon', 30)
+
+    assert calendar.next_free_slot(day, max_sessions=1) == (day + timedelta(days=3), 'Morning')
+    assert calendar.next_free_slot(day, minutes=60, daily_minutes=120) == (day + timedelta(days=2), 'Evening')
+    assert calendar.next_free_slot(day, max_sessions=2, minutes=90, daily_minutes=120) == \
+        (day + timedelta(days=3), 'Morning')
+    assert calendar.next_free_slot(day, minutes=150, daily_minutes=120) is None
+
+
+def test_reinsert_backlog_fills_open_slots(mongo, user, today, plan_config):
+    planner = StudyPlanner(mongo, user)
+    planner.generate_plan(plan_config)
+    sessions = mongo.cx['study_planner_test'].sessions
+    skipped = sessions.find_one({'status': 'skipped'})
+
+    result = StudyPlanner(mongo, user).reinsert_backlog()
+
+    assert result == {'rescheduled': 1, 'remaining': 0, 'displaced': 0}
+    moved = sessions.find_one({'_id': skipped['_id']})
+    assert moved['status'] == 'pending'
+    assert moved['date'] >= today + timedelta(days=1)
+
+    per_day, slots = {}, set()
+    for session in sessions.find({'status': 'pending', 'date': {'$gt': today}}):
+        per_day[session['day']] = per_day.get(session['day'], 0) + 1
+        slots.add((session['day'], session['block']))
+    assert max(per_day.values()) <= plan_config['max_sessions_per_day']
+    assert len(slots) == sum(per_day.values())
+
+
+def test_reinsert_backlog_displaces_lower_priority_session(mongo, user, today):
+    db = mongo.cx['study_planner_test']
+    maths = db.subjects.find_one({'name': 'Maths'})
+    physics = db.subjects.find_one({'name': 'Physics'})
+    db.subjects.update_one({'_id': physics['_id']}, {'$set': {'difficulty': 1}})
+    db.plans.insert_one({
+        'user_id': maths['user_id'], 'version': 1, 'active': True, 'daily_study_minutes': 60,
+        'start_date': today, 'end_date': today + timedelta(days=3), 'blocks': ['Morning'],
+        'max_sessions_per_day': 1, 'revision_buffer_days': 2, 'capacity_aware': False
+    })
+    topic = db.topics.find_one({'subject_id': physics['_id']})
+    full_week = [db.sessions.insert_one({
+        'user_id': maths['user_id'], 'subject_id': physics['_id'], 'topic_id': topic['_id'],
+        **session_slot(today + timedelta(days=offset), 'Morning'), 'kind': 'study',
+        'planned_minutes': 60, 'status': 'pending', 'notes': None
+    }).inserted_id for offset in (1, 2, 3)]
+    skipped = db.sessions.find_one({'status': 'skipped'})
+
+    result = StudyPlanner(mongo, user).reinsert_backlog()
+
+    assert result == {'rescheduled': 1, 'remaining': 0, 'displaced': 1}
+    assert db.sessions.find_one({'_id': skipped['_id']})['status'] == 'pending'
+    bumped = list(db.sessions.find({'_id': {'$in': full_week}, 'status': 'skipped'}))
+    assert len(bumped) == 1
+    assert db.sessions.find_one({'_id': skipped['_id']})['date'] == bumped[0]['date']
+
+
+def test_regenerate_keeps_notes_and_moves_every_session_to_new_plan(mongo, user, plan_config):
+    sessions = mongo.cx['study_planner_test'].sessions
+    StudyPlanner(mongo, user).generate_plan(plan_config)
+
+    revision = sessions.find_one({'kind': 'revision'})
+    sessions.update_one({'_id': revision['_id']}, {'$set': {'notes': 'Past papers 2019'}})
+
+    result = StudyPlanner(mongo, user).generate_plan(dict(plan_config, max_sessions_per_day=2))
+
+    noted = sessions.find_one({'_id': revision['_id']})
+    assert noted['notes'] == 'Past papers 2019'
+    assert noted['kind'] == 'revision'
+
+    pending = list(sessions.find({'status': 'pending', 'date': {'$gte': plan_config['start_date']}}))
+    assert {str(s['plan_id']) for s in pending} == {result['plan_id']}
+    assert len(pending) == result['total_sessions']
+
+
+def test_replan_keeps_session_ids_and_notes(mongo, user, plan_config):
+    sessions = mongo.cx['study_planner_test'].sessions
+    StudyPlanner(mongo, user).generate_plan(plan_config)
+
+    subject_id = mongo.cx['study_planner_test'].subjects.find_one({'name': 'Maths'})['_id']
+    query = {'subject_id': subject_id, 'status': 'pending', 'date': {'$gte': plan_config['start_date']}}
+    before = {s['_id'] for s in sessions.find(query)}
+    noted = sessions.find_one(dict(query, kind='study'))
+    sessions.update_one({'_id': noted['_id']}, {'$set': {'notes': 'Chapter 3 exercises'}})
+
+    result = StudyPlanner(mongo, user).replan([str(subject_id)])
+
+    assert result['total_sessions'] == len(before)
+    assert {s['_id'] for s in sessions.find(query)} == before
+    assert sessions.find_one({'_id': noted['_id']})['notes'] == 'Chapter 3 exercises'
+
+
+def test_diff_matches_legacy_revision_sessions_by_note(today):
+    topic_id, plan_id = ObjectId(), ObjectId()
+    legacy = {'_id': ObjectId(), 'topic_id': topic_id, 'notes': 'Revision session',
+              **session_slot(today, 'Morning'), 'planned_minutes': 30}
+    new = {'topic_id': topic_id, 'kind': 'revision', 'plan_id': plan_id,
+           **session_slot(today, 'Morning'), 'planned_minutes': 30}
+
+    operations = StudyPlanner._diff_sessions([legacy], [new])
+
+    assert new['_id'] == legacy['_id']
+    assert [(type(op), op._doc) for op in operations] == [
+        (UpdateMany, {'$set': {'plan_id': plan_id, 'kind': 'revision'}})
+    ]
+
+
+def _subject_with_topics(today, exam_days, topics):
+    subject = {'_id': ObjectId(), 'name': f'Exam in {exam_days} days',
+               'exam_date': today + timedelta(days=exam_days), 'difficulty': 3}
+    return subject, [{'_id': ObjectId(), 'subject_id': subject['_id'], 'title': f'Topic {i}',
+                      'estimated_minutes': 60} for i in range(topics)]
+
+
+def _capacity_config(today, days):
+    return {'daily_study_minutes': 240, 'start_date': today, 'end_date': today + timedelta(days=days),
+            'blocks': BLOCKS, 'max_sessions_per_day': 3, 'revision_buffer_days': 2,
+            'capacity_aware': True}
+
+
+def test_capacity_check_ignores_exams_after_the_plan(today):
+    subject, topics = _subject_with_topics(today, 90, 40)
+
+    result = build_schedule(str(ObjectId()), [subject], topics, _capacity_config(today, 7))
+
+    assert 'error' not in result
+    assert len(result['sessions']) == 24
+
+
+def test_capacity_check_ignores_passed_exams(today):
+    past, past_topics = _subject_with_topics(today, -5, 100)
+    upcoming, topics = _subject_with_topics(today, 40, 10)
+
+    result = build_schedule(str(ObjectId()), [past, upcoming], past_topics + topics,
+                            _capacity_config(today, 60))
+
+    assert 'error' not in result
+
+
+def test_capacity_check_rejects_exam_that_cannot_fit(today):
+    subject, topics = _subject_with_topics(today, 5, 40)
+
+    result = build_schedule(str(ObjectId()), [subject], topics, _capacity_config(today, 30))
+
+    assert result['error'].startswith('Not enough study time before the')
@@ -0,0 +1,96 @@
+"""
+Every read helper asks MongoDB for exactly the fields its callers use
+"""
+
+from datetime import timedelta
+
+from utils import db_helpers
+from utils.db_helpers import (
+    PLAN_FIELDS, SESSION_FIELDS, SUBJECT_FIELDS, SUBJECT_SUMMARY_FIELDS,
+    TOPIC_FIELDS, TOPIC_SUMMARY_FIELDS
+)
+from utils.planner import (
+    DIFF_SESSION_FIELDS, SUBJECT_PLANNING_FIELDS, TOPIC_PLANNING_FIELDS, StudyPlanner
+)
+
+
+def _only_projected(docs, projection):
+    """Whether every document holds nothing beyond _id and the projected fields"""
+    allowed = set(projection) | {'_id'}
+    return all(set(doc) <= allowed for doc in docs)
+
+
+def test_subjects_for_user(mongo, user):
+    subjects = db_helpers.get_subjects_for_user(mongo, user)
+
+    assert mongo.reads('subjects') == [SUBJECT_FIELDS]
+    assert subjects and _only_projected(subjects, set(SUBJECT_FIELDS) | {'days_left'})
+
+
+def test_topics_for_subject(mongo, user):
+    subject_id = mongo.cx['study_planner_test'].subjects.find_one()['_id']
+    topics = db_helpers.get_topics_for_subject(mongo, user, str(subject_id))
+
+    assert mongo.reads('topics') == [TOPIC_FIELDS]
+    assert topics and _only_projected(topics, TOPIC_FIELDS)
+
+
+def test_sessions_for_range_and_enrichment(mongo, user, today):
+    days = db_helpers.get_sessions_for_range(mongo, user, today - timedelta(days=2), today)
+
+    assert mongo.reads('sessions') == [SESSION_FIELDS]
+    assert mongo.reads('subjects') == [SUBJECT_SUMMARY_FIELDS]
+    assert mongo.reads('topics') == [TOPIC_SUMMARY_FIELDS]
+
+    sessions = [s for blocks in days.values() for block in blocks.values() for s in block]
+    assert len(sessions) == 3
+    assert _only_projected([s['subject'] for s in sessions], SUBJECT_SUMMARY_FIELDS)
+    assert _only_projected([s['topic'] for s in sessions], TOPIC_SUMMARY_FIELDS)
+
+
+def test_session_pages(mongo, user):
+    backlog = db_helpers.get_backlog_page(mongo, user)
+    history = db_helpers.get_session_history_page(mongo, user)
+
+    assert mongo.reads('sessions') == [SESSION_FIELDS, SESSION_FIELDS]
+    assert len(backlog['sessions']) == 1
+    assert len(history['sessions']) == 2
+
+
+def test_active_plan(mongo, user, plan_config):
+    StudyPlanner(mongo, user).generate_plan(plan_config)
+    mongo.calls.clear()
+
+    plan = db_helpers.get_active_plan(mongo, user)
+
+    assert mongo.reads('plans') == [PLAN_FIELDS]
+    assert _only_projected([plan], PLAN_FIELDS)
+
+
+def test_planner_loads(mongo, user):
+    planner = StudyPlanner(mongo, user)
+    planner._load_data()
+
+    assert mongo.reads('subjects') == [SUBJECT_PLANNING_FIELDS]
+    assert mongo.reads('topics') == [TOPIC_PLANNING_FIELDS]
+    assert _only_projected(planner.subjects, SUBJECT_PLANNING_FIELDS)
+    assert _only_projected(planner.topics, TOPIC_PLANNING_FIELDS)
+
+
+def test_plan_diff_reads_only_diff_fields(mongo, user, plan_config):
+    StudyPlanner(mongo, user).generate_plan(plan_config)
+
+    finds = mongo.reads('sessions', 'find')
+    assert DIFF_SESSION_FIELDS in finds
+    assert all(projection is not None for projection in finds)
+
+
+def test_dashboard_projects_session_fields(mongo, user, today):
+    data = db_helpers.load_dashboard_data(mongo, user, today.date())
+
+    pipeline = mongo.reads('sessions', 'aggregate')[0]
+    assert {'$project': SESSION_FIELDS} in pipeline
+
+    sessions = data['today_sessions'] + data['backlog']
+    assert len(sessions) == 2
+    assert _only_projected(sessions, set(SESSION_FIELDS) | {'subject', 'topic'})
@@ -0,0 +1,329 @@
+"""
+Query plan checks against a real mongod
+
+Seeds a scratch database with several synthetic users, creates the
+application's indexes, then runs every data-access helper, planner
+operation and page. Each read command they send is captured with a
+PyMongo command listener and re-run through explain() with
+executionStats. A query fails its check when the winning plan contains a
+COLLSCAN, a blocking in-memory SORT, an aggregation $sort with no limit
+over ungrouped documents (including inside $facet), or when it examines
+far more documents or index keys than it returns.
+
+The checks are skipped when no mongod answers at QUERY_PLAN_URI
+(default mongodb://localhost:27017):
+
+    QUERY_PLAN_URI=mongodb://localhost:27017 python -m pytest tests/test_query_plans.py -q
+
+The analysis itself is unit tested on sample explain output and always runs.
+"""
+
+import os
+import random
+from datetime import datetime, timedelta
+
+import pytest
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+
+from app import create_app, create_indexes
+from benchmarks.bench_planner import seed_user
+from utils import db_helpers
+from utils.counters import rebuild_progress_counters
+from utils.jobs import get_active_plan_job
+from utils.planner import StudyPlanner, calculate_readiness_score
+from utils.streaks import get_study_days
+
+
+QUERY_PLAN_URI = os.getenv('QUERY_PLAN_URI', 'mongodb://localhost:27017')
+DATABASE = 'study_planner_query_plans'
+USERS = 20
+
+READ_COMMANDS = ('find', 'aggregate', 'count', 'distinct')
+BAD_STAGES = ('COLLSCAN', 'SORT', '$sort')
+GROUPING_STAGES = ('$group', '$bucket', '$bucketAuto', '$sortByCount', '$count')
+MAX_EXAMINED_RATIO = 10  # Examined per returned document
+EXAMINED_SLACK = 50  # Always tolerated, so tiny results do not trip the ratio
+
+WORKLOAD = {
+    'subjects': 8, 'topics': 120, 'days': 60,
+    'exam_spread': 'uniform', 'max_sessions_per_day': 3,
+}
+
+
+class CommandRecorder(monitoring.CommandListener):
+    """Collect read commands issued while a check is running"""
+
+    def __init__(self):
+        self.label = None
+        self.commands = []
+
+    def started(self, event):
+        if self.label and event.command_name in READ_COMMANDS:
+            command = {k: v for k, v in event.command.items()
+                       if not k.startswith('$') and k not in ('lsid', 'txnNumber')}
+            self.commands.append((self.label, event.database_name, command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def _walk(node, stages, stats):
+    """Collect plan stage names and executionStats from an explain document"""
+    if isinstance(node, dict):
+        if isinstance(node.get('stage'), str):
+            stages.add(node['stage'])
+        if node.get('collectionScans'):  # $lookup stages report their inner scans this way
+            stages.add('COLLSCAN')
+        if 'executionStats' in node:
+            stats.append(node['executionStats'])
+        for key, value in node.items():
+            if key not in ('rejectedPlans', 'allPlansExecution'):
+                _walk(value, stages, stats)
+    elif isinstance(node, list):
+        # Aggregation stages (top level or in a $facet) sort in memory
+        # unless a limit was folded into the $sort or the input is grouped
+        grouped = False
+        for item in node:
+            name = next((k for k in item if k.startswith('$')), None) if isinstance(item, dict) else None
+            if name in GROUPING_STAGES:
+                grouped = True
+            elif name == '$sort' and isinstance(item[name], dict) and 'limit' not in item[name] \
+                    and not grouped:
+                stages.add('$sort')
+            _walk(item, stages, stats)
+
+
+def analyse(explain):
+    """
+    Judge one explain() result
+
+    Args:
+        explain (dict): explain output with executionStats verbosity
+
+    Returns:
+        dict: stages, examined, returned and problems found
+    """
+    stages, stats = set(), []
+    _walk(explain, stages, stats)
+
+    examined = sum(max(s.get('totalDocsExamined', 0), s.get('totalKeysExamined', 0)) for s in stats)
+    returned = sum(s.get('nReturned', 0) for s in stats)
+
+    problems = [f'{stage} stage' for stage in BAD_STAGES if stage in stages]
+    if examined > max(returned * MAX_EXAMINED_RATIO, returned + EXAMINED_SLACK):
+        problems.append(f'examined {examined} for {returned} returned')
+
+    return {
+        'stages': sorted(stages),
+        'examined': examined,
+        'returned': returned,
+        'problems': problems
+    }
+
+
+def _index_scan(returned, examined):
+    return {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'},
+            'executionStats': {'nReturned': returned, 'totalDocsExamined': examined}}
+
+
+def test_analyse_accepts_indexed_query():
+    assert analyse({'queryPlanner': {'winningPlan': _index_scan(5, 5)}})['problems'] == []
+
+
+def test_analyse_flags_collection_scan_and_blocking_sort():
+    explain = {'queryPlanner': {'winningPlan': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}}}
+    assert analyse(explain)['problems'] == ['COLLSCAN stage', 'SORT stage']
+
+
+def test_analyse_flags_overscan():
+    assert analyse(_index_scan(2, 500))['problems'] == ['examined 500 for 2 returned']
+
+
+def test_analyse_flags_unbounded_sort_inside_facet():
+    explain = {'stages': [
+        {'$cursor': _index_scan(10, 10)},
+        {'$facet': {
+            'today': [{'$match': {'day': 1}}, {'$sort': {'sortKey': {'block_order': 1}}}],
+            'backlog': [{'$sort': {'sortKey': {'date': 1}, 'limit': 6}}],
+            'week': [{'$group': {'_id': '$day'}}, {'$sort': {'sortKey': {'_id': 1}}}]
+        }}
+    ]}
+    assert analyse(explain)['problems'] == ['$sort stage']
+
+
+def test_analyse_accepts_limited_and_grouped_sorts():
+    explain = {'stages': [
+        {'$cursor': _index_scan(10, 10)},
+        {'$sort': {'sortKey': {'date': 1}, 'limit': 6}},
+        {'$group': {'_id': '$day'}},
+        {'$sort': {'sortKey': {'_id': 1}}}
+    ]}
+    assert analyse(explain)['problems'] == []
+
+
+def _seed(app, rng):
+    """Seed users with generated plans, some history and some completed topics"""
+    db = app.mongo.db
+    now = datetime.now()
+    today = datetime(now.year, now.month, now.day)
+    start_date = today - timedelta(days=20)
+    config = {
+        'daily_study_minutes': 240,
+        'start_date': start_date,
+        'end_date': start_date + timedelta(days=WORKLOAD['days']),
+        'blocks': StudyPlanner.BLOCK_ORDER,
+        'max_sessions_per_day': WORKLOAD['max_sessions_per_day'],
+        'revision_buffer_days': 2,
+        'capacity_aware': True
+    }
+
+    user_ids = []
+    for i in range(USERS):
+        workload = dict(WORKLOAD, days=WORKLOAD['days'] + 20)
+        user_id = seed_user(app.mongo, workload, start_date, seed=i)
+        StudyPlanner(app.mongo, str(user_id)).generate_plan(config)
+        user_ids.append(user_id)
+
+        # Past sessions are mostly done, some skipped
+        for session in db.sessions.find({'user_id': user_id, 'date': {'$lt': today}}, {'date': 1}):
+            if rng.random() < 0.8:
+                db.sessions.update_one({'_id': session['_id']}, {'$set': {
+                    'status': 'completed', 'completed_at': session['date'] + timedelta(hours=10)
+                }})
+            else:
+                db.sessions.update_one({'_id': session['_id']}, {'$set': {'status': 'skipped'}})
+
+        topic_ids = [t['_id'] for t in db.topics.find({'user_id': user_id}, {'_id': 1})]
+        db.topics.update_many({'_id': {'$in': rng.sample(topic_ids, len(topic_ids) // 3)}},
+                              {'$set': {'status': 'completed'}})
+
+    rebuild_progress_counters(app.mongo)
+    return user_ids, config
+
+
+def _page(url):
+    return lambda ctx: ctx['client'].get(url.format(**ctx))
+
+
+def _planner(ctx):
+    return StudyPlanner(ctx['mongo'], ctx['uid'])
+
+
+# Named callables covering every read path for one user
+CHECKS = {
+    'get_subjects_for_user': lambda ctx: db_helpers.get_subjects_for_user(ctx['mongo'], ctx['uid']),
+    'get_topics_for_subject': lambda ctx: db_helpers.get_topics_for_subject(
+        ctx['mongo'], ctx['uid'], ctx['subject_id']),
+    'get_topic_statistics_by_subject': lambda ctx: db_helpers.get_topic_statistics_by_subject(
+        ctx['mongo'], ctx['uid']),
+    'get_sessions_for_range': lambda ctx: db_helpers.get_sessions_for_range(
+        ctx['mongo'], ctx['uid'], ctx['now'], ctx['now'] + timedelta(days=6)),
+    'get_backlog_page': lambda ctx: db_helpers.get_backlog_page(
+        ctx['mongo'], ctx['uid'], 5, ctx['backlog_token']),
+    'get_session_history_page': lambda ctx: db_helpers.get_session_history_page(
+        ctx['mongo'], ctx['uid'], 20, ctx['history_token']),
+    'get_study_streak': lambda ctx: db_helpers.get_study_streak(ctx['mongo'], ctx['uid']),
+    'get_overall_progress': lambda ctx: db_helpers.get_overall_progress(ctx['mongo'], ctx['uid']),
+    'get_active_plan': lambda ctx: db_helpers.get_active_plan(ctx['mongo'], ctx['uid']),
+    'load_dashboard_data': lambda ctx: db_helpers.load_dashboard_data(
+        ctx['mongo'], ctx['uid'], ctx['now'].date()),
+    'get_study_days': lambda ctx: get_study_days(ctx['mongo'], ctx['uid']),
+    'calculate_readiness_score': lambda ctx: calculate_readiness_score(ctx['mongo'], ctx['uid']),
+    'get_active_plan_job': lambda ctx: get_active_plan_job(ctx['mongo'], ctx['uid']),
+    'StudyPlanner._load_data': lambda ctx: _planner(ctx)._load_data(),
+    'StudyPlanner.load_calendar': lambda ctx: _planner(ctx).load_calendar(
+        ctx['config']['start_date'], ctx['config']['end_date']),
+    'StudyPlanner.generate_plan': lambda ctx: _planner(ctx).generate_plan(ctx['config']),
+    'StudyPlanner.replan': lambda ctx: _planner(ctx).replan([ctx['subject_id']]),
+    'StudyPlanner.reschedule_session': lambda ctx: _planner(ctx).reschedule_session(
+        ctx['session_id'], ctx['config']['end_date'], StudyPlanner.BLOCK_ORDER[-1]),
+    'StudyPlanner.reinsert_backlog': lambda ctx: _planner(ctx).reinsert_backlog(),
+    'GET /dashboard': _page('/dashboard'),
+    'GET /subjects': _page('/subjects'),
+    'GET /subjects/<id>/topics': _page('/subjects/{subject_id}/topics'),
+    'GET /planner': _page('/planner'),
+    'GET /timetable': _page('/timetable'),
+    'GET /progress': _page('/progress'),
+    'GET /backlog': _page('/backlog?limit=5'),
+    'GET /sessions/history': _page('/sessions/history?limit=20'),
+}
+
+
+@pytest.fixture(scope='module')
+def plan_db():
+    """Seeded scratch database on a live mongod, dropped afterwards"""
+    probe = MongoClient(QUERY_PLAN_URI, serverSelectionTimeoutMS=1000)
+    try:
+        probe.admin.command('ping')
+    except PyMongoError:
+        pytest.skip(f'no mongod reachable at {QUERY_PLAN_URI}')
+    finally:
+        probe.close()
+
+    recorder = CommandRecorder()
+    monitoring.register(recorder)  # Must precede client creation in the app
+
+    app = create_app({
+        'MONGO_URI': f"{QUERY_PLAN_URI.rstrip('/')}/{DATABASE}",
+        'INDEX_SYNC_ON_STARTUP': False,  # create_indexes runs explicitly below
+        'USER_CACHE_TTL': 0,  # Read caches would hide queries
+        'TESTING': True
+    })
+    rng = random.Random(0)
+    db = app.mongo.db
+    db.client.drop_database(DATABASE)
+
+    with app.app_context():
+        try:
+            create_indexes()
+            user_ids, config = _seed(app, rng)
+
+            mongo = app.mongo
+            user_id = rng.choice(user_ids)
+            uid = str(user_id)
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = uid
+                sess['user_name'] = 'Benchmark User'
+
+            yield app, recorder, {
+                'mongo': mongo,
+                'uid': uid,
+                'now': datetime.now(),
+                'config': config,
+                'client': client,
+                'subject_id': str(db.subjects.find_one({'user_id': user_id}, {'_id': 1})['_id']),
+                'backlog_token': db_helpers.get_backlog_page(mongo, uid, 5)['next_token'],
+                'history_token': db_helpers.get_session_history_page(mongo, uid, 20)['next_token'],
+                'session_id': str(db.sessions.find_one(
+                    {'user_id': user_id, 'status': 'pending'}, {'_id': 1})['_id'])
+            }
+        finally:
+            recorder.label = None
+            db.client.drop_database(DATABASE)
+
+
+@pytest.mark.parametrize('label', list(CHECKS))
+def test_queries_use_indexes(plan_db, label):
+    app, recorder, ctx = plan_db
+    recorder.commands.clear()
+
+    recorder.label = label
+    try:
+        CHECKS[label](ctx)
+    finally:
+        recorder.label = None
+
+    failures = []
+    for _, database, command in recorder.commands:
+        explain = app.mongo.cx[database].command({'explain': command, 'verbosity': 'executionStats'})
+        verdict = analyse(explain)
+        if verdict['problems']:
+            name = next(iter(command))
+            failures.append(f"{name} {command[name]}: {'; '.join(verdict['problems'])}")
+
+    assert not failures
@@ -0,0 +1,96 @@
+"""
+Cross-request per-user read cache
+"""
+
+import pytest
+from flask import Flask
+
+from app import create_app
+from utils import jobs, user_cache
+from utils.db_helpers import load_dashboard_data
+from utils.user_cache import MemoryBackend, invalidate_user, user_cached
+
+
+calls = []
+
+
+@user_cached
+def count_calls(mongo, user_id):
+    calls.append((mongo.db.name, user_id))
+    return len(calls)
+
+
+@pytest.fixture(autouse=True)
+def memory_cache(monkeypatch):
+    monkeypatch.setenv('USER_CACHE_TTL', '60')
+    monkeypatch.setattr(user_cache, '_backend', MemoryBackend())
+
+
+def test_cache_hits_and_invalidation(make_mongo):
+    mongo = make_mongo()
+
+    first = count_calls(mongo, 'u1')
+    assert count_calls(mongo, 'u1') == first
+
+    invalidate_user('u1')
+    assert count_calls(mongo, 'u1') != first
+
+
+def test_databases_do_not_share_entries(make_mongo):
+    first = count_calls(make_mongo('planner_a'), 'u1')
+    second = count_calls(make_mongo('planner_b'), 'u1')
+
+    assert first != second
+    assert count_calls(make_mongo('planner_a'), 'u1') == first
+
+
+def test_dashboard_cached_for_the_day(mongo, user, today):
+    first = load_dashboard_data(mongo, user, today.date())
+    aggregations = len(mongo.reads('sessions', 'aggregate'))
+    second = load_dashboard_data(mongo, user, today.date())
+
+    assert first['round_trips'] >= 2 and second['round_trips'] == 0
+    assert dict(second, round_trips=first['round_trips']) == first
+    assert len(mongo.reads('sessions', 'aggregate')) == aggregations
+
+
+def test_each_app_keeps_its_own_backend(make_mongo):
+    apps = [Flask('a'), Flask('b')]
+    mongo = make_mongo()
+    results = []
+    for app in apps:
+        with app.app_context():
+            results.append(count_calls(mongo, 'u1'))
+            assert count_calls(mongo, 'u1') == results[-1]
+
+    assert results[0] != results[1]
+    assert apps[0].extensions['user_cache'] is not apps[1].extensions['user_cache']
+
+    with apps[0].app_context():
+        invalidate_user('u1')
+    with apps[1].app_context():
+        assert count_calls(mongo, 'u1') == results[1]
+
+
+def test_create_app_instances_keep_their_own_cache_and_workers():
+    apps = [create_app({'MONGO_URI': f'mongodb://localhost:27017/planner_{name}',
+                        'INDEX_SYNC_ON_STARTUP': False, 'TESTING': True})
+            for name in ('a', 'b')]
+    for app in apps:
+        with app.app_context():
+            user_cache.get_backend()
+            jobs._get_executor(app)
+
+    assert apps[0].extensions['user_cache'] is not apps[1].extensions['user_cache']
+    assert apps[0].extensions['plan_jobs'] is not apps[1].extensions['plan_jobs']
+
+
+def test_ttl_comes_from_the_app_config(make_mongo, monkeypatch):
+    monkeypatch.setenv('USER_CACHE_TTL', '0')
+    app = create_app({'USER_CACHE_TTL': 60, 'INDEX_SYNC_ON_STARTUP': False, 'TESTING': True})
+    mongo = make_mongo()
+
+    with app.app_context():
+        first = count_calls(mongo, 'u1')
+        assert count_calls(mongo, 'u1') == first
+    assert count_calls(mongo, 'u1') != first
@@ -0,0 +1,199 @@
+"""
+Materialised progress counters
+
+Each subject document carries a 'progress' sub-document with its topic
+totals, and each user document carries the same totals summed over all of
+their subjects plus a subject count. The subject routes keep them current
+with $inc as topics change, so progress pages read a single document
+instead of aggregating the topics collection. rebuild_progress_counters
+recomputes them from the topics and repairs any drift.
+
+Increments only apply to documents that already carry counters; documents
+created before the counters existed are backfilled by a rebuild instead,
+so a partial increment never masquerades as a complete total.
+"""
+
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from utils.db_helpers import aggregate_topic_statistics
+
+
+COUNTER_FIELDS = ('total_topics', 'completed_topics', 'total_minutes', 'completed_minutes')
+
+
+def empty_subject_counters():
+    """Counters for a subject without topics"""
+    return {field: 0 for field in COUNTER_FIELDS}
+
+
+def empty_user_counters():
+    """Counters for a user without subjects"""
+    counters = empty_subject_counters()
+    counters['total_subjects'] = 0
+    return counters
+
+
+def _topic_counters(topic, sign=1):
+    """Counter deltas contributed by a single topic"""
+    minutes = topic.get('estimated_minutes') or 0
+    completed = topic.get('status') == 'completed'
+
+    return {
+        'total_topics': sign,
+        'completed_topics': sign if completed else 0,
+        'total_minutes': sign * minutes,
+        'completed_minutes': sign * minutes if completed else 0
+    }
+
+
+def _apply(mongo, user_id, subject_id, deltas, subjects=0):
+    """Apply counter deltas to a subject and its owner"""
+    inc = {f'progress.{field}': value for field, value in deltas.items() if value}
+
+    if subject_id is not None and inc:
+        mongo.db.subjects.update_one(
+            {'_id': ObjectId(subject_id), 'progress': {'$exists': True}},
+            {'$inc': inc}
+        )
+
+    if subjects:
+        inc['progress.total_subjects'] = subjects
+    if inc:
+        mongo.db.users.update_one(
+            {'_id': ObjectId(user_id), 'progress': {'$exists': True}},
+            {'$inc': inc}
+        )
+
+
+def record_subject_added(mongo, user_id):
+    """
+    Count a newly inserted subject
+
+    Args:
+        mongo: Flask-PyMongo instance
+        user_id (str): User's ObjectId as string
+    """
+    _apply(mongo, user_id, None, {}, subjects=1)
+
+
+def record_subject_removed(mongo, subject):
+    """
+    Remove a subject and its topics from the owner's counters
+
+    Must run before the subject's topics are deleted, since subjects
+    without stored counters are measured from their topics.
+
+    Args:
+        mongo: Flask-PyMongo instance
+        subject (dict): The subject document being deleted
+    """
+    counters = subject.get('progress')
+    if counters is None:
+        stats = aggregate_topic_statistics(mongo, {
+            'user_id': subject['user_id'],
+            'subject_id': subject['_id']
+        }).get(subject['_id'], {})
+        counters = {field: stats.get(field, 0) for field in COUNTER_FIELDS}
+
+    deltas = {field: -counters.get(field, 0) for field in COUNTER_FIELDS}
+    _apply(mongo, subject['user_id'], None, deltas, subjects=-1)
+
+
+def record_topic_added(mongo, topic):
+    """
+    Count a newly inserted topic
+
+    Args:
+        mongo: Flask-PyMongo instance
+        topic (dict): The inserted topic document
+    """
+    _apply(mongo, topic['user_id'], topic['subject_id'], _topic_counters(topic))
+
+
+def record_topic_removed(mongo, topic):
+    """
+    Uncount a deleted topic
+
+    Args:
+        mongo: Flask-PyMongo instance
+        topic (dict): The deleted topic document
+    """
+    _apply(mongo, topic['user_id'], topic['subject_id'], _topic_counters(topic, sign=-1))
+
+
+def record_topic_status_changed(mongo, topic, new_status):
+    """
+    Move a topic's minutes between pending and completed
+
+    Args:
+        mongo: Flask-PyMongo instance
+        topic (dict): The topic document before the change
+        new_status (str): The status it was changed to
+    """
+    if topic.get('status') == new_status:
+        return
+
+    deltas = _topic_counters(topic, sign=-1)
+    for field, value in _topic_counters(dict(topic, status=new_status)).items():
+        deltas[field] += value
+
+    _apply(mongo, topic['user_id'], topic['subject_id'], deltas)
+
+
+def rebuild_progress_counters(mongo, user_ids=None, repair=True):
+    """
+    Recompute progress counters from the topics collection
+
+    Args:
+        mongo: Flask-PyMongo instance
+        user_ids (list): Users to check as strings (all users if None)
+        repair (bool): Write corrected counters where they drifted
+
+    Returns:
+        dict: Number of subjects and users checked and found drifted
+    """
+    subject_query = {}
+    user_query = {}
+    topic_match = {}
+    if user_ids is not None:
+        oids = [ObjectId(uid) for uid in user_ids]
+        subject_query = {'user_id': {'$in': oids}}
+        user_query = {'_id': {'$in': oids}}
+        topic_match = {'user_id': {'$in': oids}}
+
+    stats_by_subject = aggregate_topic_statistics(mongo, topic_match)
+
+    totals = {}
+    subject_ops = []
+    report = {'subjects_checked': 0, 'subjects_drifted': 0, 'users_checked': 0, 'users_drifted': 0}
+
+    for subject in mongo.db.subjects.find(subject_query, {'user_id': 1, 'progress': 1}):
+        stats = stats_by_subject.get(subject['_id'], {})
+        counters = {field: stats.get(field, 0) for field in COUNTER_FIELDS}
+
+        user_totals = totals.setdefault(subject['user_id'], empty_user_counters())
+        user_totals['total_subjects'] += 1
+        for field in COUNTER_FIELDS:
+            user_totals[field] += counters[field]
+
+        report['subjects_checked'] += 1
+        if subject.get('progress') != counters:
+            report['subjects_drifted'] += 1
+            subject_ops.append(UpdateOne({'_id': subject['_id']}, {'$set': {'progress': counters}}))
+
+    user_ops = []
+    for user in mongo.db.users.find(user_query, {'progress': 1}):
+        counters = totals.get(user['_id'], empty_user_counters())
+
+        report['users_checked'] += 1
+        if user.get('progress') != counters:
+            report['users_drifted'] += 1
+            user_ops.append(UpdateOne({'_id': user['_id']}, {'$set': {'progress': counters}}))
+
+    if repair:
+        if subject_ops:
+            mongo.db.subjects.bulk_write(subject_ops, ordered=False)
+        if user_ops:
+            mongo.db.users.bulk_write(user_ops, ordered=False)
+
+    return report
@@ -2,10 +2,164 @@
 Database query helpers and data retrieval utilities
 """
 
+import base64
+import json
+import threading
 from datetime import datetime, timedelta
+from bson.errors import InvalidId
 from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from utils.request_cache import request_cached
+from utils.user_cache import user_cached
 
 
+BLOCK_ORDER = ['Morning', 'Afternoon', 'Evening']
+
+# Fields each read path needs; everything else stays on the server
+SUBJECT_FIELDS = {'name': 1, 'exam_date': 1, 'difficulty': 1, 'color': 1}
+SUBJECT_SUMMARY_FIELDS = {'name': 1, 'color': 1}
+TOPIC_FIELDS = {'title': 1, 'estimated_minutes': 1, 'status': 1}
+TOPIC_SUMMARY_FIELDS = {'title': 1}
+SESSION_FIELDS = {
+    'subject_id': 1, 'topic_id': 1, 'date': 1, 'block': 1, 'day': 1, 'block_order': 1, 'kind': 1,
+    'status': 1, 'planned_minutes': 1, 'actual_minutes': 1, 'notes': 1
+}
+PLAN_FIELDS = {
+    'version': 1, 'daily_study_minutes': 1, 'start_date': 1, 'end_date': 1, 'blocks': 1,
+    'max_sessions_per_day': 1, 'revision_buffer_days': 1, 'capacity_aware': 1, 'created_at': 1
+}
+
+# Bump when sessions need a new backfill (see migrate_sessions)
+SESSION_SCHEMA_VERSION = 1
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+DASHBOARD_BACKLOG_SIZE = 5
+
+
+def day_key(date):
+    """Integer day key (YYYYMMDD) stored on sessions for indexed day lookups"""
+    return date.year * 10000 + date.month * 100 + date.day
+
+
+def day_from_key(key):
+    """Inverse of day_key"""
+    return datetime(key // 10000, key // 100 % 100, key % 100).date()
+
+
+def block_order(block):
+    """Numeric position of a block within the day; unknown blocks sort last"""
+    return BLOCK_ORDER.index(block) if block in BLOCK_ORDER else len(BLOCK_ORDER)
+
+
+def session_slot(date, block):
+    """
+    Slot fields for a session document
+    
+    Every write that sets a session's date or block goes through this, so
+    the derived day and block_order keys always match.
+    
+    Args:
+        date (datetime): Session date
+        block (str): Block name
+        
+    Returns:
+        dict: date, block, day and block_order
+    """
+    return {
+        'date': date,
+        'block': block,
+        'day': day_key(date),
+        'block_order': block_order(block)
+    }
+
+
+def session_kind(session):
+    """
+    Whether a session is a 'study' or a 'revision' session
+    
+    Sessions written before kind was stored are recognised by the note the
+    planner gave revision sessions.
+    
+    Args:
+        session (dict): Session document
+        
+    Returns:
+        str: 'study' or 'revision'
+    """
+    if session.get('kind'):
+        return session['kind']
+    return 'revision' if session.get('notes') == 'Revision session' else 'study'
+
+
+def backfill_session_slots(mongo, batch_size=1000):
+    """
+    Add day, block_order and kind to sessions written before they existed
+    
+    Safe to run repeatedly; only sessions missing a key are touched.
+    
+    Args:
+        mongo: Flask-PyMongo instance
+        batch_size (int): Sessions per bulk write
+        
+    Returns:
+        int: Number of sessions updated
+    """
+    cursor = mongo.db.sessions.find(
+        {'$or': [{'day': {'$exists': False}}, {'block_order': {'$exists': False}},
+                 {'kind': {'$exists': False}}]},
+        {'date': 1, 'block': 1, 'kind': 1, 'notes': 1}
+    )
+    
+    updated = 0
+    operations = []
+    for session in cursor:
+        slot = session_slot(session['date'], session.get('block'))
+        operations.append(UpdateOne(
+            {'_id': session['_id']},
+            {'$set': {'day': slot['day'], 'block_order': slot['block_order'], 'kind': session_kind(session)}}
+        ))
+        if len(operations) >= batch_size:
+            updated += mongo.db.sessions.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    
+    if operations:
+        updated += mongo.db.sessions.bulk_write(operations, ordered=False).modified_count
+    
+    return updated
+
+
+def migrate_sessions(mongo, force=False, batch_size=1000):
+    """
+    Bring sessions written by older versions up to the current schema
+    
+    Reads filter on day and block_order, so sessions without them would
+    not show up at all. The applied SESSION_SCHEMA_VERSION is recorded in
+    schema_versions, so once a database is current this is a single read.
+    
+    Args:
+        mongo: Flask-PyMongo instance
+        force (bool): Backfill even if the recorded version is current
+        batch_size (int): Sessions per bulk write
+        
+    Returns:
+        int: Sessions updated, or None if the database was already current
+    """
+    if not force:
+        doc = mongo.db.schema_versions.find_one({'_id': 'sessions'}, {'version': 1})
+        if doc and doc['version'] >= SESSION_SCHEMA_VERSION:
+            return None
+    
+    updated = backfill_session_slots(mongo, batch_size)
+    mongo.db.schema_versions.update_one(
+        {'_id': 'sessions'},
+        {'$set': {'version': SESSION_SCHEMA_VERSION, 'applied_at': datetime.now()}},
+        upsert=True
+    )
+    return updated
+
+
+@request_cached
 def get_subjects_for_user(mongo, user_id):
     """
     Get all subjects for a user, sorted by exam date
@@ -18,7 +172,7 @@ def get_subjects_for_user(mongo, user_id):
         list: List of subject documents with days_left calculated
     """
     subjects = list(mongo.db.subjects.find(
-        {'user_id': ObjectId(user_id)}
+        {'user_id': ObjectId(user_id)}, SUBJECT_FIELDS
     ).sort('exam_date', 1))
     
     # Calculate days left for each subject
@@ -33,6 +187,7 @@ def get_subjects_for_user(mongo, user_id):
     return subjects
 
 
+@request_cached
 def get_topics_for_subject(mongo, user_id, subject_id):
     """
     Get all topics for a specific subject
@@ -48,159 +203,317 @@ def get_topics_for_subject(mongo, user_id, subject_id):
     topics = list(mongo.db.topics.find({
         'user_id': ObjectId(user_id),
         'subject_id': ObjectId(subject_id)
-    }).sort('created_at', 1))
+    }, TOPIC_FIELDS).sort('created_at', 1))
     
     return topics
 
 
-def get_topic_statistics(mongo, user_id, subject_id):
+def build_topic_statistics(total_topics=0, completed_topics=0, total_minutes=0, completed_minutes=0):
+    """Build a topic statistics dict, computing the completion percentage"""
+    completion_percentage = (completed_minutes / total_minutes * 100) if total_minutes > 0 else 0
+    
+    return {
+        'total_topics': total_topics,
+        'completed_topics': completed_topics,
+        'total_minutes': total_minutes,
+        'completed_minutes': completed_minutes,
+        'completion_percentage': round(completion_percentage, 1)
+    }
+
+
+def aggregate_topic_statistics(mongo, match):
     """
-    Calculate topic completion statistics for a subject
+    Recompute topic statistics per subject from the topics collection
+    
+    Args:
+        mongo: Flask-PyMongo instance
+        match (dict): Filter applied to the topics collection
+        
+    Returns:
+        dict: subject ObjectId -> statistics (see build_topic_statistics)
+    """
+    minutes = {'$ifNull': ['$estimated_minutes', 0]}
+    is_completed = {'$eq': ['$status', 'completed']}
+    
+    pipeline = [
+        {'$match': match},
+        {'$group': {
+            '_id': '$subject_id',
+            'total_topics': {'$sum': 1},
+            'completed_topics': {'$sum': {'$cond': [is_completed, 1, 0]}},
+            'total_minutes': {'$sum': minutes},
+            'completed_minutes': {'$sum': {'$cond': [is_completed, minutes, 0]}}
+        }}
+    ]
+    
+    return {
+        row['_id']: build_topic_statistics(row['total_topics'], row['completed_topics'],
+                                 row['total_minutes'], row['completed_minutes'])
+        for row in mongo.db.topics.aggregate(pipeline)
+    }
+
+
+@request_cached
+def get_topic_statistics_by_subject(mongo, user_id, subject_id=None):
+    """
+    Get topic statistics for all of a user's subjects
+    
+    Reads the progress counters stored on the subject documents. Subjects
+    created before the counters existed are backfilled on first read.
     
     Args:
         mongo: Flask-PyMongo instance
         user_id (str): User's ObjectId as string
-        subject_id (str): Subject's ObjectId as string
+        subject_id (str): Optionally restrict to one subject
         
     Returns:
-        dict: Statistics including total topics, completed topics, total minutes, completed minutes
+        dict: subject ObjectId -> statistics (see get_topic_statistics)
     """
-    topics = get_topics_for_subject(mongo, user_id, subject_id)
+    query = {'user_id': ObjectId(user_id)}
+    if subject_id:
+        query['_id'] = ObjectId(subject_id)
     
-    total_topics = len(topics)
-    completed_topics = sum(1 for t in topics if t.get('status') == 'completed')
-    total_minutes = sum(t.get('estimated_minutes', 0) for t in topics)
-    completed_minutes = sum(t.get('estimated_minutes', 0) for t in topics if t.get('status') == 'completed')
+    subjects = list(mongo.db.subjects.find(query, {'progress': 1}))
     
-    completion_percentage = (completed_minutes / total_minutes * 100) if total_minutes > 0 else 0
+    if any('progress' not in s for s in subjects):
+        from utils.counters import rebuild_progress_counters
+        rebuild_progress_counters(mongo, [user_id])
+        subjects = list(mongo.db.subjects.find(query, {'progress': 1}))
     
     return {
-        'total_topics': total_topics,
-        'completed_topics': completed_topics,
-        'total_minutes': total_minutes,
-        'completed_minutes': completed_minutes,
-        'completion_percentage': round(completion_percentage, 1)
+        s['_id']: build_topic_statistics(**s['progress'])
+        for s in subjects if 'progress' in s
     }
 
 
-def get_sessions_for_date(mongo, user_id, date):
+@request_cached
+def get_topic_statistics(mongo, user_id, subject_id):
     """
-    Get all sessions for a specific date
+    Calculate topic completion statistics for a subject
     
     Args:
         mongo: Flask-PyMongo instance
         user_id (str): User's ObjectId as string
-        date (datetime): Target date
+        subject_id (str): Subject's ObjectId as string
         
     Returns:
-        list: List of session documents with subject and topic details
+        dict: Statistics including total topics, completed topics, total minutes, completed minutes
+    """
+    stats = get_topic_statistics_by_subject(mongo, user_id, subject_id)
+    return stats.get(ObjectId(subject_id), build_topic_statistics())
+
+
+def enrich_sessions(mongo, sessions):
     """
-    # Query sessions for the date
-    start_of_day = datetime(date.year, date.month, date.day, 0, 0, 0)
-    end_of_day = datetime(date.year, date.month, date.day, 23, 59, 59)
+    Attach subject and topic documents to sessions
     
-    sessions = list(mongo.db.sessions.find({
-        'user_id': ObjectId(user_id),
-        'date': {'$gte': start_of_day, '$lte': end_of_day}
-    }).sort('block', 1))
+    Collects the distinct subject and topic ids of the whole result set and
+    fetches each collection once with $in, so the query count stays constant
+    no matter how many sessions there are.
     
-    # Enrich sessions with subject and topic details
-    for session in sessions:
-        subject = mongo.db.subjects.find_one({'_id': session['subject_id']})
-        topic = mongo.db.topics.find_one({'_id': session['topic_id']})
+    Args:
+        mongo: Flask-PyMongo instance
+        sessions (list): Session documents
         
-        session['subject'] = subject
-        session['topic'] = topic
+    Returns:
+        list: The same sessions with 'subject' and 'topic' set
+    """
+    if not sessions:
+        return sessions
+    
+    subject_ids = list({s['subject_id'] for s in sessions if s.get('subject_id')})
+    topic_ids = list({s['topic_id'] for s in sessions if s.get('topic_id')})
+    
+    subjects = {s['_id']: s for s in mongo.db.subjects.find({'_id': {'$in': subject_ids}}, SUBJECT_SUMMARY_FIELDS)}
+    topics = {t['_id']: t for t in mongo.db.topics.find({'_id': {'$in': topic_ids}}, TOPIC_SUMMARY_FIELDS)}
+    
+    for session in sessions:
+        session['subject'] = subjects.get(session.get('subject_id'))
+        session['topic'] = topics.get(session.get('topic_id'))
     
     return sessions
 
 
-def get_backlog_sessions(mongo, user_id):
+@request_cached
+def get_sessions_for_range(mongo, user_id, start, end):
     """
-    Get all skipped sessions (backlog) for a user
+    Get all sessions between two dates, grouped by day and block
+    
+    Runs a single range query over the (user_id, day, block_order) index,
+    which returns sessions already in order, and enriches the whole result
+    set at once.
     
     Args:
         mongo: Flask-PyMongo instance
         user_id (str): User's ObjectId as string
+        start (datetime): First day of the range
+        end (datetime): Last day of the range (inclusive)
         
     Returns:
-        list: List of skipped session documents
+        dict: date -> {block: [sessions]} for every day in the range
     """
+    start_of_range = datetime(start.year, start.month, start.day, 0, 0, 0)
+    end_of_range = datetime(end.year, end.month, end.day, 23, 59, 59)
+    
     sessions = list(mongo.db.sessions.find({
         'user_id': ObjectId(user_id),
-        'status': 'skipped'
-    }).sort('date', 1))
+        'day': {'$gte': day_key(start), '$lte': day_key(end)}
+    }, SESSION_FIELDS).sort([('day', 1), ('block_order', 1)]))
+    
+    enrich_sessions(mongo, sessions)
+    
+    days = {}
+    current = start_of_range
+    while current <= end_of_range:
+        days[current.date()] = {}
+        current += timedelta(days=1)
     
-    # Enrich with subject and topic details
     for session in sessions:
-        subject = mongo.db.subjects.find_one({'_id': session['subject_id']})
-        topic = mongo.db.topics.find_one({'_id': session['topic_id']})
+        day = days.setdefault(session['date'].date(), {})
+        day.setdefault(session.get('block', 'Unscheduled'), []).append(session)
+    
+    return days
+
+
+def encode_page_token(session):
+    """
+    Build an opaque continuation token positioned after a session
+    
+    Args:
+        session (dict): Last session document of a page
         
-        session['subject'] = subject
-        session['topic'] = topic
+    Returns:
+        str: URL-safe token encoding the session's (date, _id) key
+    """
+    key = json.dumps([session['date'].isoformat(), str(session['_id'])])
+    return base64.urlsafe_b64encode(key.encode()).decode().rstrip('=')
+
+
+def decode_page_token(token):
+    """
+    Decode a continuation token from encode_page_token
     
-    return sessions
+    Args:
+        token (str): Token from a previous page
+        
+    Returns:
+        tuple: (date, ObjectId) of the last session already returned
+        
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        date, session_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(date), ObjectId(session_id)
+    except (TypeError, ValueError, InvalidId) as e:
+        raise ValueError('Invalid page token') from e
 
 
-def get_study_streak(mongo, user_id):
+def _paginate_sessions(mongo, query, page_size, after, descending):
+    """Fetch one keyset page of sessions ordered by (date, _id)"""
+    direction = -1 if descending else 1
+    beyond, reach = ('$lt', '$lte') if descending else ('$gt', '$gte')
+    
+    if after:
+        # The plain date bound lets the index seek to the cursor; the $or
+        # only filters the sessions that share the cursor's date
+        date, session_id = decode_page_token(after)
+        query = dict(query, date={reach: date}, **{'$or': [
+            {'date': {beyond: date}},
+            {'_id': {beyond: session_id}}
+        ]})
+    
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    sessions = list(mongo.db.sessions.find(query, SESSION_FIELDS)
+                    .sort([('date', direction), ('_id', direction)])
+                    .limit(page_size + 1))
+    
+    next_token = encode_page_token(sessions[page_size - 1]) if len(sessions) > page_size else None
+    sessions = enrich_sessions(mongo, sessions[:page_size])
+    
+    return {'sessions': sessions, 'next_token': next_token}
+
+
+@request_cached
+def get_backlog_page(mongo, user_id, page_size=DEFAULT_PAGE_SIZE, after=None):
     """
-    Calculate the current study streak (consecutive days with completed sessions)
+    Get one page of skipped sessions (backlog), oldest first
     
     Args:
         mongo: Flask-PyMongo instance
         user_id (str): User's ObjectId as string
+        page_size (int): Sessions per page (capped at MAX_PAGE_SIZE)
+        after (str): Continuation token from the previous page
         
     Returns:
-        int: Number of consecutive days with study activity
+        dict: 'sessions' (enriched) and 'next_token' (None on the last page)
+        
+    Raises:
+        ValueError: If the token is malformed
     """
-    # Get all completed sessions sorted by date descending
-    sessions = list(mongo.db.sessions.find({
-        'user_id': ObjectId(user_id),
-        'status': 'completed'
-    }).sort('completed_at', -1))
+    query = {'user_id': ObjectId(user_id), 'status': 'skipped'}
+    return _paginate_sessions(mongo, query, page_size, after, descending=False)
+
+
+@request_cached
+def get_session_history_page(mongo, user_id, page_size=DEFAULT_PAGE_SIZE, after=None):
+    """
+    Get one page of completed and skipped sessions, newest first
     
-    if not sessions:
-        return 0
+    Args:
+        mongo: Flask-PyMongo instance
+        user_id (str): User's ObjectId as string
+        page_size (int): Sessions per page (capped at MAX_PAGE_SIZE)
+        after (str): Continuation token from the previous page
+        
+    Returns:
+        dict: 'sessions' (enriched) and 'next_token' (None on the last page)
+        
+    Raises:
+        ValueError: If the token is malformed
+    """
+    query = {'user_id': ObjectId(user_id), 'status': {'$in': ['completed', 'skipped']}}
+    return _paginate_sessions(mongo, query, page_size, after, descending=True)
+
+
+@request_cached
+def get_study_streak(mongo, user_id):
+    """
+    Calculate the current study streak (consecutive days with completed sessions)
     
-    # Get unique dates with completed sessions
-    completed_dates = set()
-    for session in sessions:
-        if session.get('completed_at'):
-            date = session['completed_at'].date()
-            completed_dates.add(date)
+    Reads the streak state stored on the user document, rebuilding it from
+    completed sessions for users created before it existed.
     
-    # Sort dates descending
-    sorted_dates = sorted(completed_dates, reverse=True)
+    Args:
+        mongo: Flask-PyMongo instance
+        user_id (str): User's ObjectId as string
+        
+    Returns:
+        int: Number of consecutive days with study activity
+    """
+    from utils.streaks import current_streak, rebuild_study_streak
     
-    if not sorted_dates:
+    user = mongo.db.users.find_one({'_id': ObjectId(user_id)}, {'streak': 1})
+    if not user:
         return 0
     
-    # Check if today or yesterday has activity
-    today = datetime.now().date()
-    yesterday = today - timedelta(days=1)
-    
-    if sorted_dates[0] not in [today, yesterday]:
-        return 0  # Streak broken
-    
-    # Count consecutive days
-    streak = 1
-    current_date = sorted_dates[0]
+    streak = user.get('streak')
+    if streak is None:
+        streak = rebuild_study_streak(mongo, user_id)
     
-    for i in range(1, len(sorted_dates)):
-        expected_date = current_date - timedelta(days=1)
-        if sorted_dates[i] == expected_date:
-            streak += 1
-            current_date = sorted_dates[i]
-        else:
-            break
-    
-    return streak
+    return current_streak(streak)
 
 
+@request_cached
+@user_cached
 def get_overall_progress(mongo, user_id):
     """
     Calculate overall progress across all subjects
     
+    Reads the progress counters stored on the user document, backfilling
+    them first for users created before the counters existed.
+    
     Args:
         mongo: Flask-PyMongo instance
         user_id (str): User's ObjectId as string
@@ -208,53 +521,203 @@ def get_overall_progress(mongo, user_id):
     Returns:
         dict: Overall statistics including completion percentage, total topics, etc.
     """
-    subjects = get_subjects_for_user(mongo, user_id)
+    user = mongo.db.users.find_one({'_id': ObjectId(user_id)}, {'progress': 1})
     
-    total_topics = 0
-    completed_topics = 0
-    total_minutes = 0
-    completed_minutes = 0
+    if user is not None and 'progress' not in user:
+        from utils.counters import rebuild_progress_counters
+        rebuild_progress_counters(mongo, [user_id])
+        user = mongo.db.users.find_one({'_id': ObjectId(user_id)}, {'progress': 1})
     
-    for subject in subjects:
-        stats = get_topic_statistics(mongo, user_id, str(subject['_id']))
-        total_topics += stats['total_topics']
-        completed_topics += stats['completed_topics']
-        total_minutes += stats['total_minutes']
-        completed_minutes += stats['completed_minutes']
+    counters = dict((user or {}).get('progress') or {})
+    total_subjects = counters.pop('total_subjects', 0)
     
-    completion_percentage = (completed_minutes / total_minutes * 100) if total_minutes > 0 else 0
+    overall = build_topic_statistics(**counters)
+    overall['total_subjects'] = total_subjects
     
-    return {
-        'total_subjects': len(subjects),
-        'total_topics': total_topics,
-        'completed_topics': completed_topics,
-        'total_minutes': total_minutes,
-        'completed_minutes': completed_minutes,
-        'completion_percentage': round(completion_percentage, 1)
-    }
+    return overall
 
 
-def get_upcoming_exams(mongo, user_id, limit=5):
+# Queries issued by the current thread's last dashboard load
+_dashboard_round_trips = threading.local()
+
+
+def load_dashboard_data(mongo, user_id, today):
     """
-    Get upcoming exams sorted by date
+    Load everything the dashboard shows in two aggregations
+    
+    Session-derived sections (today's sessions, the 7-day counts, the first
+    backlog page and the backlog size) come from one $facet over sessions,
+    with topics joined in.
+    Subject-derived sections (upcoming exams, progress, streak) come from
+    one aggregation over the user document with its subjects joined in.
+    Users without stored counters or streak state are backfilled once
+    through the regular helpers; each such fallback counts as one more
+    round trip in the report, although the backfill itself issues several.
+    The sections are kept in the per-user cache for the rest of the day,
+    and round_trips is 0 when the cache served them.
     
     Args:
         mongo: Flask-PyMongo instance
         user_id (str): User's ObjectId as string
-        limit (int): Maximum number of exams to return
+        today (date): The dashboard's current date
         
     Returns:
-        list: List of subjects with upcoming exams
+        dict: sessions_by_block, today_sessions, week_counts, backlog,
+              backlog_count, backlog_next_token, upcoming_exams, progress,
+              streak and round_trips
     """
+    _dashboard_round_trips.count = 0
+    data = _load_dashboard_sections(mongo, user_id, today)
+    return dict(data, round_trips=_dashboard_round_trips.count)
+
+
+@user_cached
+def _load_dashboard_sections(mongo, user_id, today):
+    """Query the dashboard's sections (see load_dashboard_data)"""
+    from utils.streaks import current_streak
+    
+    user_oid = ObjectId(user_id)
+    today_key = day_key(today)
+    week = {'$gte': today_key, '$lte': day_key(today + timedelta(days=6))}
+    
+    # Only the topic title is shown
+    join_topic = [
+        {'$lookup': {'from': 'topics', 'localField': 'topic_id',
+                     'foreignField': '_id', 'as': 'topic'}},
+        {'$addFields': {'topic': {'$cond': [
+            {'$gt': [{'$size': '$topic'}, 0]},
+            {'_id': {'$arrayElemAt': ['$topic._id', 0]},
+             'title': {'$arrayElemAt': ['$topic.title', 0]}},
+            None
+        ]}}}
+    ]
+    
+    session_pipeline = [
+        {'$match': {
+            'user_id': user_oid,
+            '$or': [
+                {'day': week},
+                {'status': 'skipped'}
+            ]
+        }},
+        {'$project': SESSION_FIELDS},
+        {'$facet': {
+            # A handful of sessions; ordered by block below rather than by
+            # an in-memory $sort the index cannot serve inside $facet
+            'today': [
+                {'$match': {'day': today_key}}
+            ] + join_topic,
+            'week': [
+                {'$match': {'day': week}},
+                {'$group': {
+                    '_id': '$day',
+                    'total': {'$sum': 1},
+                    'completed': {'$sum': {'$cond': [{'$eq': ['$status', 'completed']}, 1, 0]}}
+                }}
+            ],
+            'backlog': [
+                {'$match': {'status': 'skipped'}},
+                {'$sort': {'date': 1, '_id': 1}},
+                {'$limit': DASHBOARD_BACKLOG_SIZE + 1}
+            ] + join_topic,
+            'backlog_count': [
+                {'$match': {'status': 'skipped'}},
+                {'$count': 'total'}
+            ]
+        }}
+    ]
+    
+    user_pipeline = [
+        {'$match': {'_id': user_oid}},
+        {'$lookup': {'from': 'subjects', 'localField': '_id',
+                     'foreignField': 'user_id', 'as': 'subjects'}},
+        {'$project': {
+            'progress': 1, 'streak': 1,
+            'subjects._id': 1, 'subjects.name': 1, 'subjects.color': 1, 'subjects.exam_date': 1
+        }}
+    ]
+    
+    facets = next(mongo.db.sessions.aggregate(session_pipeline))
+    user = next(mongo.db.users.aggregate(user_pipeline), {'subjects': []})
+    round_trips = 2
+    
+    subjects = {subject['_id']: subject for subject in user['subjects']}
+    for sess in facets['today'] + facets['backlog']:
+        sess['subject'] = subjects.get(sess.get('subject_id'))
+        sess['topic'] = sess.get('topic')
+    
+    sessions_by_block = {}
+    for sess in sorted(facets['today'], key=lambda s: s.get('block_order', len(BLOCK_ORDER))):
+        sessions_by_block.setdefault(sess.get('block', 'Unscheduled'), []).append(sess)
+    today_sessions = [sess for block_sessions in sessions_by_block.values() for sess in block_sessions]
+    
+    backlog = facets['backlog'][:DASHBOARD_BACKLOG_SIZE]
+    backlog_next_token = None
+    if len(facets['backlog']) > DASHBOARD_BACKLOG_SIZE:
+        backlog_next_token = encode_page_token(backlog[-1])
+    backlog_count = facets['backlog_count'][0]['total'] if facets['backlog_count'] else 0
+    
+    week_counts = {
+        day_from_key(row['_id']): {'total': row['total'], 'completed': row['completed']}
+        for row in facets['week']
+    }
+    
     now = datetime.now()
-    subjects = list(mongo.db.subjects.find({
-        'user_id': ObjectId(user_id),
-        'exam_date': {'$gte': now}
-    }).sort('exam_date', 1).limit(limit))
+    upcoming_exams = [
+        dict(subject, days_left=(subject['exam_date'] - now).days)
+        for subject in sorted(user['subjects'], key=lambda subject: subject['exam_date'])
+        if subject['exam_date'] >= now
+    ][:3]
+    
+    if 'progress' in user:
+        counters = dict(user['progress'])
+        total_subjects = counters.pop('total_subjects', 0)
+        progress = build_topic_statistics(**counters)
+        progress['total_subjects'] = total_subjects
+    else:
+        progress = get_overall_progress(mongo, user_id)
+        round_trips += 1
+    
+    if 'streak' in user:
+        streak = current_streak(user['streak'])
+    else:
+        streak = get_study_streak(mongo, user_id)
+        round_trips += 1
+    
+    _dashboard_round_trips.count = round_trips
     
-    # Calculate days left
-    for subject in subjects:
-        days_left = (subject['exam_date'] - now).days
-        subject['days_left'] = days_left
+    return {
+        'sessions_by_block': sessions_by_block,
+        'today_sessions': today_sessions,
+        'week_counts': week_counts,
+        'backlog': backlog,
+        'backlog_count': backlog_count,
+        'backlog_next_token': backlog_next_token,
+        'upcoming_exams': upcoming_exams,
+        'progress': progress,
+        'streak': streak
+    }
+
+
+@request_cached
+def get_active_plan(mongo, user_id):
+    """
+    Get the user's active plan
     
-    return subjects
+    Plans carry an increasing version; a newly generated plan only becomes
+    active once its sessions are written, so the highest active version is
+    the single plan readers should see. Legacy plans without a version or
+    active flag fall back to creation order.
+    
+    Args:
+        mongo: Flask-PyMongo instance
+        user_id (str): User's ObjectId as string
+        
+    Returns:
+        dict: Plan document or None
+    """
+    return mongo.db.plans.find_one(
+        {'user_id': ObjectId(user_id), 'active': {'$ne': False}},
+        PLAN_FIELDS,
+        sort=[('version', -1), ('created_at', -1)]
+    )
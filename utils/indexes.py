@@ -0,0 +1,244 @@
+"""
+Versioned index management
+
+INDEXES declares every index the application relies on. sync_indexes
+brings a database in line with it: missing indexes are built, and indexes
+made redundant by a compound index with the same leading keys, or retired
+in RETIRED_INDEXES, are dropped so writes to busy collections such as
+sessions and study_logs maintain only the indexes reads actually use.
+
+The applied INDEX_VERSION is recorded in the schema_versions collection,
+so the startup hook is a single read once a database is up to date. Bump
+INDEX_VERSION whenever INDEXES or RETIRED_INDEXES change. The startup
+hook also runs data migrations, which record their own versions there.
+"""
+
+import threading
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+
+INDEX_VERSION = 3
+
+INDEXES = {
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email_1', unique=True),
+    ],
+    'subjects': [
+        IndexModel([('user_id', ASCENDING), ('exam_date', ASCENDING)], name='user_id_1_exam_date_1'),
+    ],
+    'topics': [
+        IndexModel([('user_id', ASCENDING), ('subject_id', ASCENDING), ('created_at', ASCENDING)],
+                   name='user_id_1_subject_id_1_created_at_1'),
+    ],
+    'sessions': [
+        IndexModel([('user_id', ASCENDING), ('date', ASCENDING)], name='user_id_1_date_1'),
+        IndexModel([('user_id', ASCENDING), ('status', ASCENDING), ('date', ASCENDING), ('_id', ASCENDING)],
+                   name='user_id_1_status_1_date_1__id_1'),
+        IndexModel([('user_id', ASCENDING), ('day', ASCENDING), ('block_order', ASCENDING)],
+                   name='user_id_1_day_1_block_order_1'),
+    ],
+    'study_logs': [
+        IndexModel([('user_id', ASCENDING), ('logged_at', DESCENDING)], name='user_id_1_logged_at_-1'),
+    ],
+    'plans': [
+        IndexModel([('user_id', ASCENDING), ('version', DESCENDING), ('created_at', DESCENDING)],
+                   name='user_id_1_version_-1_created_at_-1'),
+    ],
+    'plan_jobs': [
+        IndexModel([('user_id', ASCENDING)], name='user_id_active_unique', unique=True,
+                   partialFilterExpression={'active': True}),
+        IndexModel([('user_id', ASCENDING), ('created_at', DESCENDING)], name='user_id_1_created_at_-1'),
+        IndexModel([('status', ASCENDING), ('created_at', ASCENDING)], name='status_1_created_at_1'),
+    ],
+}
+
+# Indexes earlier versions created that no query uses any more
+RETIRED_INDEXES = {
+    'subjects': ['exam_date_1'],
+    'topics': ['subject_id_1', 'user_id_1_subject_id_1'],
+    'sessions': ['date_1', 'status_1', 'user_id_1_status_1_date_1'],
+    'study_logs': ['logged_at_1'],
+}
+
+# Options that make two indexes with the same keys behave differently
+_SIGNIFICANT_OPTIONS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds')
+
+_sync_lock = threading.Lock()
+
+
+def _definition(index):
+    """Comparable (keys, options) pair for a spec or an index_information() entry"""
+    if isinstance(index, IndexModel):
+        index = dict(index.document)
+        keys = list(index['key'].items())
+    else:
+        keys = [(field, direction) for field, direction in index['key']]
+    options = {opt: index[opt] for opt in _SIGNIFICANT_OPTIONS if index.get(opt)}
+    return [(field, int(direction) if isinstance(direction, (int, float)) else direction)
+            for field, direction in keys], options
+
+
+def find_redundant_indexes(indexes, keep=()):
+    """
+    Indexes whose keys are a leading prefix of another index's keys
+
+    Any query such an index can serve, the longer index serves too.
+    Unique, sparse, partial and TTL indexes are never redundant, since
+    they do more than speed up reads.
+
+    Args:
+        indexes (dict): index_information() output for one collection
+        keep (iterable): Index names to never report
+
+    Returns:
+        dict: Redundant index name -> name of the index that covers it
+    """
+    definitions = {name: _definition(info) for name, info in indexes.items()}
+    redundant = {}
+
+    for name, (keys, options) in definitions.items():
+        if name == '_id_' or name in keep or options:
+            continue
+        for other, (other_keys, _) in definitions.items():
+            if other != name and other not in redundant and len(other_keys) > len(keys) \
+                    and other_keys[:len(keys)] == keys:
+                redundant[name] = other
+                break
+
+    return redundant
+
+
+def get_index_version(mongo):
+    """Index version last applied to this database (0 if never synced)"""
+    doc = mongo.db.schema_versions.find_one({'_id': 'indexes'}, {'version': 1})
+    return doc['version'] if doc else 0
+
+
+def sync_indexes(mongo, force=False, drop=True):
+    """
+    Build missing indexes and drop redundant or retired ones
+
+    Safe to run repeatedly and from several processes at once; index
+    creation and removal are idempotent on the server.
+
+    Args:
+        mongo: Flask-PyMongo instance
+        force (bool): Re-check even if the recorded version is current
+        drop (bool): Drop redundant and retired indexes
+
+    Returns:
+        dict: version, skipped, and the created and dropped index names
+    """
+    report = {'version': INDEX_VERSION, 'skipped': False, 'created': [], 'dropped': []}
+
+    if not force and get_index_version(mongo) >= INDEX_VERSION:
+        report['skipped'] = True
+        return report
+
+    for collection_name, models in INDEXES.items():
+        collection = mongo.db[collection_name]
+        existing = collection.index_information()
+
+        missing = []
+        for model in models:
+            name = model.document['name']
+            if name in existing and _definition(existing[name]) != _definition(model):
+                collection.drop_index(name)  # Same name, changed definition
+                del existing[name]
+            if name not in existing:
+                missing.append(model)
+
+        if missing:
+            # One createIndexes command builds them in a single collection scan
+            collection.create_indexes(missing)
+            report['created'].extend(f"{collection_name}.{m.document['name']}" for m in missing)
+
+        if drop:
+            existing = collection.index_information()
+            managed = [m.document['name'] for m in models]
+            obsolete = [n for n in RETIRED_INDEXES.get(collection_name, []) if n in existing]
+            obsolete += [n for n in find_redundant_indexes(existing, keep=managed) if n not in obsolete]
+            for name in obsolete:
+                collection.drop_index(name)
+                report['dropped'].append(f'{collection_name}.{name}')
+
+    mongo.db.schema_versions.update_one(
+        {'_id': 'indexes'},
+        {'$set': {'version': INDEX_VERSION, 'applied_at': datetime.now()}},
+        upsert=True
+    )
+
+    return report
+
+
+def sync_indexes_in_background(mongo, migrations=()):
+    """
+    Start sync_indexes on a daemon thread, once per process and database
+
+    Lets the server accept requests while indexes build. Data migrations
+    run on the same thread once the indexes are in place.
+
+    Args:
+        mongo: Flask-PyMongo instance
+        migrations (iterable): Callables taking mongo and returning the
+            number of documents they updated, or None if nothing was due
+    """
+    with _sync_lock:
+        if getattr(mongo, 'index_sync_started', False):
+            return
+        mongo.index_sync_started = True
+
+    def run():
+        try:
+            report = sync_indexes(mongo)
+            if report['created'] or report['dropped']:
+                print(f"✓ Indexes synced to version {report['version']}: "
+                      f"{len(report['created'])} created, {len(report['dropped'])} dropped")
+        except Exception as e:
+            print(f"⚠ Warning: Could not sync indexes - {e}")
+
+        for migration in migrations:
+            try:
+                updated = migration(mongo)
+                if updated is not None:
+                    print(f"✓ {migration.__name__}: {updated} documents updated")
+            except Exception as e:
+                print(f"⚠ Warning: {migration.__name__} failed - {e}")
+
+    threading.Thread(target=run, name='index-sync', daemon=True).start()
+
+
+def get_index_usage(mongo, collections=None):
+    """
+    Per-index usage counters from $indexStats
+
+    Counters are kept per mongod and reset when it restarts, so judge
+    unused indexes on a server that has been up through normal traffic.
+
+    Args:
+        mongo: Flask-PyMongo instance
+        collections (list): Collections to report (default: all managed)
+
+    Returns:
+        list: Dicts with collection, name, ops, since, managed and redundant
+    """
+    rows = []
+
+    for collection_name in collections or list(INDEXES):
+        collection = mongo.db[collection_name]
+        managed = {m.document['name'] for m in INDEXES.get(collection_name, [])}
+        redundant = find_redundant_indexes(collection.index_information(), keep=managed)
+
+        for stat in collection.aggregate([{'$indexStats': {}}]):
+            rows.append({
+                'collection': collection_name,
+                'name': stat['name'],
+                'ops': stat['accesses']['ops'],
+                'since': stat['accesses']['since'],
+                'managed': stat['name'] in managed or stat['name'] == '_id_',
+                'redundant': stat['name'] in redundant
+            })
+
+    rows.sort(key=lambda row: (row['collection'], row['ops']))
+    return rows
@@ -0,0 +1,512 @@
+"""
+Background plan generation jobs
+
+Plan generation runs on a small worker pool per app instead of the
+request thread. Jobs live in the plan_jobs collection so any worker
+process can report their status, and a unique partial index on
+(user_id, active) guarantees at most one job changing a user's plan at a
+time; repeated generation requests coalesce onto the job that is already
+in flight.
+
+Every change to a user's sessions goes through that guard: full
+generation, incremental replans after subject or topic edits, removing
+the sessions of deleted subjects and topics, and backlog reinsertion. A change that arrives while a job is active is recorded on
+the job as pending work, and the job runs it before it releases the guard.
+
+Any worker process can run a queued job: workers claim the oldest queued
+job atomically, and a status poll for a job nobody has picked up starts a
+claim in the polling process. Running jobs refresh updated_at every
+HEARTBEAT_SECONDS, so a job without progress for STALE_JOB_SECONDS has
+lost its worker; such jobs are failed whenever the user's jobs are read.
+Each claim gets a run_id, and a run only writes to its job while the job
+is still active under that run_id, so a run that lost the guard this way
+can never release or change the guard of the run that replaced it.
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from utils.user_cache import invalidate_user
+
+
+STALE_JOB_SECONDS = 600  # Active jobs without progress for this long are abandoned
+HEARTBEAT_SECONDS = 30  # Running jobs refresh updated_at this often
+UNCLAIMED_JOB_SECONDS = 5  # Queued this long, a status poll starts a claim
+
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app):
+    """Create the app's worker pool on first use (kept in app.extensions)"""
+    with _executor_lock:
+        if 'plan_jobs' not in app.extensions:
+            workers = int(app.config.get('PLAN_JOB_WORKERS') or os.getenv('PLAN_JOB_WORKERS', '2'))
+            app.extensions['plan_jobs'] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='plan-job')
+    return app.extensions['plan_jobs']
+
+
+def _expire_stale_jobs(mongo, users):
+    """Fail active jobs matching the user filter that stopped reporting progress"""
+    now = datetime.now()
+    mongo.db.plan_jobs.update_many(
+        {
+            'user_id': users,
+            'active': True,
+            'updated_at': {'$lt': now - timedelta(seconds=STALE_JOB_SECONDS)}
+        },
+        {'$set': {
+            'status': 'failed',
+            'stage': 'failed',
+            'active': False,
+            'error': 'Plan generation timed out. Please try again.',
+            'finished_at': now
+        }}
+    )
+
+
+def expire_stale_plan_jobs(mongo, user_id):
+    """
+    Fail a user's active jobs whose worker stopped reporting progress
+    
+    Args:
+        mongo: Flask-PyMongo instance
+        user_id (str): User's ObjectId as string
+    """
+    _expire_stale_jobs(mongo, ObjectId(user_id))
+
+
+def _new_job(user_id, job_type, status, changes, now):
+    """Job document holding the guard for a user"""
+    return {
+        'user_id': ObjectId(user_id),
+        'type': job_type,
+        'active': True,
+        'status': status,
+        'stage': status,
+        'progress': 0,
+        'changes': changes,
+        'result': None,
+        'error': None,
+        'requests': 1,
+        'created_at': now,
+        'updated_at': now,
+        'started_at': now if status == 'running' else None,
+        'finished_at': None,
+        'run_id': ObjectId() if status == 'running' else None
+    }
+
+
+def _add_pending(mongo, user_id, changes):
+    """
+    Record changes on the user's active job for it to run before releasing
+    
+    Returns:
+        dict: The active job, or None if no job is active any more
+    """
+    update = {'$inc': {'requests': 1}}
+    if changes.get('generate'):
+        update['$set'] = {'pending.generate': changes['generate']}
+    for field in ('replan', 'delete_subjects', 'delete_topics'):
+        if changes.get(field):
+            update.setdefault('$addToSet', {})[f'pending.{field}'] = {'$each': changes[field]}
+    if changes.get('reinsert_backlog'):
+        update.setdefault('$set', {})['pending.reinsert_backlog'] = True
+    
+    return mongo.db.plan_jobs.find_one_and_update(
+        {'user_id': ObjectId(user_id), 'active': True},
+        update,
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def submit_plan_job(app, user_id, config):
+    """
+    Queue plan generation for a user, or join the one already running
+    
+    If the active job is an incremental change rather than a generation,
+    the generation is recorded on it and runs once the change is done.
+    
+    Args:
+        app: Flask application (used for the worker's app context)
+        user_id (str): User's ObjectId as string
+        config (dict): Plan configuration for StudyPlanner.generate_plan
+        
+    Returns:
+        tuple: (job document, True if a new job was created)
+    """
+    jobs = app.mongo.db.plan_jobs
+    expire_stale_plan_jobs(app.mongo, user_id)
+    
+    while True:
+        job = _new_job(user_id, 'generate_plan', 'queued', {'generate': config}, datetime.now())
+        try:
+            jobs.insert_one(job)
+        except DuplicateKeyError:
+            # Coalesce onto the generation in flight, or queue behind the active change
+            job = jobs.find_one_and_update(
+                {'user_id': ObjectId(user_id), 'active': True, 'changes.generate': {'$exists': True}},
+                {'$inc': {'requests': 1}},
+                return_document=ReturnDocument.AFTER
+            ) or _add_pending(app.mongo, user_id, {'generate': config})
+            if job is not None:
+                return job, False
+            continue  # The active job finished in between; try again
+        
+        _get_executor(app).submit(drain_plan_jobs, app)
+        return job, True
+
+
+def apply_plan_change(app, user_id, replan=(), reinsert_backlog=False, delete_subjects=(),
+                      delete_topics=()):
+    """
+    Replan subjects, drop deleted ones' sessions and/or reinsert the backlog
+    under the per-user guard
+    
+    Runs in the calling request when no job is active for the user;
+    otherwise the change is recorded on the active job, which applies it
+    after its own work.
+    
+    Args:
+        app: Flask application
+        user_id (str): User's ObjectId as string
+        replan (iterable of str): Subjects whose topics or exam changed
+        reinsert_backlog (bool): Re-slot skipped sessions afterwards
+        delete_subjects (iterable of str): Deleted subjects whose sessions go
+        delete_topics (iterable of str): Deleted topics whose sessions go
+        
+    Returns:
+        dict: 'queued' (bool), plus 'backlog' (reinsert_backlog's counts)
+              when the change ran here
+    """
+    changes = {
+        'replan': [str(sid) for sid in replan],
+        'reinsert_backlog': reinsert_backlog,
+        'delete_subjects': [str(sid) for sid in delete_subjects],
+        'delete_topics': [str(tid) for tid in delete_topics]
+    }
+    jobs = app.mongo.db.plan_jobs
+    expire_stale_plan_jobs(app.mongo, user_id)
+    
+    while True:
+        job = _new_job(user_id, 'plan_change', 'running', changes, datetime.now())
+        try:
+            jobs.insert_one(job)
+        except DuplicateKeyError:
+            if _add_pending(app.mongo, user_id, changes) is not None:
+                return {'queued': True}
+            continue  # The active job finished in between; try again
+        
+        outcome = _run_job(app, job, inline=True)
+        return {'queued': False, 'backlog': outcome.get('backlog')}
+
+
+def _apply_changes(mongo, user_id, changes, progress):
+    """
+    Run one batch of plan changes
+    
+    Sessions of deleted subjects and topics go first, so they never hold
+    slots. A full generation re-plans every subject, so replans recorded
+    with it are skipped.
+    
+    Returns:
+        dict: 'plan' (generate_plan's result) and/or 'backlog' (reinsert_backlog's counts)
+    """
+    from utils.planner import StudyPlanner
+    from utils.streaks import rebuild_study_streak
+    
+    outcome = {}
+    deleted = []
+    if changes.get('delete_subjects'):
+        deleted.append({'subject_id': {'$in': [ObjectId(sid) for sid in changes['delete_subjects']]}})
+    if changes.get('delete_topics'):
+        deleted.append({'topic_id': {'$in': [ObjectId(tid) for tid in changes['delete_topics']]}})
+    if deleted:
+        result = mongo.db.sessions.delete_many({'user_id': ObjectId(user_id), '$or': deleted})
+        # Completed sessions may have gone too; recount the streak from what remains
+        if result.deleted_count:
+            rebuild_study_streak(mongo, user_id)
+    
+    if changes.get('generate'):
+        outcome['plan'] = StudyPlanner(mongo, user_id).generate_plan(changes['generate'], progress=progress)
+        if 'error' in outcome['plan']:
+            return outcome
+    elif changes.get('replan'):
+        StudyPlanner(mongo, user_id).replan(changes['replan'])
+    
+    if changes.get('reinsert_backlog'):
+        outcome['backlog'] = StudyPlanner(mongo, user_id).reinsert_backlog()
+    
+    return outcome
+
+
+def _run_job(app, job, inline=False):
+    """
+    Run a claimed job, then any changes recorded on it meanwhile, and release it
+    
+    A job run inline by a request hands a full generation recorded on it
+    back to the worker pool: it is queued again with the pending changes
+    rather than run in the request thread.
+    
+    Args:
+        app: Flask application
+        job (dict): Claimed job document
+        inline (bool): Whether the job runs in a request thread
+        
+    Returns:
+        dict: Outcome of the last batch of changes run here
+    """
+    jobs = app.mongo.db.plan_jobs
+    user_id = str(job['user_id'])
+    owned = {'_id': job['_id'], 'run_id': job['run_id'], 'active': True}
+    
+    def report(stage, progress):
+        jobs.update_one(
+            owned,
+            {'$set': {'stage': stage, 'progress': progress, 'updated_at': datetime.now()}}
+        )
+    
+    # Keep the job fresh while a long stage runs
+    stopped = threading.Event()
+    
+    def heartbeat():
+        while not stopped.wait(HEARTBEAT_SECONDS):
+            try:
+                jobs.update_one(owned, {'$set': {'updated_at': datetime.now()}})
+            except Exception:
+                app.logger.warning('Heartbeat for plan job %s failed', job['_id'], exc_info=True)
+    
+    threading.Thread(target=heartbeat, name='plan-job-heartbeat', daemon=True).start()
+    
+    changes = job['changes']
+    outcome = {}
+    update = {'status': 'failed', 'error': 'Plan generation failed. Please try again.'}
+    try:
+        while True:
+            outcome = _apply_changes(app.mongo, user_id, changes, report)
+            plan = outcome.get('plan')
+            
+            if plan and 'error' in plan:
+                update = {'status': 'failed', 'error': plan['error']}
+                break
+            
+            done = {'status': 'done', 'progress': 100}
+            if plan:
+                done['result'] = {'plan_id': plan['plan_id'], 'total_sessions': plan['total_sessions']}
+            
+            # Release only if nothing was recorded while this batch ran
+            finished = datetime.now()
+            released = jobs.update_one(
+                dict(owned, pending={'$exists': False}),
+                {'$set': dict(done, stage='done', active=False, finished_at=finished, updated_at=finished)}
+            )
+            if released.matched_count:
+                update = None
+                break
+            
+            claimed = jobs.find_one_and_update(
+                owned,
+                {'$unset': {'pending': ''}, '$set': {'updated_at': datetime.now()}},
+                return_document=ReturnDocument.BEFORE
+            )
+            if claimed is None:
+                app.logger.warning('Plan job %s lost its guard; leaving it to its new owner', job['_id'])
+                update = None
+                break
+            changes = claimed['pending']
+            
+            if inline and changes.get('generate'):
+                # Keep the guard but leave the generation to the worker pool
+                jobs.update_one(owned, {'$set': {
+                    'type': 'generate_plan', 'status': 'queued', 'stage': 'queued',
+                    'progress': 0, 'changes': changes, 'updated_at': datetime.now(), 'run_id': None
+                }})
+                _get_executor(app).submit(drain_plan_jobs, app)
+                update = None
+                break
+    except Exception:
+        app.logger.exception('Plan job %s failed', job['_id'])
+    finally:
+        stopped.set()
+        if update is not None:
+            finished = datetime.now()
+            jobs.update_one(owned, {
+                '$set': dict(update, stage='failed', active=False, finished_at=finished, updated_at=finished),
+                '$unset': {'pending': ''}
+            })
+        invalidate_user(user_id)
+    
+    return outcome
+
+
+def drain_plan_jobs(app):
+    """
+    Claim and run queued jobs, oldest first, until none are left
+    
+    Safe to run in several threads and processes at once; each job is
+    claimed by exactly one of them.
+    
+    Args:
+        app: Flask application
+    """
+    with app.app_context():
+        jobs = app.mongo.db.plan_jobs
+        while True:
+            now = datetime.now()
+            job = jobs.find_one_and_update(
+                {'status': 'queued', 'active': True},
+                {'$set': {
+                    'status': 'running',
+                    'stage': 'starting',
+                    'progress': 5,
+                    'started_at': now,
+                    'updated_at': now,
+                    'run_id': ObjectId()
+                }},
+                sort=[('created_at', 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if job is None:
+                return
+            _run_job(app, job)
+
+
+def resume_plan_job(app, job):
+    """
+    Start a claim for a job that no worker has picked up
+    
+    The process that queued a job may have exited before running it, e.g.
+    when a pre-fork server recycles the worker.
+    
+    Args:
+        app: Flask application
+        job (dict): Job document from a status poll
+    """
+    if job['status'] == 'queued' and \
+            job['updated_at'] < datetime.now() - timedelta(seconds=UNCLAIMED_JOB_SECONDS):
+        _get_executor(app).submit(drain_plan_jobs, app)
+
+
+def acquire_plan_guards(mongo, user_ids, job_type='cohort_plan'):
+    """
+    Take the per-user guard for many users with one bulk insert
+    
+    Users that already have an active job are left out, so batch work
+    never interleaves with a job changing their plan.
+    
+    Args:
+        mongo: Flask-PyMongo instance
+        user_ids (list of str): Users to guard
+        job_type (str): Type recorded on the guard jobs
+        
+    Returns:
+        dict: user_id -> guard job document, for users whose guard was taken
+    """
+    if not user_ids:
+        return {}
+    
+    _expire_stale_jobs(mongo, {'$in': [ObjectId(uid) for uid in user_ids]})
+    
+    now = datetime.now()
+    jobs = [_new_job(uid, job_type, 'running', {}, now) for uid in user_ids]
+    taken = set(range(len(jobs)))
+    try:
+        mongo.db.plan_jobs.insert_many(jobs, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details['writeErrors']
+        if any(error['code'] != 11000 for error in errors):
+            raise
+        taken -= {error['index'] for error in errors}
+    
+    return {str(user_ids[i]): jobs[i] for i in sorted(taken)}
+
+
+def release_plan_guards(mongo, guards, results):
+    """
+    Release guards taken by acquire_plan_guards
+    
+    A guard that had plan changes recorded on it meanwhile is queued with
+    those changes instead, for drain_plan_jobs to run.
+    
+    Args:
+        mongo: Flask-PyMongo instance
+        guards (dict): user_id -> guard job, from acquire_plan_guards
+        results (dict): user_id -> result; users without a successful
+            result are marked failed
+            
+    Returns:
+        int: Number of guards queued with pending changes
+    """
+    jobs = mongo.db.plan_jobs
+    finished = datetime.now()
+    outcomes = {'done': [], 'failed': []}
+    for user_id, job in guards.items():
+        result = results.get(user_id)
+        outcomes['failed' if result is None or 'error' in result else 'done'].append(job['_id'])
+    
+    for status, ids in outcomes.items():
+        if ids:
+            jobs.update_many(
+                {'_id': {'$in': ids}, 'active': True, 'pending': {'$exists': False}},
+                {'$set': {'status': status, 'stage': status, 'progress': 100, 'active': False,
+                          'finished_at': finished, 'updated_at': finished}}
+            )
+    
+    queued = 0
+    for job in jobs.find({'_id': {'$in': [job['_id'] for job in guards.values()]}, 'active': True},
+                         {'_id': 1}):
+        # Take the pending changes atomically; any recorded after this stay
+        # pending and run when the queued job is drained
+        before = jobs.find_one_and_update(
+            {'_id': job['_id'], 'active': True, 'pending': {'$exists': True}},
+            {'$unset': {'pending': ''}},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            continue
+        jobs.update_one({'_id': job['_id']}, {'$set': {
+            'changes': before['pending'], 'status': 'queued', 'stage': 'queued',
+            'progress': 0, 'updated_at': datetime.now(), 'run_id': None
+        }})
+        queued += 1
+    
+    return queued
+
+
+def get_plan_job(mongo, user_id, job_id):
+    """
+    Get one of the user's plan jobs
+    
+    Args:
+        mongo: Flask-PyMongo instance
+        user_id (str): User's ObjectId as string
+        job_id (str): Job ObjectId as string
+        
+    Returns:
+        dict: Job document or None
+    """
+    if not ObjectId.is_valid(job_id):
+        return None
+    expire_stale_plan_jobs(mongo, user_id)
+    return mongo.db.plan_jobs.find_one({
+        '_id': ObjectId(job_id),
+        'user_id': ObjectId(user_id)
+    })
+
+
+def get_active_plan_job(mongo, user_id):
+    """
+    Get the user's queued or running plan job, if any
+    
+    Args:
+        mongo: Flask-PyMongo instance
+        user_id (str): User's ObjectId as string
+        
+    Returns:
+        dict: Job document or None
+    """
+    expire_stale_plan_jobs(mongo, user_id)
+    return mongo.db.plan_jobs.find_one({'user_id': ObjectId(user_id), 'active': True})
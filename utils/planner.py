@@ -18,52 +18,413 @@ Algorithm Overview:
 
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
+from pymongo import InsertOne, UpdateOne, UpdateMany, DeleteOne
+from utils.request_cache import request_cached
+from utils.db_helpers import BLOCK_ORDER, session_kind, session_slot
+from utils.user_cache import user_cached
+from concurrent.futures import ProcessPoolExecutor
+import heapq
 import math
 
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; fall back to pure Python scoring
+    np = None
 
-class StudyPlanner:
+# Fields the scheduler reads; loaders project to these
+SUBJECT_PLANNING_FIELDS = {'name': 1, 'exam_date': 1, 'difficulty': 1}
+TOPIC_PLANNING_FIELDS = {'subject_id': 1, 'title': 1, 'estimated_minutes': 1, 'priority_override': 1}
+# kind tells study and revision sessions of a topic apart when diffing against a new plan
+DIFF_SESSION_FIELDS = {'topic_id': 1, 'kind': 1, 'date': 1, 'block': 1, 'planned_minutes': 1}
+
+
+def score_topics(minutes, days_left, difficulty, overrides, total_remaining):
     """
-    Intelligent study planner that generates optimized schedules
+    Score topics from columnar attributes
+    
+    Uses a single batched NumPy pass when NumPy is installed and a plain
+    Python loop otherwise. Both paths apply the same formula as
+    StudyPlanner._calculate_priorities.
+    
+    Args:
+        minutes (list): Estimated minutes per topic
+        days_left (list): Days until the subject's exam, or None if no exam
+        difficulty (list): Subject difficulty (1-5) per topic
+        overrides (list): Manual priority override per topic
+        total_remaining (int): Sum of estimated minutes over all topics
+        
+    Returns:
+        list: Priority score per topic, in input order
+    """
+    if not minutes:
+        return []
+    
+    if np is not None:
+        minutes_arr = np.asarray(minutes, dtype=float)
+        has_exam = np.array([d is not None for d in days_left])
+        days_arr = np.array([d if d is not None else 1 for d in days_left], dtype=float)
+        difficulty_arr = np.asarray(difficulty, dtype=float)
+        overrides_arr = np.asarray(overrides, dtype=float)
+        
+        base_priority = minutes_arr / total_remaining
+        urgency_multiplier = np.where(
+            has_exam, 1 / (np.maximum(1, days_arr) ** 0.3), 1.0
+        )
+        difficulty_multiplier = np.select(
+            [difficulty_arr >= 4, difficulty_arr <= 2], [1.3, 0.8], default=1.0
+        )
+        scores = (base_priority * urgency_multiplier *
+                  difficulty_multiplier * overrides_arr)
+        return scores.tolist()
+    
+    scores = []
+    for topic_minutes, days, diff, override in zip(minutes, days_left, difficulty, overrides):
+        base_priority = topic_minutes / total_remaining
+        urgency_multiplier = 1 / (max(1, days) ** 0.3) if days is not None else 1.0
+        if diff >= 4:
+            difficulty_multiplier = 1.3
+        elif diff <= 2:
+            difficulty_multiplier = 0.8
+        else:
+            difficulty_multiplier = 1.0
+        scores.append(base_priority * urgency_multiplier *
+                      difficulty_multiplier * override)
+    return scores
+
+
+class TopicSelector:
+    """
+    Priority queue that picks the next topic for a study block
+
+    Topics are grouped per subject in descending score order, so the best
+    live topic of a subject is always at the head of its list. A heap holds
+    one entry per subject head; entries for exhausted topics are discarded
+    lazily when they reach the top. The same-subject penalty only ever
+    applies to one subject, so the best candidate is either the top of the
+    heap (skipping the last subject) or the last subject's own head.
+    """
+    
+    def __init__(self, sorted_topics, remaining_minutes, same_subject_penalty):
+        """
+        Build the queue from topics already sorted by descending score
+        
+        Args:
+            sorted_topics (list): (topic_id, info) pairs sorted by score
+            remaining_minutes (dict): topic_id -> minutes still to schedule
+            same_subject_penalty (float): Multiplier for the last subject
+        """
+        self.remaining_minutes = remaining_minutes
+        self.same_subject_penalty = same_subject_penalty
+        self.total_remaining = sum(remaining_minutes.values())
+        
+        # Per-subject topic lists in rank order, with a head pointer
+        self._ranked = sorted_topics
+        self._subject_ranks = {}
+        for rank, (topic_id, info) in enumerate(sorted_topics):
+            self._subject_ranks.setdefault(info['subject_id'], []).append(rank)
+        self._heads = {subject_id: 0 for subject_id in self._subject_ranks}
+        
+        self._heap = []
+        for subject_id in self._subject_ranks:
+            self._push_head(subject_id)
+    
+    def _head_rank(self, subject_id):
+        """Advance past exhausted topics and return the subject's head rank"""
+        ranks = self._subject_ranks[subject_id]
+        position = self._heads[subject_id]
+        while position < len(ranks):
+            topic_id = self._ranked[ranks[position]][0]
+            if self.remaining_minutes.get(topic_id, 0) > 0:
+                break
+            position += 1
+        self._heads[subject_id] = position
+        return ranks[position] if position < len(ranks) else None
+    
+    def _push_head(self, subject_id):
+        """Push the current head of a subject onto the heap"""
+        rank = self._head_rank(subject_id)
+        if rank is not None:
+            score = self._ranked[rank][1]['score']
+            heapq.heappush(self._heap, (-score, rank, subject_id))
+    
+    def _is_live(self, entry):
+        """Check whether a heap entry still points at its subject's head"""
+        return self._head_rank(entry[2]) == entry[1]
+    
+    def _best_other(self, excluded_subject_id):
+        """Return the best live heap entry not belonging to a subject"""
+        heap = self._heap
+        while heap and not self._is_live(heap[0]):
+            heapq.heappop(heap)
+        if not heap:
+            return None
+        if heap[0][2] != excluded_subject_id:
+            return heap[0]
+        
+        # Top belongs to the excluded subject; look one entry deeper
+        top = heapq.heappop(heap)
+        while heap and not self._is_live(heap[0]):
+            heapq.heappop(heap)
+        candidate = heap[0] if heap else None
+        heapq.heappush(heap, top)
+        return candidate
+    
+    def select(self, last_subject_id):
+        """
+        Pick the highest scoring topic, penalising the last subject
+        
+        Ties are resolved in favour of the earlier topic in score order,
+        matching a linear scan with a strict comparison.
+        
+        Args:
+            last_subject_id (str): Subject assigned to the previous block
+            
+        Returns:
+            tuple: (topic_id, info) or None if no topic has time left
+        """
+        best_rank = None
+        best_score = -1
+        
+        other = self._best_other(last_subject_id if last_subject_id else None)
+        if other is not None:
+            best_score, best_rank = -other[0], other[1]
+        
+        if last_subject_id and last_subject_id in self._heads:
+            rank = self._head_rank(last_subject_id)
+            if rank is not None:
+                score = self._ranked[rank][1]['score'] * self.same_subject_penalty
+                if score > best_score or (score == best_score and best_rank is not None
+                                          and rank < best_rank):
+                    best_score, best_rank = score, rank
+        
+        if best_rank is None or best_score <= -1:
+            return None
+        return self._ranked[best_rank]
+    
+    def consume(self, topic_id, subject_id, minutes):
+        """
+        Record scheduled minutes against a topic
+        
+        Args:
+            topic_id (str): Topic that was scheduled
+            subject_id (str): Subject of the topic
+            minutes (int): Minutes allocated in the session
+        """
+        self.remaining_minutes[topic_id] -= minutes
+        self.total_remaining -= minutes
+        if self.remaining_minutes[topic_id] <= 0:
+            # Stale heap entry is dropped lazily; push the next head now
+            self._push_head(subject_id)
+
+
+class SlotCalendar:
+    """
+    Compact occupancy map of study blocks
+
+    Each day is stored as a bitmask of taken blocks keyed by the date's
+    ordinal, so checking a slot, finding the first free block of a day and
+    detecting conflicts are all constant time. Planned minutes are tracked
+    per day alongside the mask for capacity-aware allocation.
+    """
+    
+    def __init__(self, blocks):
+        """
+        Create an empty calendar
+        
+        Args:
+            blocks (list of str): Block names in day order
+        """
+        self.blocks = list(blocks)
+        self._bits = {block: 1 << i for i, block in enumerate(self.blocks)}
+        self._full_mask = (1 << len(self.blocks)) - 1
+        self._days = {}
+        self._minutes = {}
+    
+    @classmethod
+    def from_sessions(cls, sessions, blocks):
+        """
+        Build a calendar from existing session documents
+        
+        Args:
+            sessions (iterable): Session documents with date and block
+            blocks (list of str): Block names in day order
+            
+        Returns:
+            SlotCalendar: Calendar with every session's slot occupied
+        """
+        calendar = cls(blocks)
+        for session in sessions:
+            calendar.occupy(session['date'], session['block'],
+                            session.get('planned_minutes') or 0)
+        return calendar
+    
+    @staticmethod
+    def _ordinal(date):
+        """Return the day key for a date or datetime"""
+        return date.toordinal()
+    
+    def occupy(self, date, block, minutes=0):
+        """
+        Mark a slot as taken
+        
+        Args:
+            date (datetime): Day of the slot
+            block (str): Block name
+            minutes (int): Planned minutes of the session in the slot
+            
+        Returns:
+            bool: False if the block is unknown, True otherwise
+        """
+        bit = self._bits.get(block)
+        if bit is None:
+            return False
+        key = self._ordinal(date)
+        self._days[key] = self._days.get(key, 0) | bit
+        self._minutes[key] = self._minutes.get(key, 0) + minutes
+        return True
+    
+    def is_free(self, date, block):
+        """
+        Check whether a slot is available
+        
+        Args:
+            date (datetime): Day of the slot
+            block (str): Block name
+            
+        Returns:
+            bool: True if the block exists and nothing occupies it
+        """
+        bit = self._bits.get(block)
+        if bit is None:
+            return False
+        return not self._days.get(self._ordinal(date), 0) & bit
+    
+    def count(self, date):
+        """
+        Count occupied blocks on a day
+        
+        Args:
+            date (datetime): Target day
+            
+        Returns:
+            int: Number of taken blocks
+        """
+        return bin(self._days.get(self._ordinal(date), 0)).count('1')
+    
+    def minutes(self, date):
+        """
+        Sum planned minutes on a day
+        
+        Args:
+            date (datetime): Target day
+            
+        Returns:
+            int: Planned minutes of all sessions on the day
+        """
+        return self._minutes.get(self._ordinal(date), 0)
+    
+    def first_free_block(self, date):
+        """
+        Find the earliest free block of a day
+        
+        Args:
+            date (datetime): Target day
+            
+        Returns:
+            str: Block name, or None if the day is full
+        """
+        free = self._full_mask & ~self._days.get(self._ordinal(date), 0)
+        if not free:
+            return None
+        return self.blocks[(free & -free).bit_length() - 1]
+    
+    def _has_room(self, key, max_sessions, minutes, daily_minutes):
+        """Whether the day with this key can take one more session of the given length"""
+        mask = self._days.get(key, 0)
+        if mask == self._full_mask:
+            return False
+        if max_sessions is not None and bin(mask).count('1') >= max_sessions:
+            return False
+        if daily_minutes is not None and self._minutes.get(key, 0) + minutes > daily_minutes:
+            return False
+        return True
+    
+    def next_free_slot(self, after_date, end_date=None, max_sessions=None, minutes=0,
+                       daily_minutes=None):
+        """
+        Find the first free slot on a day strictly after a date
+        
+        A day qualifies when it has a free block, holds fewer than
+        max_sessions sessions and, with a daily_minutes cap, can still fit
+        minutes more. Only days that hold sessions are stored, so the scan
+        stops at the first day that is missing from the map.
+        
+        Args:
+            after_date (datetime): Search starts the day after this date
+            end_date (datetime): Optional last day to consider
+            max_sessions (int): Optional cap on sessions per day
+            minutes (int): Planned minutes of the session to place
+            daily_minutes (int): Optional cap on planned minutes per day
+            
+        Returns:
+            tuple: (datetime, block) or None if nothing is free before end_date
+        """
+        if not self.blocks or (max_sessions is not None and max_sessions <= 0):
+            return None
+        if daily_minutes is not None and minutes > daily_minutes:
+            return None  # Would not fit even on an empty day
+        key = self._ordinal(after_date) + 1
+        last_key = self._ordinal(end_date) if end_date else None
+        while not self._has_room(key, max_sessions, minutes, daily_minutes):
+            if last_key is not None and key >= last_key:
+                return None
+            key += 1
+        if last_key is not None and key > last_key:
+            return None
+        day = datetime.fromordinal(key)
+        return day, self.first_free_block(day)
+
+
+class PlannerCore:
+    """
+    Database-free scheduling core
+
+    Turns plain subject and topic documents plus a plan configuration into
+    session documents. It performs no I/O, so it can run in worker
+    processes and be reused outside the web app.
     """
     
-    BLOCK_ORDER = ['Morning', 'Afternoon', 'Evening']
+    BLOCK_ORDER = BLOCK_ORDER  # Same order as the stored block_order keys
     DEFAULT_SESSION_MINUTES = 60
     SAME_SUBJECT_PENALTY = 0.6  # Penalty for consecutive same subject
     BACKLOG_PRIORITY_MULTIPLIER = 1.5
+    REVISION_SESSION_MINUTES = 30
     
-    def __init__(self, mongo, user_id):
+    def __init__(self, user_id, subjects=None, topics=None, calendar=None):
         """
-        Initialize planner with database connection and user context
+        Initialize the core with a user's planning inputs
         
         Args:
-            mongo: Flask-PyMongo instance
             user_id (str): User's ObjectId as string
+            subjects (list): Subject documents
+            topics (list): Pending topic documents
+            calendar (SlotCalendar): Slots already taken, e.g. by completed sessions
         """
-        self.mongo = mongo
         self.user_id = ObjectId(user_id)
-        self.subjects = []
-        self.topics = []
-        self.sessions = []
+        self.subjects = subjects or []
+        self.topics = topics or []
+        self.calendar = calendar
     
-    def generate_plan(self, config):
+    def schedule(self, config):
         """
-        Generate a complete study plan based on configuration
+        Build the sessions of a plan from the loaded subjects and topics
         
         Args:
-            config (dict): Plan configuration with keys:
-                - daily_study_minutes (int)
-                - start_date (datetime)
-                - end_date (datetime)
-                - blocks (list of str)
-                - max_sessions_per_day (int)
-                - revision_buffer_days (int)
-                
+            config (dict): Plan configuration (see StudyPlanner.generate_plan)
+            
         Returns:
-            dict: Generated plan with sessions
+            dict: Sessions on success, or error message
         """
-        # Load subjects and topics
-        self._load_data()
-        
         # Validate prerequisites
         if not self.subjects:
             return {'error': 'No subjects found. Please add subjects first.'}
@@ -71,6 +432,12 @@ class StudyPlanner:
         if not self.topics:
             return {'error': 'No topics found. Please add topics to your subjects first.'}
         
+        # Reject impossible plans before any allocation work
+        if config.get('capacity_aware'):
+            infeasible = self._check_feasibility(config)
+            if infeasible:
+                return {'error': infeasible}
+        
         # Calculate priorities for each topic
         topic_priorities = self._calculate_priorities(config)
         
@@ -80,26 +447,7 @@ class StudyPlanner:
         # Add revision sessions before exams
         sessions = self._add_revision_sessions(config, sessions)
         
-        # Save plan to database
-        plan_id = self._save_plan(config, sessions)
-        
-        return {
-            'success': True,
-            'plan_id': plan_id,
-            'sessions': sessions,
-            'total_sessions': len(sessions)
-        }
-    
-    def _load_data(self):
-        """Load subjects and topics from database"""
-        self.subjects = list(self.mongo.db.subjects.find({
-            'user_id': self.user_id
-        }))
-        
-        self.topics = list(self.mongo.db.topics.find({
-            'user_id': self.user_id,
-            'status': 'pending'  # Only incomplete topics
-        }))
+        return {'success': True, 'sessions': sessions}
     
     def _calculate_priorities(self, config):
         """
@@ -126,40 +474,33 @@ class StudyPlanner:
         if total_remaining == 0:
             return priorities
         
+        # Index subjects by _id and compute days left once per subject
+        subjects_by_id = {s['_id']: s for s in self.subjects}
+        days_by_subject = {}
+        for subject_id, subject in subjects_by_id.items():
+            if subject.get('exam_date'):
+                days_by_subject[subject_id] = (subject['exam_date'] - now).days
+            else:
+                days_by_subject[subject_id] = None
+        
+        # Pack topic attributes into columns
+        scored_topics = []
+        minutes, days_left, difficulty, overrides = [], [], [], []
         for topic in self.topics:
-            # Find subject for this topic
-            subject = next((s for s in self.subjects if s['_id'] == topic['subject_id']), None)
+            subject = subjects_by_id.get(topic['subject_id'])
             if not subject:
                 continue
             
-            # Base priority from topic size
-            topic_minutes = topic.get('estimated_minutes', self.DEFAULT_SESSION_MINUTES)
-            base_priority = topic_minutes / total_remaining
-            
-            # Exam urgency multiplier (exponential decay)
-            if subject.get('exam_date'):
-                days_until_exam = (subject['exam_date'] - now).days
-                days_until_exam = max(1, days_until_exam)  # Avoid division by zero
-                urgency_multiplier = 1 / (days_until_exam ** 0.3)
-            else:
-                urgency_multiplier = 1.0
-            
-            # Difficulty multiplier
-            difficulty = subject.get('difficulty', 3)
-            if difficulty >= 4:
-                difficulty_multiplier = 1.3
-            elif difficulty <= 2:
-                difficulty_multiplier = 0.8
-            else:
-                difficulty_multiplier = 1.0
-            
+            scored_topics.append((topic, subject))
+            minutes.append(topic.get('estimated_minutes', self.DEFAULT_SESSION_MINUTES))
+            days_left.append(days_by_subject[subject['_id']])
+            difficulty.append(subject.get('difficulty', 3))
             # Priority override (if user set manual priority)
-            priority_override = topic.get('priority_override', 1.0)
-            
-            # Final priority score
-            final_priority = (base_priority * urgency_multiplier * 
-                            difficulty_multiplier * priority_override)
-            
+            overrides.append(topic.get('priority_override', 1.0))
+        
+        scores = score_topics(minutes, days_left, difficulty, overrides, total_remaining)
+        
+        for (topic, subject), topic_minutes, final_priority in zip(scored_topics, minutes, scores):
             priorities[str(topic['_id'])] = {
                 'score': final_priority,
                 'subject_id': str(subject['_id']),
@@ -171,10 +512,81 @@ class StudyPlanner:
         
         return priorities
     
+    def _daily_capacity(self, config):
+        """
+        Minutes that can actually be scheduled on one day
+        
+        Args:
+            config (dict): Plan configuration
+            
+        Returns:
+            int: Daily minute capacity
+        """
+        blocks = config.get('blocks', self.BLOCK_ORDER)
+        max_sessions = min(config.get('max_sessions_per_day', 4), len(blocks))
+        return min(config['daily_study_minutes'],
+                   max_sessions * self.DEFAULT_SESSION_MINUTES)
+    
+    def _check_feasibility(self, config):
+        """
+        Check that topics due inside the plan fit the available study time
+        
+        Only subjects examined within the plan range have a deadline the
+        plan must meet: for each such exam, the minutes of all subjects
+        examined on or before that day must fit into the capacity of the
+        days before it. Subjects without an exam or examined after the end
+        date simply take whatever time is left, and subjects whose exam has
+        already passed are ignored, so neither can make a plan infeasible.
+        This is a necessary condition checked from per-subject totals, so
+        it costs O(subjects) and runs before any allocation.
+        
+        Args:
+            config (dict): Plan configuration
+            
+        Returns:
+            str: Error message, or None if the plan is feasible
+        """
+        capacity = self._daily_capacity(config)
+        start_date = config['start_date']
+        end_date = config['end_date']
+        
+        exams = sorted(
+            (s for s in self.subjects
+             if s.get('exam_date') and start_date <= s['exam_date'] <= end_date),
+            key=lambda s: s['exam_date']
+        )
+        if not exams:
+            return None
+        
+        due_subjects = {s['_id'] for s in exams}
+        minutes_by_subject = {}
+        for topic in self.topics:
+            if topic['subject_id'] in due_subjects:
+                minutes_by_subject[topic['subject_id']] = (
+                    minutes_by_subject.get(topic['subject_id'], 0) +
+                    topic.get('estimated_minutes', self.DEFAULT_SESSION_MINUTES)
+                )
+        
+        needed = 0
+        for subject in exams:
+            needed += minutes_by_subject.get(subject['_id'], 0)
+            days_before = (subject['exam_date'].date() - start_date.date()).days
+            available = capacity * days_before
+            if needed > available:
+                return (f'Not enough study time before the {subject["name"]} exam: '
+                        f'{needed} minutes are due but only {available} fit before '
+                        f'{subject["exam_date"].strftime("%b %d")}. '
+                        f'Increase daily study time or start earlier.')
+        
+        return None
+    
     def _allocate_sessions(self, config, topic_priorities):
         """
         Allocate study sessions to days and blocks
         
+        In capacity-aware mode each day has a budget of daily_study_minutes
+        and sessions are shortened to fit what is left of it.
+        
         Args:
             config (dict): Plan configuration
             topic_priorities (dict): Priority scores for topics
@@ -186,6 +598,10 @@ class StudyPlanner:
         current_date = config['start_date']
         end_date = config['end_date']
         
+        if self.calendar is None:
+            self.calendar = SlotCalendar(config.get('blocks', self.BLOCK_ORDER))
+        calendar = self.calendar
+        
         # Sort topics by priority (descending)
         sorted_topics = sorted(topic_priorities.items(), 
                               key=lambda x: x[1]['score'], 
@@ -197,13 +613,19 @@ class StudyPlanner:
             for tid, info in topic_priorities.items()
         }
         
+        # Priority queue over remaining topics
+        selector = TopicSelector(sorted_topics, remaining_minutes,
+                                 self.SAME_SUBJECT_PENALTY)
+        
         # Track last assigned subject to enforce variety
         last_subject_id = None
         
+        capacity_aware = config.get('capacity_aware', False)
+        
         # Iterate through each day
         while current_date <= end_date:
             # Check if any topic has remaining time
-            if sum(remaining_minutes.values()) == 0:
+            if selector.total_remaining == 0:
                 break
             
             # Allocate sessions for this day
@@ -212,26 +634,19 @@ class StudyPlanner:
             max_sessions = config.get('max_sessions_per_day', 4)
             
             for block in blocks:
-                if len(day_sessions) >= max_sessions:
+                if calendar.count(current_date) >= max_sessions:
                     break
                 
-                # Find best topic for this block
-                best_topic = None
-                best_score = -1
+                if not calendar.is_free(current_date, block):
+                    continue
                 
-                for topic_id, info in sorted_topics:
-                    if remaining_minutes.get(topic_id, 0) <= 0:
-                        continue
-                    
-                    score = info['score']
-                    
-                    # Apply same-subject penalty
-                    if last_subject_id and info['subject_id'] == last_subject_id:
-                        score *= self.SAME_SUBJECT_PENALTY
-                    
-                    if score > best_score:
-                        best_score = score
-                        best_topic = (topic_id, info)
+                if capacity_aware:
+                    budget = config['daily_study_minutes'] - calendar.minutes(current_date)
+                    if budget <= 0:
+                        break
+                
+                # Find best topic for this block
+                best_topic = selector.select(last_subject_id)
                 
                 if best_topic:
                     topic_id, info = best_topic
@@ -242,13 +657,17 @@ class StudyPlanner:
                         self.DEFAULT_SESSION_MINUTES
                     )
                     
+                    # Shrink to the day's remaining capacity
+                    if capacity_aware:
+                        session_minutes = min(session_minutes, budget)
+                    
                     # Create session
                     session = {
                         'user_id': self.user_id,
                         'subject_id': ObjectId(info['subject_id']),
                         'topic_id': ObjectId(topic_id),
-                        'date': current_date,
-                        'block': block,
+                        **session_slot(current_date, block),
+                        'kind': 'study',
                         'planned_minutes': session_minutes,
                         'actual_minutes': None,
                         'status': 'pending',
@@ -258,9 +677,10 @@ class StudyPlanner:
                     
                     day_sessions.append(session)
                     sessions.append(session)
+                    calendar.occupy(current_date, block, session_minutes)
                     
                     # Update remaining minutes
-                    remaining_minutes[topic_id] -= session_minutes
+                    selector.consume(topic_id, info['subject_id'], session_minutes)
                     
                     # Update last subject
                     last_subject_id = info['subject_id']
@@ -286,6 +706,18 @@ class StudyPlanner:
         if revision_buffer == 0:
             return sessions
         
+        capacity_aware = config.get('capacity_aware', False)
+        
+        blocks = config.get('blocks', self.BLOCK_ORDER)
+        if self.calendar is None:
+            self.calendar = SlotCalendar.from_sessions(sessions, blocks)
+        calendar = self.calendar
+        
+        # Group topics by subject once
+        topics_by_subject = {}
+        for topic in self.topics:
+            topics_by_subject.setdefault(topic['subject_id'], []).append(topic)
+        
         # For each subject with exam, add revision sessions
         for subject in self.subjects:
             if not subject.get('exam_date'):
@@ -294,7 +726,7 @@ class StudyPlanner:
             exam_date = subject['exam_date']
             
             # Get all topics for this subject
-            subject_topics = [t for t in self.topics if t['subject_id'] == subject['_id']]
+            subject_topics = topics_by_subject.get(subject['_id'], [])
             
             if not subject_topics:
                 continue
@@ -310,45 +742,48 @@ class StudyPlanner:
                 # Assign revision for each topic in this subject
                 for topic in subject_topics:
                     # Find a free block for this day
-                    existing_blocks = [s['block'] for s in sessions 
-                                     if s['date'].date() == revision_date.date()]
+                    block = calendar.first_free_block(revision_date)
                     
-                    available_blocks = [b for b in config.get('blocks', self.BLOCK_ORDER) 
-                                      if b not in existing_blocks]
+                    if block is None:
+                        break
                     
-                    if available_blocks:
-                        revision_session = {
-                            'user_id': self.user_id,
-                            'subject_id': subject['_id'],
-                            'topic_id': topic['_id'],
-                            'date': revision_date,
-                            'block': available_blocks[0],
-                            'planned_minutes': 30,  # Shorter revision sessions
-                            'actual_minutes': None,
-                            'status': 'pending',
-                            'notes': 'Revision session',
-                            'completed_at': None
-                        }
-                        sessions.append(revision_session)
+                    if capacity_aware and (calendar.minutes(revision_date) +
+                                           self.REVISION_SESSION_MINUTES >
+                                           config['daily_study_minutes']):
+                        break
+                    
+                    revision_session = {
+                        'user_id': self.user_id,
+                        'subject_id': subject['_id'],
+                        'topic_id': topic['_id'],
+                        **session_slot(revision_date, block),
+                        'kind': 'revision',
+                        'planned_minutes': self.REVISION_SESSION_MINUTES,  # Shorter revision sessions
+                        'actual_minutes': None,
+                        'status': 'pending',
+                        'notes': 'Revision session',
+                        'completed_at': None
+                    }
+                    sessions.append(revision_session)
+                    calendar.occupy(revision_date, block, self.REVISION_SESSION_MINUTES)
         
         # Sort sessions by date and block
         sessions.sort(key=lambda s: (s['date'], self.BLOCK_ORDER.index(s['block'])))
         
         return sessions
     
-    def _save_plan(self, config, sessions):
+    def _plan_document(self, config, version):
         """
-        Save plan and sessions to database
+        Build the plan metadata document
         
         Args:
             config (dict): Plan configuration
-            sessions (list): Generated sessions
+            version (int): Plan version for this user
             
         Returns:
-            str: Plan ObjectId as string
+            dict: Plan document, inactive until its sessions are written
         """
-        # Save plan metadata
-        plan_doc = {
+        return {
             'user_id': self.user_id,
             'daily_study_minutes': config['daily_study_minutes'],
             'start_date': config['start_date'],
@@ -356,18 +791,337 @@ class StudyPlanner:
             'blocks': config.get('blocks', self.BLOCK_ORDER),
             'max_sessions_per_day': config.get('max_sessions_per_day', 4),
             'revision_buffer_days': config.get('revision_buffer_days', 2),
+            'capacity_aware': config.get('capacity_aware', False),
             'created_at': datetime.now(),
-            'algorithm_version': '1.0'
+            'algorithm_version': '1.0',
+            'version': version,
+            'active': False
+        }
+    
+    @staticmethod
+    def _diff_sessions(existing, sessions):
+        """
+        Build bulk write operations turning existing sessions into new ones
+        
+        Sessions are matched per (topic, kind). Exact matches on day, block
+        and minutes only move to the new plan; remaining pairs are moved in
+        date order; leftovers are inserted or deleted. New sessions that
+        match an existing one take over its _id. Notes the user wrote on a
+        session are never overwritten.
+        
+        Args:
+            existing (list): Current pending session documents
+            sessions (list): Newly generated session documents
+            
+        Returns:
+            list: pymongo write operations
+        """
+        def match_key(session):
+            return (session['topic_id'], session_kind(session))
+        
+        def slot_key(session):
+            return (session['date'].date(), session['block'], session['planned_minutes'])
+        
+        existing_by_key = {}
+        for doc in existing:
+            existing_by_key.setdefault(match_key(doc), []).append(doc)
+        
+        new_by_key = {}
+        for session in sessions:
+            new_by_key.setdefault(match_key(session), []).append(session)
+        
+        operations = []
+        kept_by_kind = {}
+        for key, new_sessions in new_by_key.items():
+            old_docs = existing_by_key.pop(key, [])
+            
+            # Unchanged sessions keep their document as is
+            old_by_slot = {}
+            for doc in old_docs:
+                old_by_slot.setdefault(slot_key(doc), []).append(doc)
+            
+            unmatched = []
+            kept_ids = set()
+            for session in new_sessions:
+                same_slot = old_by_slot.get(slot_key(session))
+                if same_slot:
+                    session['_id'] = same_slot.pop()['_id']
+                    kept_ids.add(session['_id'])
+                    kept_by_kind.setdefault(key[1], []).append(session['_id'])
+                else:
+                    unmatched.append(session)
+            
+            leftover = [doc for doc in old_docs if doc['_id'] not in kept_ids]
+            
+            # Moved sessions reuse an old document
+            for session, doc in zip(unmatched, leftover):
+                session['_id'] = doc['_id']
+                operations.append(UpdateOne(
+                    {'_id': doc['_id']},
+                    {'$set': {
+                        'plan_id': session['plan_id'],
+                        **session_slot(session['date'], session['block']),
+                        'planned_minutes': session['planned_minutes'],
+                        'kind': session['kind']
+                    }}
+                ))
+            
+            for session in unmatched[len(leftover):]:
+                operations.append(InsertOne(session))
+            
+            for doc in leftover[len(unmatched):]:
+                operations.append(DeleteOne({'_id': doc['_id']}))
+        
+        # Unchanged sessions still move to the new plan
+        plan_id = sessions[0]['plan_id'] if sessions else None
+        for kind, ids in kept_by_kind.items():
+            operations.append(UpdateMany(
+                {'_id': {'$in': ids}},
+                {'$set': {'plan_id': plan_id, 'kind': kind}}
+            ))
+        
+        # Topics no longer in the plan
+        for old_docs in existing_by_key.values():
+            for doc in old_docs:
+                operations.append(DeleteOne({'_id': doc['_id']}))
+        
+        return operations
+
+
+def build_schedule(user_id, subjects, topics, config, occupied_sessions=()):
+    """
+    Generate a plan's sessions from plain data without touching the database
+    
+    Args:
+        user_id (str): User's ObjectId as string
+        subjects (list): Subject documents
+        topics (list): Pending topic documents
+        config (dict): Plan configuration
+        occupied_sessions (iterable): Sessions whose slots must stay free,
+            e.g. completed sessions in the plan range
+            
+    Returns:
+        dict: Sessions on success, or error message
+    """
+    calendar = SlotCalendar.from_sessions(occupied_sessions,
+                                          config.get('blocks', PlannerCore.BLOCK_ORDER))
+    core = PlannerCore(user_id, subjects, topics, calendar)
+    return core.schedule(config)
+
+
+class StudyPlanner(PlannerCore):
+    """
+    Intelligent study planner that generates optimized schedules
+    """
+    
+    def __init__(self, mongo, user_id):
+        """
+        Initialize planner with database connection and user context
+        
+        Args:
+            mongo: Flask-PyMongo instance
+            user_id (str): User's ObjectId as string
+        """
+        super().__init__(user_id)
+        self.mongo = mongo
+        self.sessions = []
+    
+    def generate_plan(self, config, progress=None):
+        """
+        Generate a complete study plan based on configuration
+        
+        Args:
+            config (dict): Plan configuration with keys:
+                - daily_study_minutes (int)
+                - start_date (datetime)
+                - end_date (datetime)
+                - blocks (list of str)
+                - max_sessions_per_day (int)
+                - revision_buffer_days (int)
+                - capacity_aware (bool): size sessions to daily_study_minutes
+            progress (callable): Optional progress(stage, percent) callback
+                
+        Returns:
+            dict: Generated plan with sessions
+        """
+        if progress is None:
+            progress = lambda stage, percent: None
+        
+        # Load subjects and topics
+        progress('loading', 10)
+        self._load_data()
+        
+        # Slot occupancy shared by allocation and revision; completed
+        # sessions keep their slots, pending ones are replaced by this plan
+        self.calendar = self.load_calendar(config['start_date'], config['end_date'],
+                                           config.get('blocks', self.BLOCK_ORDER),
+                                           statuses=('completed',))
+        
+        progress('scheduling', 30)
+        result = self.schedule(config)
+        if 'error' in result:
+            return result
+        
+        sessions = result['sessions']
+        
+        # Save plan to database
+        progress('saving', 70)
+        plan_id = self._save_plan(config, sessions)
+        
+        return {
+            'success': True,
+            'plan_id': plan_id,
+            'sessions': sessions,
+            'total_sessions': len(sessions)
+        }
+    
+    def replan(self, subject_ids):
+        """
+        Incrementally update the latest plan after subjects or topics change
+        
+        Only the given subjects are re-planned: their pending topics are
+        re-allocated into the slots of the existing plan not taken by other
+        sessions, and the result is diffed against their pending sessions
+        from today onward, so unchanged and moved sessions keep their _id
+        and notes. Past sessions, completed and skipped sessions, and other
+        subjects' sessions stay untouched.
+        
+        Args:
+            subject_ids (list of str): Subjects whose topics or exam changed
+            
+        Returns:
+            dict: Replanned sessions, or error if the user has no plan
+        """
+        from utils.db_helpers import get_active_plan
+        
+        plan = get_active_plan(self.mongo, self.user_id)
+        
+        if not plan:
+            return {'error': 'No study plan found. Please generate a plan first.'}
+        
+        config = {
+            'daily_study_minutes': plan['daily_study_minutes'],
+            'start_date': plan['start_date'],
+            'end_date': plan['end_date'],
+            'blocks': plan.get('blocks', self.BLOCK_ORDER),
+            'max_sessions_per_day': plan.get('max_sessions_per_day', 4),
+            'revision_buffer_days': plan.get('revision_buffer_days', 2),
+            'capacity_aware': plan.get('capacity_aware', False)
+        }
+        
+        # First affected day: today, but never before the plan starts
+        now = datetime.now()
+        first_day = max(datetime(now.year, now.month, now.day), config['start_date'])
+        
+        if first_day > config['end_date']:
+            return {'success': True, 'plan_id': str(plan['_id']), 'sessions': [], 'total_sessions': 0}
+        
+        subject_oids = [ObjectId(sid) for sid in subject_ids]
+        
+        # Affected subjects' upcoming pending sessions, replaced below
+        existing = list(self.mongo.db.sessions.find({
+            'user_id': self.user_id,
+            'subject_id': {'$in': subject_oids},
+            'status': 'pending',
+            'date': {'$gte': first_day}
+        }, DIFF_SESSION_FIELDS).sort('date', 1))
+        
+        # Occupancy left by everything that stays
+        self.calendar = self.load_calendar(first_day, config['end_date'], config['blocks'],
+                                           exclude_session_ids=[doc['_id'] for doc in existing])
+        
+        # Load only the affected subjects and their pending topics
+        self.subjects = list(self.mongo.db.subjects.find({
+            '_id': {'$in': subject_oids},
+            'user_id': self.user_id
+        }, SUBJECT_PLANNING_FIELDS))
+        
+        self.topics = list(self.mongo.db.topics.find({
+            'user_id': self.user_id,
+            'subject_id': {'$in': subject_oids},
+            'status': 'pending'
+        }, TOPIC_PLANNING_FIELDS))
+        
+        config['start_date'] = first_day
+        topic_priorities = self._calculate_priorities(config)
+        sessions = self._allocate_sessions(config, topic_priorities)
+        sessions = self._add_revision_sessions(config, sessions)
+        
+        for session in sessions:
+            session['plan_id'] = plan['_id']
+        
+        # Matched sessions keep their _id and notes, as in _save_plan
+        operations = self._diff_sessions(existing, sessions)
+        if operations:
+            self.mongo.db.sessions.bulk_write(operations, ordered=False)
+        
+        return {
+            'success': True,
+            'plan_id': str(plan['_id']),
+            'sessions': sessions,
+            'total_sessions': len(sessions)
         }
+    
+    def _load_data(self):
+        """Load subjects and topics from database"""
+        self.subjects = list(self.mongo.db.subjects.find({
+            'user_id': self.user_id
+        }, SUBJECT_PLANNING_FIELDS))
+        
+        self.topics = list(self.mongo.db.topics.find({
+            'user_id': self.user_id,
+            'status': 'pending'  # Only incomplete topics
+        }, TOPIC_PLANNING_FIELDS))
+    
+    def _save_plan(self, config, sessions):
+        """
+        Save plan and sessions to database
+        
+        The new sessions are diffed against the user's pending sessions in
+        the plan range and applied in one unordered bulk write: unchanged
+        sessions stay put, moved ones are updated, obsolete ones deleted.
+        Completed and skipped sessions are never touched. The new plan gets
+        the next version number and supersedes the previous one only after
+        its sessions are written.
+        
+        Args:
+            config (dict): Plan configuration
+            sessions (list): Generated sessions
+            
+        Returns:
+            str: Plan ObjectId as string
+        """
+        from utils.db_helpers import get_active_plan
+        
+        previous_plan = get_active_plan(self.mongo, self.user_id)
+        version = (previous_plan.get('version', 0) if previous_plan else 0) + 1
+        
+        # Save plan metadata (inactive until its sessions are in place)
+        plan_doc = self._plan_document(config, version)
         
         plan_id = self.mongo.db.plans.insert_one(plan_doc).inserted_id
         
-        # Add plan_id to each session and save
+        # Add plan_id to each session
         for session in sessions:
             session['plan_id'] = plan_id
         
-        if sessions:
-            self.mongo.db.sessions.insert_many(sessions)
+        existing = self.mongo.db.sessions.find({
+            'user_id': self.user_id,
+            'status': 'pending',
+            'date': {'$gte': config['start_date']}
+        }, DIFF_SESSION_FIELDS).sort('date', 1)
+        
+        operations = self._diff_sessions(list(existing), sessions)
+        
+        if operations:
+            self.mongo.db.sessions.bulk_write(operations, ordered=False)
+        
+        # Supersede older plans
+        self.mongo.db.plans.update_one({'_id': plan_id}, {'$set': {'active': True}})
+        self.mongo.db.plans.update_many(
+            {'user_id': self.user_id, '_id': {'$ne': plan_id}, 'active': {'$ne': False}},
+            {'$set': {'active': False}}
+        )
         
         return str(plan_id)
     
@@ -383,6 +1137,181 @@ class StudyPlanner:
             {'$set': {'status': 'skipped'}}
         )
     
+    def load_calendar(self, start_date, end_date, blocks=None, exclude_session_ids=(),
+                      statuses=('pending', 'completed')):
+        """
+        Build slot occupancy from the user's scheduled sessions
+        
+        By default pending and completed sessions occupy their block;
+        skipped sessions never do.
+        
+        Args:
+            start_date (datetime): First day to load
+            end_date (datetime): Last day to load (inclusive)
+            blocks (list of str): Block names, defaults to BLOCK_ORDER
+            exclude_session_ids (iterable): Sessions to leave out, e.g. ones being moved
+            statuses (tuple): Session statuses that occupy a slot
+            
+        Returns:
+            SlotCalendar: Occupancy for the date range
+        """
+        start_of_range = datetime(start_date.year, start_date.month, start_date.day, 0, 0, 0)
+        end_of_range = datetime(end_date.year, end_date.month, end_date.day, 23, 59, 59)
+        
+        query = {
+            'user_id': self.user_id,
+            'status': {'$in': list(statuses)},
+            'date': {'$gte': start_of_range, '$lte': end_of_range}
+        }
+        if exclude_session_ids:
+            query['_id'] = {'$nin': [ObjectId(sid) for sid in exclude_session_ids]}
+        
+        sessions = self.mongo.db.sessions.find(query, {'date': 1, 'block': 1, 'planned_minutes': 1})
+        return SlotCalendar.from_sessions(sessions, blocks or self.BLOCK_ORDER)
+    
+    def reinsert_backlog(self):
+        """
+        Re-slot all skipped sessions into future blocks
+        
+        Skipped sessions and upcoming pending sessions are scored together
+        with the topic formula, skipped ones boosted by
+        BACKLOG_PRIORITY_MULTIPLIER. In descending priority, each skipped
+        session takes the earliest free block from tomorrow that is before
+        the subject's exam and within the active plan. When none is left it
+        takes the slot of the lowest-priority pending session scored below
+        it; that session is then re-slotted the same way at its own
+        priority and moves to the backlog if nothing fits. All moves are
+        applied with a single bulk write; skipped sessions that cannot fit
+        stay in the backlog.
+        
+        Returns:
+            dict: Counts of rescheduled and remaining backlog sessions, and
+                  of pending sessions displaced into the backlog
+        """
+        from utils.db_helpers import get_active_plan
+        
+        backlog = list(self.mongo.db.sessions.find(
+            {'user_id': self.user_id, 'status': 'skipped'},
+            {'subject_id': 1, 'topic_id': 1, 'planned_minutes': 1, 'date': 1}
+        ))
+        
+        if not backlog:
+            return {'rescheduled': 0, 'remaining': 0, 'displaced': 0}
+        
+        plan = get_active_plan(self.mongo, self.user_id)
+        now = datetime.now()
+        first_day = datetime(now.year, now.month, now.day) + timedelta(days=1)
+        
+        if plan:
+            blocks = plan.get('blocks', self.BLOCK_ORDER)
+            max_sessions = plan.get('max_sessions_per_day', 4)
+            daily_minutes = plan['daily_study_minutes'] if plan.get('capacity_aware') else None
+            horizon_end = plan['end_date']
+        else:
+            blocks = self.BLOCK_ORDER
+            max_sessions = 4
+            daily_minutes = None
+            horizon_end = first_day + timedelta(days=30)
+        
+        # Sessions occupying the horizon; pending ones may be displaced
+        scheduled = list(self.mongo.db.sessions.find(
+            {
+                'user_id': self.user_id,
+                'status': {'$in': ['pending', 'completed']},
+                'date': {'$gte': first_day,
+                         '$lte': datetime(horizon_end.year, horizon_end.month, horizon_end.day, 23, 59, 59)}
+            },
+            {'subject_id': 1, 'planned_minutes': 1, 'date': 1, 'block': 1, 'status': 1}
+        ))
+        calendar = SlotCalendar.from_sessions(scheduled, blocks)
+        items = backlog + [s for s in scheduled if s['status'] == 'pending']
+        
+        subjects = {s['_id']: s for s in self.mongo.db.subjects.find(
+            {'_id': {'$in': list({item['subject_id'] for item in items})}, 'user_id': self.user_id},
+            {'exam_date': 1, 'difficulty': 1}
+        )}
+        
+        # Score backlog and pending sessions with the topic formula, backlog boosted
+        minutes, days_left, difficulty, last_days = [], [], [], []
+        for item in items:
+            subject = subjects.get(item['subject_id'], {})
+            minutes.append(item.get('planned_minutes') or self.DEFAULT_SESSION_MINUTES)
+            days_left.append((subject['exam_date'] - now).days if subject.get('exam_date') else None)
+            difficulty.append(subject.get('difficulty', 3))
+            last_day = horizon_end
+            if subject.get('exam_date'):
+                last_day = min(last_day, subject['exam_date'] - timedelta(days=1))
+            last_days.append(last_day)
+        
+        overrides = ([self.BACKLOG_PRIORITY_MULTIPLIER] * len(backlog) +
+                     [1.0] * (len(items) - len(backlog)))
+        scores = score_topics(minutes, days_left, difficulty, overrides, sum(minutes))
+        
+        queue = [(-scores[i], backlog[i]['date'], i) for i in range(len(backlog))]
+        heapq.heapify(queue)
+        
+        # Pending sessions in ascending priority; each is displaced at most once
+        displaceable = sorted(range(len(backlog), len(items)), key=lambda i: scores[i])
+        
+        # Days before this pointer have no block left under max_sessions
+        earliest_open = first_day
+        placed = {}
+        displaced = []
+        
+        while queue:
+            _, _, i = heapq.heappop(queue)
+            
+            slot = None
+            open_slot = calendar.next_free_slot(earliest_open - timedelta(days=1), horizon_end, max_sessions)
+            if open_slot is not None:
+                earliest_open = open_slot[0]
+                slot = calendar.next_free_slot(earliest_open - timedelta(days=1), last_days[i],
+                                               max_sessions, minutes[i], daily_minutes)
+            if slot is not None:
+                calendar.occupy(slot[0], slot[1], minutes[i])
+                placed[i] = slot
+                continue
+            
+            # Take the slot of the lowest-priority pending session below this one
+            victim = None
+            for position, j in enumerate(displaceable):
+                if scores[j] >= scores[i]:
+                    break
+                if items[j]['date'] > last_days[i]:
+                    continue
+                if daily_minutes is not None and \
+                        calendar.minutes(items[j]['date']) - minutes[j] + minutes[i] > daily_minutes:
+                    continue
+                victim = displaceable.pop(position)
+                break
+            
+            if victim is not None:
+                day, block = items[victim]['date'], items[victim]['block']
+                calendar.occupy(day, block, minutes[i] - minutes[victim])  # Slot stays taken
+                placed[i] = (day, block)
+                heapq.heappush(queue, (-scores[victim], day, victim))
+            elif i >= len(backlog):
+                displaced.append(i)  # A displaced pending session with nowhere to go
+        
+        operations = []
+        for i, (day, block) in placed.items():
+            operations.append(UpdateOne(
+                {'_id': items[i]['_id']},
+                {'$set': {**session_slot(day, block), 'status': 'pending'}}
+            ))
+        for i in displaced:
+            operations.append(UpdateOne({'_id': items[i]['_id']}, {'$set': {'status': 'skipped'}}))
+        
+        if operations:
+            self.mongo.db.sessions.bulk_write(operations, ordered=False)
+        
+        rescheduled = sum(1 for i in placed if i < len(backlog))
+        return {
+            'rescheduled': rescheduled,
+            'remaining': len(backlog) - rescheduled,
+            'displaced': len(displaced)
+        }
+    
     def reschedule_session(self, session_id, new_date, new_block):
         """
         Reschedule a session to a different date/block
@@ -391,19 +1320,201 @@ class StudyPlanner:
             session_id (str): Session ObjectId as string
             new_date (datetime): New date for session
             new_block (str): New block name
+            
+        Returns:
+            bool: True if moved, False if the target slot is already taken
         """
+        calendar = self.load_calendar(new_date, new_date,
+                                      exclude_session_ids=[session_id])
+        if not calendar.is_free(new_date, new_block):
+            return False
+        
         self.mongo.db.sessions.update_one(
             {'_id': ObjectId(session_id)},
             {
                 '$set': {
-                    'date': new_date,
-                    'block': new_block,
+                    **session_slot(new_date, new_block),
                     'status': 'pending'
                 }
             }
         )
+        return True
+
+
+def _schedule_user(job):
+    """
+    Process pool entry point: schedule one user's plan from plain data
+    
+    Args:
+        job (tuple): (user_id, subjects, topics, config, occupied_sessions)
+        
+    Returns:
+        tuple: (user_id, build_schedule result)
+    """
+    user_id, subjects, topics, config, occupied_sessions = job
+    return user_id, build_schedule(user_id, subjects, topics, config, occupied_sessions)
+
+
+def generate_cohort_plans(mongo, user_ids, config, max_workers=None, batch_size=1000):
+    """
+    Generate plans for many users at once
+    
+    Subjects, topics and completed sessions for the whole cohort are read
+    with one query per collection, the scheduling runs on a process pool,
+    and plans and session diffs are written back in batched bulk writes.
+    
+    Each user's plan_jobs guard is held throughout, as for a single plan
+    change. Users with a job already active are skipped with an error;
+    changes recorded on a guard meanwhile are queued as a job afterwards
+    (run them with drain_plan_jobs).
+    
+    Args:
+        mongo: Flask-PyMongo instance
+        user_ids (list of str): Users to plan for
+        config (dict): Plan configuration shared by the cohort
+        max_workers (int): Process pool size; 1 schedules in-process
+        batch_size (int): Maximum write operations per bulk_write call
+        
+    Returns:
+        dict: user_id -> result with plan_id and total_sessions, or error
+    """
+    from utils.jobs import acquire_plan_guards, release_plan_guards
+    
+    user_ids = [str(uid) for uid in user_ids]
+    guards = acquire_plan_guards(mongo, user_ids)
+    results = {
+        uid: {'error': 'A plan change is already in progress for this user.'}
+        for uid in user_ids if uid not in guards
+    }
+    
+    def heartbeat():
+        mongo.db.plan_jobs.update_many(
+            {'_id': {'$in': [job['_id'] for job in guards.values()]}, 'active': True},
+            {'$set': {'updated_at': datetime.now()}}
+        )
+    
+    try:
+        results.update(_generate_cohort_plans(mongo, list(guards), config, max_workers,
+                                              batch_size, heartbeat))
+    finally:
+        release_plan_guards(mongo, guards, results)
+    
+    return results
 
 
+def _generate_cohort_plans(mongo, user_ids, config, max_workers, batch_size, heartbeat):
+    """Schedule and write the plans of users whose guard is held"""
+    oids = [ObjectId(uid) for uid in user_ids]
+    if not oids:
+        return {}
+    
+    def group_by_user(docs):
+        grouped = {}
+        for doc in docs:
+            grouped.setdefault(doc['user_id'], []).append(doc)
+        return grouped
+    
+    start_of_range = datetime(config['start_date'].year, config['start_date'].month,
+                              config['start_date'].day, 0, 0, 0)
+    end_of_range = datetime(config['end_date'].year, config['end_date'].month,
+                            config['end_date'].day, 23, 59, 59)
+    
+    # One bulk read per collection for the whole cohort
+    subjects = group_by_user(mongo.db.subjects.find(
+        {'user_id': {'$in': oids}}, dict(SUBJECT_PLANNING_FIELDS, user_id=1)
+    ))
+    topics = group_by_user(mongo.db.topics.find({
+        'user_id': {'$in': oids},
+        'status': 'pending'
+    }, dict(TOPIC_PLANNING_FIELDS, user_id=1)))
+    completed = group_by_user(mongo.db.sessions.find(
+        {
+            'user_id': {'$in': oids},
+            'status': 'completed',
+            'date': {'$gte': start_of_range, '$lte': end_of_range}
+        },
+        {'user_id': 1, 'date': 1, 'block': 1, 'planned_minutes': 1}
+    ))
+    
+    jobs = [
+        (str(oid), subjects.get(oid, []), topics.get(oid, []), config, completed.get(oid, []))
+        for oid in oids
+    ]
+    
+    # Fan the CPU work out across processes
+    if max_workers == 1 or len(jobs) == 1:
+        scheduled = [_schedule_user(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            chunksize = max(1, len(jobs) // ((max_workers or 4) * 4))
+            scheduled = list(pool.map(_schedule_user, jobs, chunksize=chunksize))
+    
+    heartbeat()  # Scheduling a large cohort can take a while
+    
+    results = {}
+    planned = {}
+    for user_id, result in scheduled:
+        if 'error' in result:
+            results[user_id] = result
+        else:
+            planned[ObjectId(user_id)] = result['sessions']
+    
+    if not planned:
+        return results
+    
+    planned_ids = list(planned)
+    
+    # Next plan version per user
+    versions = {}
+    for plan in mongo.db.plans.find(
+        {'user_id': {'$in': planned_ids}, 'active': {'$ne': False}},
+        {'user_id': 1, 'version': 1}
+    ):
+        versions[plan['user_id']] = max(versions.get(plan['user_id'], 0), plan.get('version', 0))
+    
+    plan_docs = [
+        PlannerCore(oid)._plan_document(config, versions.get(oid, 0) + 1)
+        for oid in planned_ids
+    ]
+    plan_ids = mongo.db.plans.insert_many(plan_docs).inserted_ids
+    
+    for oid, plan_id in zip(planned_ids, plan_ids):
+        for session in planned[oid]:
+            session['plan_id'] = plan_id
+    
+    # Diff against every user's pending sessions in one read
+    existing = group_by_user(mongo.db.sessions.find({
+        'user_id': {'$in': planned_ids},
+        'status': 'pending',
+        'date': {'$gte': config['start_date']}
+    }, dict(DIFF_SESSION_FIELDS, user_id=1)).sort('date', 1))
+    
+    operations = []
+    for oid in planned_ids:
+        operations.extend(PlannerCore._diff_sessions(existing.get(oid, []), planned[oid]))
+    
+    for i in range(0, len(operations), batch_size):
+        mongo.db.sessions.bulk_write(operations[i:i + batch_size], ordered=False)
+    
+    # Supersede older plans
+    mongo.db.plans.update_many({'_id': {'$in': plan_ids}}, {'$set': {'active': True}})
+    mongo.db.plans.update_many(
+        {'user_id': {'$in': planned_ids}, '_id': {'$nin': plan_ids}, 'active': {'$ne': False}},
+        {'$set': {'active': False}}
+    )
+    
+    for oid, plan_id in zip(planned_ids, plan_ids):
+        results[str(oid)] = {
+            'success': True,
+            'plan_id': str(plan_id),
+            'total_sessions': len(planned[oid])
+        }
+    
+    return results
+
+
+@request_cached
+@user_cached
 def calculate_readiness_score(mongo, user_id):
     """
     Calculate readiness score for user
@@ -422,7 +1533,7 @@ def calculate_readiness_score(mongo, user_id):
     Returns:
         dict: Readiness score and components
     """
-    from utils.db_helpers import get_overall_progress, get_study_streak
+    from utils.db_helpers import get_overall_progress, get_study_streak, get_active_plan
     
     # Get syllabus completion
     progress = get_overall_progress(mongo, user_id)
@@ -431,11 +1542,8 @@ def calculate_readiness_score(mongo, user_id):
     # Get study streak
     streak = get_study_streak(mongo, user_id)
     
-    # Get plan duration (from most recent plan)
-    plan = mongo.db.plans.find_one(
-        {'user_id': ObjectId(user_id)},
-        sort=[('created_at', -1)]
-    )
+    # Get plan duration (from the active plan)
+    plan = get_active_plan(mongo, user_id)
     
     if plan:
         plan_duration = (plan['end_date'] - plan['start_date']).days + 1
@@ -0,0 +1,180 @@
+"""
+MongoDB client settings and connection pool monitoring
+
+Pool size and timeouts come from MONGO_* environment variables so each
+deployment can size them to its worker and thread counts. PoolStats is a
+PyMongo pool listener that counts connection checkouts for /healthz.
+
+LazyMongo stands in for a Flask-PyMongo instance and creates the client
+on first use, so creating an app costs nothing until it queries. Clients
+must not be shared across fork(): a pre-fork server would otherwise hand
+every worker the parent's sockets and monitor threads, so every LazyMongo
+drops its client in a forked child and the next query creates a new one.
+"""
+
+import os
+import threading
+import time
+import weakref
+from flask_pymongo import PyMongo
+from pymongo import monitoring
+from utils.request_cache import WriteInvalidator
+
+_handles = weakref.WeakSet()  # Every live LazyMongo, reset after fork
+
+
+# Environment variable -> MongoClient option; unset variables keep PyMongo's defaults
+POOL_SETTINGS = {
+    'MONGO_MAX_POOL_SIZE': 'maxPoolSize',
+    'MONGO_MIN_POOL_SIZE': 'minPoolSize',
+    'MONGO_MAX_IDLE_TIME_MS': 'maxIdleTimeMS',
+    'MONGO_WAIT_QUEUE_TIMEOUT_MS': 'waitQueueTimeoutMS',
+    'MONGO_CONNECT_TIMEOUT_MS': 'connectTimeoutMS',
+    'MONGO_SOCKET_TIMEOUT_MS': 'socketTimeoutMS',
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS',
+}
+
+
+def client_options():
+    """
+    MongoClient keyword arguments taken from the environment
+
+    Returns:
+        dict: Pool and timeout options that are set
+    """
+    return {option: int(os.environ[var]) for var, option in POOL_SETTINGS.items() if os.getenv(var)}
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Count connection checkouts and how long they waited for a free connection"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # Fresh lock: after a fork the parent's may be held by a thread that no longer exists
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.counts = {
+            'open': 0,
+            'checked_out': 0,
+            'checkouts': 0,
+            'checkout_failures': 0,
+            'wait_ms_total': 0.0,
+            'wait_ms_max': 0.0,
+        }
+
+    def _add(self, key, amount=1):
+        with self._lock:
+            self.counts[key] += amount
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()  # Checkout completes on the same thread
+
+    def connection_checked_out(self, event):
+        waited = (time.perf_counter() - getattr(self._local, 'started', time.perf_counter())) * 1000
+        with self._lock:
+            self.counts['checked_out'] += 1
+            self.counts['checkouts'] += 1
+            self.counts['wait_ms_total'] += waited
+            self.counts['wait_ms_max'] = max(self.counts['wait_ms_max'], waited)
+
+    def connection_check_out_failed(self, event):
+        self._add('checkout_failures')
+
+    def connection_checked_in(self, event):
+        self._add('checked_out', -1)
+
+    def connection_created(self, event):
+        self._add('open')
+
+    def connection_closed(self, event):
+        self._add('open', -1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def snapshot(self):
+        """
+        Current counters for this process
+
+        Returns:
+            dict: Open and checked-out connections, checkout totals and wait times
+        """
+        with self._lock:
+            stats = dict(self.counts)
+
+        stats['wait_ms_avg'] = round(stats['wait_ms_total'] / stats['checkouts'], 3) if stats['checkouts'] else 0.0
+        stats['wait_ms_total'] = round(stats['wait_ms_total'], 3)
+        stats['wait_ms_max'] = round(stats['wait_ms_max'], 3)
+        stats['pid'] = os.getpid()
+        return stats
+
+
+class LazyMongo:
+    """Flask-PyMongo handle for one app whose client is created on first use"""
+
+    def __init__(self, app, pool_stats):
+        self.app = app
+        self.pool_stats = pool_stats
+        self.index_sync_started = False
+        self._reset()
+        _handles.add(self)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._mongo = None
+
+    def _connect(self):
+        with self._lock:
+            if self._mongo is None:
+                # connect=False (Flask-PyMongo's default) also defers sockets to first query
+                mongo = PyMongo()
+                mongo.init_app(self.app, event_listeners=[WriteInvalidator(), self.pool_stats],
+                               **client_options())
+                self._mongo = mongo
+        return self._mongo
+
+    @property
+    def cx(self):
+        """The MongoClient"""
+        return (self._mongo or self._connect()).cx
+
+    @property
+    def db(self):
+        """The database named in MONGO_URI"""
+        return (self._mongo or self._connect()).db
+
+    @property
+    def connected(self):
+        """Whether the client has been created yet"""
+        return self._mongo is not None
+
+    def close(self):
+        """Close the client; the next query opens a new one"""
+        with self._lock:
+            mongo, self._mongo = self._mongo, None
+        if mongo is not None:
+            mongo.cx.close()
+
+
+def _reset_after_fork():
+    for handle in list(_handles):
+        handle.pool_stats.reset()
+        handle._reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,75 @@
+"""
+Request-scoped memoisation of read helpers
+
+Pages call the same helpers more than once per request, directly and via
+composite helpers such as calculate_readiness_score. Helpers decorated
+with request_cached store their result on flask.g keyed by function and
+arguments, so each logical query reaches MongoDB at most once per request.
+
+Callers receive a deep copy, so mutating a returned document cannot leak
+into a later call. Any write command the request sends to MongoDB clears
+the cache: WriteInvalidator is registered as a PyMongo command listener.
+Outside a request (background jobs, CLI commands) helpers run uncached.
+"""
+
+import copy
+import functools
+from flask import g, has_request_context
+from pymongo import monitoring
+
+
+WRITE_COMMANDS = frozenset({'insert', 'update', 'delete', 'findAndModify'})
+
+
+def invalidate():
+    """Drop everything cached for the current request"""
+    if has_request_context():
+        cache = g.get('_request_cache')
+        if cache:
+            cache.clear()
+
+
+def request_cached(func):
+    """
+    Memoise a read helper for the duration of the current request
+
+    Arguments that cannot be hashed bypass the cache.
+
+    Args:
+        func: Helper to wrap
+
+    Returns:
+        function: The memoised helper
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not has_request_context():
+            return func(*args, **kwargs)
+
+        key = (func.__module__, func.__qualname__, args, frozenset(kwargs.items()))
+        try:
+            hash(key)
+        except TypeError:
+            return func(*args, **kwargs)
+
+        cache = g.setdefault('_request_cache', {})
+        if key not in cache:
+            cache[key] = func(*args, **kwargs)
+
+        return copy.deepcopy(cache[key])
+
+    return wrapper
+
+
+class WriteInvalidator(monitoring.CommandListener):
+    """Clear the request cache whenever a write command is sent"""
+
+    def started(self, event):
+        if event.command_name in WRITE_COMMANDS:
+            invalidate()
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
@@ -0,0 +1,159 @@
+"""
+Incremental study streak tracking
+
+The user document carries a 'streak' sub-document with the length of the
+run of consecutive study days ending on its last active day, and the
+longest run ever seen. Completing a session advances it in place, so
+reading the streak never touches the sessions collection.
+rebuild_study_streak recomputes it from the distinct completion days.
+"""
+
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+
+
+MAX_UPDATE_ATTEMPTS = 3  # Compare-and-set retries when completions race
+
+
+def empty_streak():
+    """Streak state for a user who has never completed a session"""
+    return {'current': 0, 'longest': 0, 'last_day': None}
+
+
+def _day_start(value):
+    """Truncate a datetime to midnight"""
+    return datetime(value.year, value.month, value.day)
+
+
+def advance_streak(streak, day):
+    """
+    Compute the streak state after studying on a given day
+
+    Args:
+        streak (dict): Current streak state
+        day (datetime): Midnight of the study day
+
+    Returns:
+        dict: The new streak state
+    """
+    last_day = streak.get('last_day')
+    current = streak.get('current', 0)
+
+    if last_day is not None and day <= last_day:
+        return streak
+    if last_day is not None and day - last_day == timedelta(days=1):
+        current += 1
+    else:
+        current = 1
+
+    return {
+        'current': current,
+        'longest': max(streak.get('longest', 0), current),
+        'last_day': day
+    }
+
+
+def current_streak(streak, today=None):
+    """
+    Streak length as of today, given stored streak state
+
+    A streak survives until a full day passes without study.
+
+    Args:
+        streak (dict): Stored streak state
+        today (datetime): Override for the current date
+
+    Returns:
+        int: Consecutive study days ending today or yesterday
+    """
+    last_day = streak.get('last_day')
+    if last_day is None:
+        return 0
+
+    today = _day_start(today or datetime.now())
+    if today - last_day > timedelta(days=1):
+        return 0  # Streak broken
+
+    return streak.get('current', 0)
+
+
+def record_study_day(mongo, user_id, completed_at):
+    """
+    Advance a user's streak after a session is completed
+
+    Users without stored streak state are left alone; their state is
+    rebuilt from history on the next read.
+
+    Args:
+        mongo: Flask-PyMongo instance
+        user_id (str): User's ObjectId as string
+        completed_at (datetime): When the session was completed
+    """
+    day = _day_start(completed_at)
+
+    for _ in range(MAX_UPDATE_ATTEMPTS):
+        user = mongo.db.users.find_one({'_id': ObjectId(user_id)}, {'streak': 1})
+        if not user or 'streak' not in user:
+            return
+
+        streak = user['streak']
+        updated = advance_streak(streak, day)
+        if updated is streak:
+            return
+
+        # Only apply if no other completion moved the streak in between
+        result = mongo.db.users.update_one(
+            {'_id': ObjectId(user_id), 'streak.last_day': streak.get('last_day')},
+            {'$set': {'streak': updated}}
+        )
+        if result.modified_count:
+            return
+
+
+def get_study_days(mongo, user_id):
+    """
+    Distinct days on which a user completed at least one session
+
+    Args:
+        mongo: Flask-PyMongo instance
+        user_id (str): User's ObjectId as string
+
+    Returns:
+        list: Midnight datetimes, oldest first
+    """
+    pipeline = [
+        {'$match': {
+            'user_id': ObjectId(user_id),
+            'status': 'completed',
+            'completed_at': {'$ne': None}
+        }},
+        {'$group': {
+            '_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$completed_at'}}
+        }},
+        {'$sort': {'_id': 1}}
+    ]
+
+    return [datetime.strptime(row['_id'], '%Y-%m-%d') for row in mongo.db.sessions.aggregate(pipeline)]
+
+
+def rebuild_study_streak(mongo, user_id):
+    """
+    Recompute and store a user's streak state from their completed sessions
+
+    Args:
+        mongo: Flask-PyMongo instance
+        user_id (str): User's ObjectId as string
+
+    Returns:
+        dict: The stored streak state
+    """
+    streak = empty_streak()
+    for day in get_study_days(mongo, user_id):
+        streak = advance_streak(streak, day)
+
+    mongo.db.users.update_one(
+        {'_id': ObjectId(user_id)},
+        {'$set': {'streak': streak}}
+    )
+
+    return streak
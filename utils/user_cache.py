@@ -0,0 +1,244 @@
+"""
+Cross-request per-user read cache
+
+Dashboard, progress and subject pages are read far more often than a
+user's data changes. Helpers decorated with user_cached keep their results
+per user for USER_CACHE_TTL seconds, bounded to USER_CACHE_SIZE entries
+with least-recently-used eviction. Every route that writes a user's data
+calls invalidate_user (usually through the invalidates_user_cache
+decorator) so cached reads never outlive the data they were built from.
+
+Two backends are available, chosen with USER_CACHE_BACKEND (app config
+or environment):
+    memory  In-process dictionary (default); each worker has its own
+    sqlite  A SQLite file at USER_CACHE_PATH shared by all workers on
+            the host, so an invalidation in one worker is seen by all
+
+Each app gets its own backend, created on first use in that app.
+"""
+
+import copy
+import functools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, session, has_app_context, has_request_context
+
+
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_ENTRIES = 1024
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+class MemoryBackend:
+    """In-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (user_id, expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return copy.deepcopy(entry[2])
+
+    def set(self, key, user_id, value, ttl):
+        with self._lock:
+            self._entries[key] = (user_id, time.time() + ttl, copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_user(self, user_id):
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SqliteBackend:
+    """LRU cache in a local SQLite file shared between worker processes"""
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS user_cache ('
+                ' key TEXT PRIMARY KEY, user_id TEXT NOT NULL, value BLOB NOT NULL,'
+                ' expires_at REAL NOT NULL, used_at REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS user_cache_user ON user_cache (user_id)')
+            conn.execute('CREATE INDEX IF NOT EXISTS user_cache_used ON user_cache (used_at)')
+
+    def _connect(self):
+        """One connection per thread; sqlite connections are not thread-safe"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                'SELECT value FROM user_cache WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute('UPDATE user_cache SET used_at = ? WHERE key = ?', (now, key))
+        return pickle.loads(row[0])
+
+    def set(self, key, user_id, value, ttl):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO user_cache VALUES (?, ?, ?, ?, ?)',
+                (key, user_id, pickle.dumps(value), now + ttl, now)
+            )
+            conn.execute('DELETE FROM user_cache WHERE expires_at <= ?', (now,))
+            conn.execute(
+                'DELETE FROM user_cache WHERE key IN ('
+                ' SELECT key FROM user_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+
+    def delete_user(self, user_id):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM user_cache WHERE user_id = ?', (user_id,))
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute('DELETE FROM user_cache')
+
+
+def _setting(config, name, default):
+    """App setting, falling back to the environment"""
+    value = config.get(name)
+    return os.getenv(name, default) if value is None else value
+
+
+def create_backend(config=None):
+    """
+    Build the cache backend described by USER_CACHE_BACKEND and friends
+
+    Args:
+        config (dict): App config; settings it lacks come from the environment
+
+    Returns:
+        MemoryBackend or SqliteBackend: A new, empty backend
+    """
+    config = config or {}
+    max_entries = int(_setting(config, 'USER_CACHE_SIZE', DEFAULT_MAX_ENTRIES))
+    if _setting(config, 'USER_CACHE_BACKEND', 'memory') == 'sqlite':
+        return SqliteBackend(_setting(config, 'USER_CACHE_PATH', 'user_cache.sqlite3'), max_entries)
+    return MemoryBackend(max_entries)
+
+
+def get_backend():
+    """
+    The cache backend for the current app, created on first use
+
+    Each app keeps its own backend in app.extensions, so apps with
+    different settings in one process never share entries. Outside an
+    app context (scripts, benchmarks) a process-wide backend is used.
+    """
+    global _backend
+    with _backend_lock:
+        if has_app_context():
+            extensions = current_app.extensions
+            if 'user_cache' not in extensions:
+                extensions['user_cache'] = create_backend(current_app.config)
+            return extensions['user_cache']
+        if _backend is None:
+            _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the current app's cache backend (e.g. with a differently sized one)"""
+    global _backend
+    with _backend_lock:
+        if has_app_context():
+            current_app.extensions['user_cache'] = backend
+        else:
+            _backend = backend
+
+
+def user_cached(func):
+    """
+    Cache a per-user read helper across requests
+
+    The helper must take (mongo, user_id, ...) and its remaining
+    arguments must have a stable repr that repeats across requests, so
+    pass dates rather than datetimes. Keys include the database name, so
+    apps on different databases never share entries.
+
+    Args:
+        func: Helper to wrap
+
+    Returns:
+        function: The cached helper
+    """
+    @functools.wraps(func)
+    def wrapper(mongo, user_id, *args, **kwargs):
+        config = current_app.config if has_app_context() else {}
+        ttl = float(_setting(config, 'USER_CACHE_TTL', DEFAULT_TTL_SECONDS))
+        if ttl <= 0:
+            return func(mongo, user_id, *args, **kwargs)
+
+        user_id = str(user_id)
+        database = getattr(mongo.db, 'name', '')
+        key = f'{database}:{func.__module__}.{func.__qualname__}:{user_id}:{args!r}:{sorted(kwargs.items())!r}'
+
+        backend = get_backend()
+        value = backend.get(key)
+        if value is None:
+            value = func(mongo, user_id, *args, **kwargs)
+            backend.set(key, user_id, value, ttl)
+
+        return value
+
+    return wrapper
+
+
+def invalidate_user(user_id):
+    """
+    Drop every cached read for a user
+
+    Args:
+        user_id (str): User's ObjectId as string
+    """
+    get_backend().delete_user(str(user_id))
+
+
+def invalidates_user_cache(view):
+    """Route decorator: invalidate the signed-in user's cache after the view runs"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        try:
+            return view(*args, **kwargs)
+        finally:
+            if has_request_context() and 'user_id' in session:
+                invalidate_user(session['user_id'])
+
+    return wrapper
@@ -0,0 +1,11 @@
+"""
+Smart Study Planner - WSGI Entry Point
+Production servers import the application from here, e.g.:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+from app import create_app
+
+app = create_app()
+application = app  # Name some WSGI servers look for by default